@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""境界に基づくセグメンテーションの評価尺度（Pk，WindowDiff，許容幅つきの境界の再現率・適合率・F値）．
+
+インスタンスごとに，GSと解答のQ・Aの区間のうち空でないものを覆う行の範囲[lo, hi]を評価範囲とし，
+Q・Aの区間の先頭行startと終了行の次の行end + 1を境界（その行から新しいセグメントが始まる）とします．
+PkとWindowDiffは，評価範囲の各位置i（lo ≤ i ≤ hi - k）の窓(i, i + k]にGSと解答の境界がいくつあるかを比べ，
+境界の有無が食い違う位置の数，境界の数の差の合計を位置の数で割ったものです．
+窓の幅kはGSのセグメントの平均の長さの半分です．
+どちらも区間の端点から作る「境界の数が変わる位置」を順に走査して求め，行ごとの配列は作りません．
+
+境界の再現率・適合率は，Q・Aの区間の先頭行と終了行を境界とし，解答の境界が同じ種類のGSの境界から
+tolerance行以内にあれば一致とします．
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+# インスタンスごとの値（Pkの食い違い数，WindowDiffの差の合計，位置の数，解答の境界数，GSの境界数，一致した境界数）
+BoundaryCounts = Tuple[int, int, int, int, int, int]
+
+# 個別評価結果と全体結果に加える列
+result_headers = ['Pk', 'WindowDiff', 'B-解答', 'B-正解', 'B-一致', 'B-Precision', 'B-Recall', 'B-F']
+summary_headers = ['Pk', 'WindowDiff', 'B-Recall', 'B-Precision', 'B-F', 'boundaries', 'B-output', 'B-match']
+
+
+def segment_boundaries(span: Tuple[int, int, int, int]) -> List[int]:
+    """Q・Aの区間の先頭行と終了行の次の行（空の区間は除く）．"""
+    boundaries = []
+    for start, end in [(span[0], span[1]), (span[2], span[3])]:
+        if start <= end:
+            boundaries += [start, end + 1]
+    return boundaries
+
+
+def window_errors(lo: int, positions: int, k: int, ref: List[int], hyp: List[int]) -> Tuple[int, int]:
+    """位置i（lo ≤ i < lo + positions）の窓(i, i + k]について，
+    (GSと解答とで境界の有無が食い違う位置の数, 境界の数の差の絶対値の合計)を求める．
+    境界bはi ∈ [b - k, b)の窓に入るので，その両端で境界の数が変わる位置を順に走査する．
+    """
+    changes = {}
+    for j, boundaries in enumerate((ref, hyp)):
+        for b in boundaries:
+            for p, d in [(max(b - k, lo), 1), (b, -1)]:
+                changes.setdefault(p, [0, 0])[j] += d
+    end = lo + positions
+    pk = wd = 0
+    counts = [0, 0]
+    prev = lo
+    for p in sorted(changes):
+        q = min(p, end)
+        pk += (q - prev) * ((counts[0] > 0) != (counts[1] > 0))
+        wd += (q - prev) * abs(counts[0] - counts[1])
+        prev = q
+        if p >= end:
+            break
+        counts[0] += changes[p][0]
+        counts[1] += changes[p][1]
+    pk += (end - prev) * ((counts[0] > 0) != (counts[1] > 0))
+    wd += (end - prev) * abs(counts[0] - counts[1])
+    return pk, wd
+
+
+def boundary_counts(spans: List[Tuple[int, int, int, int]], correct_spans: List[Tuple[int, int, int, int]],
+                    tolerance: int) -> List[BoundaryCounts]:
+    """インスタンスごとのBoundaryCounts．"""
+    counts = []
+    for span, correct in zip(spans, correct_spans):
+        pairs = [(span[k], span[k + 1]) for k in (0, 2) if span[k] <= span[k + 1]]
+        pairs += [(correct[k], correct[k + 1]) for k in (0, 2) if correct[k] <= correct[k + 1]]
+        lo = min(start for start, _ in pairs)
+        hi = max(end for _, end in pairs)
+        ref = sorted({b for b in segment_boundaries(correct) if lo < b <= hi})
+        hyp = sorted({b for b in segment_boundaries(span) if lo < b <= hi})
+        # 窓の幅はGSのセグメントの平均の長さの半分（四捨五入，1以上）
+        n = hi - lo + 1
+        segments = len(ref) + 1
+        k = max(1, (n + segments) // (2 * segments))
+        positions = max(0, n - k)
+        pk, wd = window_errors(lo, positions, k, ref, hyp)
+
+        output = correct_count = match = 0
+        for j in (0, 2):
+            output += 2 if span[j] <= span[j + 1] else 0
+            correct_count += 2 if correct[j] <= correct[j + 1] else 0
+            if span[j] <= span[j + 1] and correct[j] <= correct[j + 1]:
+                match += (abs(span[j] - correct[j]) <= tolerance) + (abs(span[j + 1] - correct[j + 1]) <= tolerance)
+        counts.append((pk, wd, positions, output, correct_count, match))
+    return counts
+
+
+def boundary_counts_numpy(spans, correct_spans, tolerance: int):
+    """boundary_countsと同じものを，末尾の軸が(Qの開始行, Qの終了行, Aの開始行, Aの終了行)である
+    任意の形の配列について，インスタンスを並べた配列の演算で求める（戻り値は末尾の軸がBoundaryCountsの配列）．
+    """
+    import numpy as np
+    spans = np.asarray(spans, dtype=np.int64)
+    correct = np.broadcast_to(np.asarray(correct_spans, dtype=np.int64), spans.shape)
+    big = np.iinfo(np.int64).max // 4
+
+    # 空でない区間と評価範囲
+    starts = np.concatenate([spans[..., 0::2], correct[..., 0::2]], axis=-1)
+    ends = np.concatenate([spans[..., 1::2], correct[..., 1::2]], axis=-1)
+    nonempty = starts <= ends
+    lo = np.where(nonempty, starts, big).min(axis=-1)
+    hi = np.where(nonempty, ends, -big).max(axis=-1)
+
+    def boundaries(s, valid):
+        # 区間の先頭行と終了行の次の行のうち評価範囲の内側にあるもの（重複は1つにし，無効なものはbig）
+        b = np.stack([s[..., 0], s[..., 1] + 1, s[..., 2], s[..., 3] + 1], axis=-1)
+        ok = np.repeat(valid, 2, axis=-1) & (b > lo[..., np.newaxis]) & (b <= hi[..., np.newaxis])
+        b = np.sort(np.where(ok, b, big), axis=-1)
+        b[..., 1:] = np.where(b[..., 1:] == b[..., :-1], big, b[..., 1:])
+        return b
+
+    ref = boundaries(correct, nonempty[..., 2:])
+    hyp = boundaries(spans, nonempty[..., :2])
+    n = hi - lo + 1
+    segments = (ref < big).sum(axis=-1) + 1
+    k = np.maximum(1, (n + segments) // (2 * segments))
+    positions = np.maximum(0, n - k)
+    end = lo + positions
+
+    # 境界の数が変わる位置で評価範囲を区切り，区切りごとに境界の数を数える
+    kk = k[..., np.newaxis]
+    lo_ = lo[..., np.newaxis]
+    end_ = end[..., np.newaxis]
+    points = np.concatenate([np.maximum(ref - kk, lo_), ref, np.maximum(hyp - kk, lo_), hyp, lo_, end_], axis=-1)
+    points = np.sort(np.clip(points, lo_, end_), axis=-1)
+    lengths = np.diff(points, axis=-1)
+    left = points[..., :-1, np.newaxis]
+
+    def window_count(b):
+        b = b[..., np.newaxis, :]
+        return ((b - kk[..., np.newaxis] <= left) & (left < b) & (b < big)).sum(axis=-1)
+
+    c_ref = window_count(ref)
+    c_hyp = window_count(hyp)
+    pk = (lengths * ((c_ref > 0) != (c_hyp > 0))).sum(axis=-1)
+    wd = (lengths * np.abs(c_ref - c_hyp)).sum(axis=-1)
+
+    output = 2 * nonempty[..., :2].sum(axis=-1)
+    correct_count = 2 * nonempty[..., 2:].sum(axis=-1)
+    both = np.repeat(nonempty[..., :2] & nonempty[..., 2:], 2, axis=-1)
+    match = (both & (np.abs(spans - correct) <= tolerance)).sum(axis=-1)
+    return np.stack([pk, wd, positions, output, correct_count, match], axis=-1)
+
+
+def ratio(a: int, b: int) -> float:
+    return a / b if b > 0 else math.nan
+
+
+def instance_result(counts: BoundaryCounts) -> Dict[str, object]:
+    """インスタンス1つの個別評価結果の列．"""
+    pk, wd, positions, output, correct, match = counts
+    return {
+        'Pk': ratio(pk, positions),
+        'WindowDiff': ratio(wd, positions),
+        'B-解答': output,
+        'B-正解': correct,
+        'B-一致': match,
+        'B-Precision': ratio(match, output),
+        'B-Recall': ratio(match, correct),
+        'B-F': ratio(2 * match, output + correct)
+    }
+
+
+def summary_result(counts: List[BoundaryCounts]) -> Dict[str, object]:
+    """全インスタンスの全体結果の列．PkとWindowDiffは（位置のある）インスタンスの平均，
+    境界の再現率・適合率・F値は境界の数の合計から求めるマイクロ平均．
+    平均はmath.fsumで求めるので，インスタンスの順によらず同じ値になる．
+    """
+    pks = [pk / positions for pk, _, positions, _, _, _ in counts if positions > 0]
+    wds = [wd / positions for _, wd, positions, _, _, _ in counts if positions > 0]
+    output = sum(c[3] for c in counts)
+    correct = sum(c[4] for c in counts)
+    match = sum(c[5] for c in counts)
+    return {
+        'Pk': math.fsum(pks) / len(pks) if pks else math.nan,
+        'WindowDiff': math.fsum(wds) / len(wds) if wds else math.nan,
+        'B-Recall': ratio(match, correct),
+        'B-Precision': ratio(match, output),
+        'B-F': ratio(2 * match, output + correct),
+        'boundaries': correct,
+        'B-output': output,
+        'B-match': match
+    }
+
+
+def average_result(counts: List[BoundaryCounts]) -> Dict[str, object]:
+    """個別評価結果のマイクロ平均の行の列．"""
+    summary = summary_result(counts)
+    return {
+        'Pk': summary['Pk'],
+        'WindowDiff': summary['WindowDiff'],
+        'B-解答': summary['B-output'],
+        'B-正解': summary['boundaries'],
+        'B-一致': summary['B-match'],
+        'B-Precision': summary['B-Precision'],
+        'B-Recall': summary['B-Recall'],
+        'B-F': summary['B-F']
+    }
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""会議録の行番号から本文を取り出すための索引（行のバイト位置）を作る・読むスクリプト．
+
+会議録の本文は，Summarizationタスクのデータ（GSなど）の`Source`に，StartingLine行目からの行を
+「\\n」で区切った文字列として入っているだけです．索引を作るときに，会議（Prefecture/Date/Meeting）ごとに
+行をつないだUTF-8のテキストファイルと，各行の先頭のバイト位置を並べたバイナリの索引ファイル
+（テキストファイル名 + '.idx'）を書き出します．
+読むときはどちらもmmapで開くので，任意の行の範囲の本文を，全体を読み込まずにO(1)で取り出せます．
+どのデータにも含まれない行は空行として置き，含まれる行の数は別に数えておきます．
+
+索引ファイルの形式（リトルエンディアン）:
+    マジック（8バイト），テキストファイルの大きさ（uint64），会議の表の大きさ（uint32），予約（uint32），
+    会議の表（UTF-8のJSON．会議ごとに[Prefecture, Date, Meeting, 先頭の行番号, 行数, 位置の表の先頭]），
+    8バイト境界までの詰め物，
+    位置の表（会議ごとに行数 + 1個の(先頭のバイト位置 uint64, それより前にある含まれる行の数 uint64)）
+"""
+
+import sys
+import json
+import mmap
+import struct
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+magic = b'PIMIDX01'
+header_format = '<8sQII'
+entry_format = '<QQ'
+entry_size = struct.calcsize(entry_format)
+
+# 会議のキー（Prefecture, Date, Meeting）
+MeetingKey = Tuple[str, str, str]
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="""PoliInfoのデータのSourceから，会議録の行番号で本文を取り出すための索引を作ります．""")
+
+    parser.add_argument('-i', '--input-files',
+                        nargs='+',
+                        required=True,
+                        help='Sourceを含むJSONファイル（SummarizationタスクのGSなど）を指定します'
+                        )
+
+    parser.add_argument('-o', '--output',
+                        required=True,
+                        help='会議録のテキストファイルの出力先を指定します（索引はこれに.idxを付けたファイルに書き出します）'
+                        )
+
+    return parser.parse_args()
+
+
+def sidecar_path(path: str) -> str:
+    return str(path) + '.idx'
+
+
+def meeting_key(ins: Dict[str, object]) -> MeetingKey:
+    return str(ins['Prefecture']), str(ins['Date']), str(ins['Meeting'])
+
+
+def collect_lines(paths: List[str]) -> Dict[MeetingKey, Dict[int, str]]:
+    """JSONファイルのSourceを行に分け，会議ごとの行番号から行への対応を作る．"""
+    meetings = {}  # type: Dict[MeetingKey, Dict[int, str]]
+    for path in paths:
+        with open(path) as f:
+            instances = json.load(f)
+        for ins in instances:
+            source = ins.get('Source')
+            if not source:
+                continue
+            lines = source.split('\\n')
+            if lines[-1] == '':
+                lines.pop()
+            start = int(ins['StartingLine'])
+            if len(lines) != int(ins['EndingLine']) - start + 1:
+                print('{0}: {1}: Source has {2} lines for StartingLine {3} and EndingLine {4}, skipped'.format(
+                    path, ins['ID'], len(lines), start, ins['EndingLine']), file=sys.stderr)
+                continue
+            meeting = meetings.setdefault(meeting_key(ins), {})
+            for n, line in enumerate(lines, start):
+                if meeting.setdefault(n, line) != line:
+                    raise ValueError('{0}: {1}: line {2} differs from another Source of the same meeting'.format(
+                        path, ins['ID'], n))
+    return meetings
+
+
+def build_index(meetings: Dict[MeetingKey, Dict[int, str]], path: str) -> Tuple[int, int]:
+    """テキストファイルと索引ファイルを書き出し，(行数, 含まれる行の数)を返す．"""
+    table = []
+    entries = bytearray()
+    offset = 0
+    total = 0
+    known = 0
+    with open(path, 'wb') as f:
+        for key, lines in sorted(meetings.items()):
+            if not lines:
+                continue
+            first, last = min(lines), max(lines)
+            table.append(list(key) + [first, last - first + 1, total])
+            meeting_known = 0
+            for n in range(first, last + 1):
+                entries += struct.pack(entry_format, offset, meeting_known)
+                line = lines.get(n)
+                if line is not None:
+                    meeting_known += 1
+                data = (line or '').encode('utf-8') + b'\n'
+                f.write(data)
+                offset += len(data)
+            entries += struct.pack(entry_format, offset, meeting_known)
+            total += last - first + 2
+            known += meeting_known
+
+    table_data = json.dumps(table, ensure_ascii=False).encode('utf-8')
+    table_data += b' ' * (-(struct.calcsize(header_format) + len(table_data)) % 8)
+    with open(sidecar_path(path), 'wb') as f:
+        f.write(struct.pack(header_format, magic, offset, len(table_data), 0))
+        f.write(table_data)
+        f.write(entries)
+    return total - len(table), known
+
+
+class MinutesIndex:
+    """build_indexで作ったテキストファイルと索引ファイルをmmapで開き，行の範囲の本文を取り出す．"""
+
+    def __init__(self, path: str):
+        with open(sidecar_path(path), 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header, size, table_size, _ = struct.unpack_from(header_format, self._index)
+        if header != magic:
+            raise ValueError('{0}: not a minutes index'.format(sidecar_path(path)))
+        start = struct.calcsize(header_format)
+        table = json.loads(self._index[start:start + table_size].decode('utf-8'))
+        self._entries = start + table_size
+        # 会議ごとの(先頭の行番号, 行数, 位置の表の先頭)
+        self.meetings = {(p, d, m): (first, n, base) for p, d, m, first, n, base in table}
+
+        with open(path, 'rb') as f:
+            self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+        if len(self._text) != size:
+            raise ValueError('{0}: the text file does not match its index'.format(path))
+
+    def close(self):
+        self._index.close()
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _entry(self, base: int, k: int) -> Tuple[int, int]:
+        return struct.unpack_from(entry_format, self._index, self._entries + (base + k) * entry_size)
+
+    def _range(self, key: MeetingKey, start: int, end: int) -> Optional[Tuple[int, int, int]]:
+        # 閉区間[start, end]を会議の行の範囲に切り詰めた，位置の表での[a, b)
+        if key not in self.meetings:
+            return None
+        first, n, base = self.meetings[key]
+        a = max(start - first, 0)
+        b = min(end - first + 1, n)
+        return (base, a, b) if a < b else None
+
+    def line_range(self, key: MeetingKey) -> Optional[Tuple[int, int]]:
+        """会議の索引にある先頭と末尾の行番号．"""
+        if key not in self.meetings:
+            return None
+        first, n, _ = self.meetings[key]
+        return first, first + n - 1
+
+    def text(self, key: MeetingKey, start: int, end: int) -> str:
+        """会議のstart行目からend行目までの本文（改行区切り）．索引にない行は空行になる．"""
+        r = self._range(key, start, end)
+        if r is None:
+            return ''
+        base, a, b = r
+        return self._text[self._entry(base, a)[0]:self._entry(base, b)[0] - 1].decode('utf-8')
+
+    def known_lines(self, key: MeetingKey, start: int, end: int) -> int:
+        """start行目からend行目までのうち，本文が索引にある行の数．"""
+        r = self._range(key, start, end)
+        if r is None:
+            return 0
+        base, a, b = r
+        return self._entry(base, b)[1] - self._entry(base, a)[1]
+
+
+def main():
+    args = get_args()
+    try:
+        meetings = collect_lines(args.input_files)
+    except ValueError as err:
+        sys.exit(str(err))
+    lines, known = build_index(meetings, args.output)
+    print('{0} meetings, {1} lines ({2} with text)'.format(sum(1 for m in meetings.values() if m), lines, known),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,16 @@ import json
 import pathlib
 import math
 from collections import Counter
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional
+import boundary_metrics
+from minutes_index import MinutesIndex, MeetingKey, meeting_key
+
+# 全体結果の列
+headers = ['Group ID', 'Priority', 'Recall', 'Precision', 'Q-Recall', 'Q-Precision', 'A-Recall', 'A-Precision',
+           'lines', 'output', 'match', 'Q-lines', 'Q-output', 'Q-match', 'A-lines', 'A-output', 'A-match']
+
+# --minutes-indexのとき個別評価結果に加える，解答と正解の区間の本文の列
+text_headers = ['Q-解答本文', 'Q-正解本文', 'A-解答本文', 'A-正解本文']
 
 
 def get_args():
@@ -31,11 +40,56 @@ def get_args():
                         )
 
     parser.add_argument('-o', '--output-dir',
-                        required=True,
-                        help='個別評価結果の出力ディレクトリを指定します'
+                        help='個別評価結果の出力ディレクトリを指定します（--matrixのときは不要です）'
+                        )
+
+    parser.add_argument('--backend',
+                        choices=['python', 'numpy'],
+                        default='python',
+                        help='行数の計算方法を指定します（python: インスタンスごとに区間の端点から計算（既定），'
+                             'numpy: 評価データの全インスタンスを配列でまとめて計算）'
+                        )
+
+    parser.add_argument('--matrix',
+                        action='store_true',
+                        help='全ての評価データを「評価データ×ID×行番号」の配列にまとめ，全体結果だけを一度に求めます'
+                             '（個別評価結果は出力しません．numpyが必要です）'
+                        )
+
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=1,
+                        help='--matrixのとき，評価データの組を並列に評価するプロセス数を指定します'
                         )
 
-    return parser.parse_args()
+    parser.add_argument('--shard-size',
+                        type=int,
+                        default=256,
+                        help='--matrixのとき，1つの配列にまとめる評価データの数の上限を指定します'
+                        )
+
+    parser.add_argument('--boundary-metrics',
+                        action='store_true',
+                        help='境界に基づく評価尺度（Pk，WindowDiff，境界の再現率・適合率・F値）の列を加えます'
+                        )
+
+    parser.add_argument('--tolerance',
+                        type=int,
+                        default=2,
+                        help='境界の再現率・適合率で，解答の境界が正解の境界から何行以内なら一致とするかを指定します'
+                        )
+
+    parser.add_argument('--minutes-index',
+                        help='minutes_index.pyで作った会議録のテキストファイルを指定すると，'
+                             '個別評価結果に解答と正解の区間の本文の列を加えます（改行は\\nで表します）'
+                        )
+
+    args = parser.parse_args()
+    if not args.matrix and args.output_dir is None:
+        parser.error('--output-dir is required unless --matrix is given')
+    if args.matrix and args.minutes_index is not None:
+        parser.error('--minutes-index cannot be used with --matrix, which writes no per-instance results')
+    return args
 
 
 def load_gs(path) -> Dict[str, Tuple[int, int, int, int]]:
@@ -51,122 +105,243 @@ def load_gs(path) -> Dict[str, Tuple[int, int, int, int]]:
     return gs_map
 
 
-def main():
-    args = get_args()
+def load_gs_meetings(path) -> Dict[str, MeetingKey]:
+    """GSのIDから会議（Prefecture, Date, Meeting）への対応．"""
+    with open(path) as f:
+        gs = json.load(f)
+    return {ins['ID'].split('-')[-1]: meeting_key(ins) for ins in gs}
 
-    # GS読み込み
-    gs_map = load_gs(args.gs_data)
-    headers = ['Group ID', 'Priority', 'Recall', 'Precision', 'Q-Recall', 'Q-Precision', 'A-Recall', 'A-Precision',
-               'lines', 'output', 'match', 'Q-lines', 'Q-output', 'Q-match', 'A-lines', 'A-output', 'A-match']
-    print('\t'.join(headers))
 
-    # 評価データ各々に対して
-    for path in args.input_files:
-        filename_split = pathlib.Path(path).stem.split('_', 1)
-        task = 'Segmentation'
-        run_type = filename_split[0].split('-')[-1]
-        tmp = filename_split[1].rsplit('-', 1)
-        team_name = tmp[0]
-        priority = tmp[1]
-
-        ## RecallとPrecisionのもと
-        nums_line = Counter()
-        nums_output = Counter()
-        nums_match = Counter()
-
-        # 個別評価結果出力先
-        output_path = pathlib.Path(args.output_dir) / pathlib.Path('Result-{0}.txt'.format(pathlib.Path(path).stem))
-
-        # JSON読み込み
-        with open(path) as f, open(output_path, mode='w') as f2:
-            rheaders = ['ID', 'Precision', 'Recall',
-                        'Q-解答', 'Q-正解', 'Q-一致', 'Q-Precision', 'Q-Recall',
-                        'A-解答', 'A-正解', 'A-一致', 'A-Precision', 'A-Recall']
-            print('\t'.join(rheaders), file=f2)
-            for ins in json.load(f):
-                i = ins['ID'].split('-')[-1]
-                qstart = int(ins['QuestionStartingLine'])
-                qend = int(ins['QuestionEndingLine'])
-                astart = int(ins['AnswerStartingLine'])
-                aend = int(ins['AnswerEndingLine'])
-
-                qoutput_lines = set(range(qstart, qend + 1))
-                qcorrect_lines = set(range(gs_map[i][0], gs_map[i][1] + 1))
-                aoutput_lines = set(range(astart, aend + 1))
-                acorrect_lines = set(range(gs_map[i][2], gs_map[i][3] + 1))
-
-                res = {
-                    'ID': ins['ID'],
-                    'Precision': (len(acorrect_lines & aoutput_lines) + len(qcorrect_lines & qoutput_lines)) / (
-                            len(aoutput_lines) + len(qoutput_lines)),
-                    'Recall': (len(acorrect_lines & aoutput_lines) + len(qcorrect_lines & qoutput_lines)) / (
-                            len(acorrect_lines) + len(qcorrect_lines)),
-                    'Q-解答': '{0}-{1}'.format(qstart, qend),
-                    'Q-正解': '{0}-{1}'.format(gs_map[i][0], gs_map[i][1]),
-                    'Q-一致': len(qcorrect_lines & qoutput_lines),
-                    'Q-Precision': len(qcorrect_lines & qoutput_lines) / len(qoutput_lines) if len(
-                        qoutput_lines) > 0 else math.nan,
-                    'Q-Recall': len(qcorrect_lines & qoutput_lines) / len(qcorrect_lines),
-                    'A-解答': '{0}-{1}'.format(astart, aend),
-                    'A-正解': '{0}-{1}'.format(gs_map[i][2], gs_map[i][3]),
-                    'A-一致': len(acorrect_lines & aoutput_lines),
-                    'A-Precision': len(acorrect_lines & aoutput_lines) / len(aoutput_lines) if len(
-                        aoutput_lines) > 0 else math.nan,
-                    'A-Recall': len(acorrect_lines & aoutput_lines) / len(acorrect_lines)
-                }
-
-                nums_line['S'] += (len(acorrect_lines) + len(qcorrect_lines))
-                nums_line['Q'] += len(qcorrect_lines)
-                nums_line['A'] += len(acorrect_lines)
-                nums_output['S'] += (len(aoutput_lines) + len(qoutput_lines))
-                nums_output['Q'] += len(qoutput_lines)
-                nums_output['A'] += len(aoutput_lines)
-                nums_match['S'] += (len(acorrect_lines & aoutput_lines) + len(qcorrect_lines & qoutput_lines))
-                nums_match['Q'] += len(qcorrect_lines & qoutput_lines)
-                nums_match['A'] += len(acorrect_lines & aoutput_lines)
-
-                print('\t'.join([str(res[k]) for k in rheaders]), file=f2)
-
-            # マイクロ平均
+def span_text(minutes: MinutesIndex, key: MeetingKey, start: int, end: int) -> str:
+    """区間の本文を個別評価結果の1列に収まるようにしたもの（改行は\\n，タブは空白にする）．"""
+    return minutes.text(key, start, end).replace('\t', ' ').replace('\n', '\\n')
+
+
+def span_length(start: int, end: int) -> int:
+    """閉区間[start, end]の行数（start > endなら0）．"""
+    return max(0, end - start + 1)
+
+
+def overlap_length(start1: int, end1: int, start2: int, end2: int) -> int:
+    """閉区間[start1, end1]と[start2, end2]に共通する行数．"""
+    return max(0, min(end1, end2) - max(start1, start2) + 1)
+
+
+def load_run(path) -> Tuple[List[str], List[Tuple[int, int, int, int]]]:
+    """評価データのIDと，(Qの開始行, Qの終了行, Aの開始行, Aの終了行)の一覧．"""
+    with open(path) as f:
+        instances = json.load(f)
+    ids = [ins['ID'] for ins in instances]
+    spans = [(int(ins['QuestionStartingLine']), int(ins['QuestionEndingLine']), int(ins['AnswerStartingLine']),
+              int(ins['AnswerEndingLine'])) for ins in instances]
+    return ids, spans
+
+
+def count_lines(spans: List[Tuple[int, int, int, int]],
+                correct_spans: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int, int, int]]:
+    """インスタンスごとの(Q-解答の行数, Q-正解の行数, Q-一致, A-解答の行数, A-正解の行数, A-一致)．
+    行の集合を作らず，区間の端点だけから求める．
+    """
+    counts = []
+    for (qstart, qend, astart, aend), (gqstart, gqend, gastart, gaend) in zip(spans, correct_spans):
+        counts.append((span_length(qstart, qend), span_length(gqstart, gqend),
+                       overlap_length(qstart, qend, gqstart, gqend),
+                       span_length(astart, aend), span_length(gastart, gaend),
+                       overlap_length(astart, aend, gastart, gaend)))
+    return counts
+
+
+def count_lines_numpy(spans: List[Tuple[int, int, int, int]],
+                      correct_spans: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int, int, int]]:
+    """count_linesと同じものを，全インスタンスをまとめた配列の演算で求める．"""
+    import numpy as np
+    output = np.array(spans, dtype=np.int64).reshape(-1, 4)
+    correct = np.array(correct_spans, dtype=np.int64).reshape(-1, 4)
+    counts = np.empty((len(output), 6), dtype=np.int64)
+    for k in range(2):
+        start, end = output[:, 2 * k], output[:, 2 * k + 1]
+        cstart, cend = correct[:, 2 * k], correct[:, 2 * k + 1]
+        counts[:, 3 * k] = np.maximum(0, end - start + 1)
+        counts[:, 3 * k + 1] = np.maximum(0, cend - cstart + 1)
+        counts[:, 3 * k + 2] = np.maximum(0, np.minimum(end, cend) - np.maximum(start, cstart) + 1)
+    return [tuple(c) for c in counts.tolist()]
+
+
+def evaluate_file(path, args, gs_map: Dict[str, Tuple[int, int, int, int]],
+                  minutes: Optional[MinutesIndex] = None,
+                  meetings: Optional[Dict[str, MeetingKey]] = None) -> Dict[str, object]:
+    """評価データ1つを評価して個別評価結果を書き出し，全体結果を返す．
+    minutesとmeetings（GSのIDから会議への対応）があれば，解答と正解の区間の本文の列も加える．
+    """
+    team_name, priority = run_name(path)
+
+    ## RecallとPrecisionのもと
+    nums_line = Counter()
+    nums_output = Counter()
+    nums_match = Counter()
+
+    # 個別評価結果出力先
+    output_path = pathlib.Path(args.output_dir) / pathlib.Path('Result-{0}.txt'.format(pathlib.Path(path).stem))
+
+    rheaders = ['ID', 'Precision', 'Recall',
+                'Q-解答', 'Q-正解', 'Q-一致', 'Q-Precision', 'Q-Recall',
+                'A-解答', 'A-正解', 'A-一致', 'A-Precision', 'A-Recall']
+
+    # JSON読み込み
+    ids, spans = load_run(path)
+    correct_spans = [gs_map[i.split('-')[-1]] for i in ids]
+    counts = (count_lines_numpy if args.backend == 'numpy' else count_lines)(spans, correct_spans)
+    if args.boundary_metrics:
+        if args.backend == 'numpy':
+            boundary_counts = [tuple(c) for c in boundary_metrics.boundary_counts_numpy(
+                spans, correct_spans, args.tolerance).reshape(-1, 6).tolist()]
+        else:
+            boundary_counts = boundary_metrics.boundary_counts(spans, correct_spans, args.tolerance)
+        rheaders += boundary_metrics.result_headers
+    if minutes is not None:
+        rheaders += text_headers
+
+    with open(output_path, mode='w') as f2:
+        print('\t'.join(rheaders), file=f2)
+        for n, (i, (qstart, qend, astart, aend), gs, count) in enumerate(zip(ids, spans, correct_spans, counts)):
+            qoutput, qcorrect, qmatch, aoutput, acorrect, amatch = count
+
             res = {
-                'ID': 'マイクロ平均',
-                'Precision': nums_match['S'] / nums_output['S'],
-                'Recall': nums_match['S'] / nums_line['S'],
-                'Q-解答': nums_output['Q'],
-                'Q-正解': nums_line['Q'],
-                'Q-一致': nums_match['Q'],
-                'Q-Precision': nums_match['Q'] / nums_output['Q'],
-                'Q-Recall': nums_match['Q'] / nums_line['Q'],
-                'A-解答': nums_output['A'],
-                'A-正解': nums_line['A'],
-                'A-一致': nums_match['A'],
-                'A-Precision': nums_match['A'] / nums_output['A'],
-                'A-Recall': nums_match['A'] / nums_line['A'],
+                'ID': i,
+                'Precision': (amatch + qmatch) / (aoutput + qoutput),
+                'Recall': (amatch + qmatch) / (acorrect + qcorrect),
+                'Q-解答': '{0}-{1}'.format(qstart, qend),
+                'Q-正解': '{0}-{1}'.format(gs[0], gs[1]),
+                'Q-一致': qmatch,
+                'Q-Precision': qmatch / qoutput if qoutput > 0 else math.nan,
+                'Q-Recall': qmatch / qcorrect,
+                'A-解答': '{0}-{1}'.format(astart, aend),
+                'A-正解': '{0}-{1}'.format(gs[2], gs[3]),
+                'A-一致': amatch,
+                'A-Precision': amatch / aoutput if aoutput > 0 else math.nan,
+                'A-Recall': amatch / acorrect
             }
+            if args.boundary_metrics:
+                res.update(boundary_metrics.instance_result(boundary_counts[n]))
+            if minutes is not None:
+                key = meetings[i.split('-')[-1]]
+                res.update({
+                    'Q-解答本文': span_text(minutes, key, qstart, qend),
+                    'Q-正解本文': span_text(minutes, key, gs[0], gs[1]),
+                    'A-解答本文': span_text(minutes, key, astart, aend),
+                    'A-正解本文': span_text(minutes, key, gs[2], gs[3])
+                })
+
+            nums_line['S'] += (acorrect + qcorrect)
+            nums_line['Q'] += qcorrect
+            nums_line['A'] += acorrect
+            nums_output['S'] += (aoutput + qoutput)
+            nums_output['Q'] += qoutput
+            nums_output['A'] += aoutput
+            nums_match['S'] += (amatch + qmatch)
+            nums_match['Q'] += qmatch
+            nums_match['A'] += amatch
+
             print('\t'.join([str(res[k]) for k in rheaders]), file=f2)
 
-        # 全体結果
+        # マイクロ平均
         res = {
-            'Group ID': team_name,
-            'Priority': priority,
-            'Recall': nums_match['S'] / nums_line['S'],
+            'ID': 'マイクロ平均',
             'Precision': nums_match['S'] / nums_output['S'],
-            'Q-Recall': nums_match['Q'] / nums_line['Q'],
+            'Recall': nums_match['S'] / nums_line['S'],
+            'Q-解答': nums_output['Q'],
+            'Q-正解': nums_line['Q'],
+            'Q-一致': nums_match['Q'],
             'Q-Precision': nums_match['Q'] / nums_output['Q'],
-            'A-Recall': nums_match['A'] / nums_line['A'],
+            'Q-Recall': nums_match['Q'] / nums_line['Q'],
+            'A-解答': nums_output['A'],
+            'A-正解': nums_line['A'],
+            'A-一致': nums_match['A'],
             'A-Precision': nums_match['A'] / nums_output['A'],
-            'lines': nums_line['S'],
-            'output': nums_output['S'],
-            'match': nums_match['S'],
-            'Q-lines': nums_line['Q'],
-            'Q-output': nums_output['Q'],
-            'Q-match': nums_match['Q'],
-            'A-lines': nums_line['A'],
-            'A-output': nums_output['A'],
-            'A-match': nums_match['A']
+            'A-Recall': nums_match['A'] / nums_line['A'],
         }
+        if args.boundary_metrics:
+            res.update(boundary_metrics.average_result(boundary_counts))
+        if minutes is not None:
+            res.update({k: '' for k in text_headers})
+        print('\t'.join([str(res[k]) for k in rheaders]), file=f2)
+
+    # 全体結果
+    return summary_row(team_name, priority, nums_line, nums_output, nums_match,
+                       boundary_counts if args.boundary_metrics else None)
+
+
+def run_name(path) -> Tuple[str, str]:
+    """評価データのファイル名からGroup IDとPriorityを取り出す．"""
+    filename_split = pathlib.Path(path).stem.split('_', 1)
+    tmp = filename_split[1].rsplit('-', 1)
+    return tmp[0], tmp[1]
+
+
+def summary_row(team_name: str, priority: str, nums_line: Dict[str, int], nums_output: Dict[str, int],
+                nums_match: Dict[str, int],
+                boundary_counts: Optional[List[boundary_metrics.BoundaryCounts]] = None) -> Dict[str, object]:
+    """全体（S），Question（Q），Answer（A）ごとの正解・解答・一致の行数から，全体結果を求める．
+    boundary_countsがあれば，境界に基づく評価尺度の列も加える．
+    """
+    res = {
+        'Group ID': team_name,
+        'Priority': priority,
+        'Recall': nums_match['S'] / nums_line['S'],
+        'Precision': nums_match['S'] / nums_output['S'],
+        'Q-Recall': nums_match['Q'] / nums_line['Q'],
+        'Q-Precision': nums_match['Q'] / nums_output['Q'],
+        'A-Recall': nums_match['A'] / nums_line['A'],
+        'A-Precision': nums_match['A'] / nums_output['A'],
+        'lines': nums_line['S'],
+        'output': nums_output['S'],
+        'match': nums_match['S'],
+        'Q-lines': nums_line['Q'],
+        'Q-output': nums_output['Q'],
+        'Q-match': nums_match['Q'],
+        'A-lines': nums_line['A'],
+        'A-output': nums_output['A'],
+        'A-match': nums_match['A']
+    }
+    if boundary_counts is not None:
+        res.update(boundary_metrics.summary_result(boundary_counts))
+    return res
+
+
+def main():
+    args = get_args()
+
+    # GS読み込み
+    gs_map = load_gs(args.gs_data)
+
+    # 会議録の本文（索引をmmapで開き，区間ごとに必要な行だけを読む）
+    minutes = None
+    meetings = None
+    if args.minutes_index is not None:
+        try:
+            minutes = MinutesIndex(args.minutes_index)
+        except (OSError, ValueError) as err:
+            sys.exit(str(err))
+        meetings = load_gs_meetings(args.gs_data)
+
+    columns = headers + (boundary_metrics.summary_headers if args.boundary_metrics else [])
+    print('\t'.join(columns))
+
+    if args.matrix:
+        # 全評価データの全体結果だけを配列でまとめて求める
+        from segmentation_matrix import evaluate_matrix
+        for res in evaluate_matrix(args.input_files, gs_map, args.jobs, args.shard_size,
+                                   args.tolerance if args.boundary_metrics else None):
+            print('\t'.join([str(res[k]) for k in columns]))
+        return
+
+    # 評価データ各々に対して
+    for path in args.input_files:
+        res = evaluate_file(path, args, gs_map, minutes, meetings)
+        print('\t'.join([str(res[k]) for k in columns]))
 
-        print('\t'.join([str(res[k]) for k in headers]))
+    if minutes is not None:
+        minutes.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""多数の評価データ（パラメータを振ったシステムの出力など）の全体結果をまとめて求める（--matrix）．
+
+GSは1回だけ読み込み，IDの番号×(Qの開始行, Qの終了行, Aの開始行, Aの終了行)の配列にします．
+評価データは全ての行を(評価データの番号, IDの番号, 区間の端点)の配列に積み，正解・解答・一致の行数を
+全評価データについて配列の演算で一度に求め，np.add.atで評価データごと（またはIDごと）に足し合わせます．
+評価データが多いときは，shard_size個ずつの組に分けて順に（jobsが2以上ならプロセスを分けて）評価します．
+境界に基づく評価尺度も，同じ配列からboundary_metrics.boundary_counts_numpyでまとめて求めます．
+IDの重複した評価データ（書式チェックを通らないもの）も，evaluate_fileと同じく全ての行を評価します．
+"""
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from poliinfo_eval_formal_segmentation import load_run, run_name, summary_row
+from boundary_metrics import boundary_counts_numpy
+from typing import Dict, List, Optional, Tuple
+
+# 各プロセスで共有するGSの配列
+shared = {}
+
+
+def gs_arrays(gs_map: Dict[str, Tuple[int, int, int, int]]) -> Tuple[Dict[str, int], np.ndarray]:
+    """IDから配列の番号への対応と，ID×4の区間の端点の配列．"""
+    index = {i: k for k, i in enumerate(gs_map)}
+    bounds = np.array(list(gs_map.values()), dtype=np.int64).reshape(-1, 4)
+    return index, bounds
+
+
+def load_rows(paths: List[str], index: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """全評価データの全ての行（評価データの順，各評価データではファイルの順）の，
+    評価データの番号，IDの番号，(Qの開始行, Qの終了行, Aの開始行, Aの終了行)の配列．
+    """
+    runs = []
+    ids = []
+    spans = []
+    for r, path in enumerate(paths):
+        run_ids, run_spans = load_run(path)
+        runs += [r] * len(run_ids)
+        ids += [index[i.split('-')[-1]] for i in run_ids]
+        spans += run_spans
+    return (np.array(runs, dtype=np.int64), np.array(ids, dtype=np.int64),
+            np.array(spans, dtype=np.int64).reshape(-1, 4))
+
+
+def row_line_counts(spans: np.ndarray, correct_spans: np.ndarray) -> np.ndarray:
+    """行ごとの(正解, 解答, 一致)×(S, Q, A)の行数．"""
+    start, end = spans[:, 0::2], spans[:, 1::2]
+    gstart, gend = correct_spans[:, 0::2], correct_spans[:, 1::2]
+    lines = np.maximum(0, gend - gstart + 1)
+    output = np.maximum(0, end - start + 1)
+    match = np.maximum(0, np.minimum(end, gend) - np.maximum(start, gstart) + 1)
+    # QとAの和をSとして先頭に置く
+    counts = np.stack([lines, output, match], axis=1)
+    return np.concatenate([counts.sum(axis=2, keepdims=True), counts], axis=2)
+
+
+def id_line_counts(runs: np.ndarray, ids: np.ndarray, spans: np.ndarray, bounds: np.ndarray,
+                   n_runs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """評価データ×ID×(正解, 解答, 一致)×(S, Q, A)の行数（同じIDの行は足し合わせ，評価データに含まれないIDは0）と，
+    評価データ×IDの（そのIDを含むかの）マスク．
+    """
+    counts = np.zeros((n_runs, len(bounds), 3, 3), dtype=np.int64)
+    np.add.at(counts, (runs, ids), row_line_counts(spans, bounds[ids]))
+    present = np.zeros((n_runs, len(bounds)), dtype=bool)
+    present[runs, ids] = True
+    return counts, present
+
+
+def line_counts(runs: np.ndarray, ids: np.ndarray, spans: np.ndarray, bounds: np.ndarray,
+                n_runs: int) -> np.ndarray:
+    """評価データ×(正解, 解答, 一致)×(S, Q, A)の行数の合計．"""
+    counts = np.zeros((n_runs, 3, 3), dtype=np.int64)
+    np.add.at(counts, runs, row_line_counts(spans, bounds[ids]))
+    return counts
+
+
+def init_worker(index: Dict[str, int], bounds: np.ndarray, tolerance: Optional[int]):
+    shared['index'] = index
+    shared['bounds'] = bounds
+    shared['tolerance'] = tolerance
+
+
+def evaluate_shard(paths: List[str]) -> List[Tuple[List[List[int]], Optional[List[Tuple[int, ...]]]]]:
+    """評価データの組の，評価データごとの(正解, 解答, 一致)×(S, Q, A)の行数と，
+    toleranceがあれば，評価データの行ごとのboundary_metrics.BoundaryCounts．
+    """
+    runs, ids, spans = load_rows(paths, shared['index'])
+    counts = line_counts(runs, ids, spans, shared['bounds'], len(paths)).tolist()
+    if shared['tolerance'] is None:
+        return [(c, None) for c in counts]
+    boundaries = boundary_counts_numpy(spans, shared['bounds'][ids], shared['tolerance'])
+    # 行は評価データの順に並んでいる
+    ends = np.searchsorted(runs, np.arange(len(paths)), side='right')
+    starts = np.concatenate([[0], ends[:-1]])
+    return [(c, [tuple(b) for b in boundaries[start:end].tolist()])
+            for c, start, end in zip(counts, starts, ends)]
+
+
+def evaluate_matrix(paths: List[str], gs_map: Dict[str, Tuple[int, int, int, int]], jobs: int = 1,
+                    shard_size: int = 256, tolerance: Optional[int] = None) -> List[Dict[str, object]]:
+    """全評価データの全体結果（poliinfo_eval_formal_segmentation.evaluate_fileと同じもの）を入力順に返す．
+    toleranceを指定すると，境界に基づく評価尺度の列も求める．
+    """
+    index, bounds = gs_arrays(gs_map)
+    shards = [paths[k:k + shard_size] for k in range(0, len(paths), max(shard_size, 1))]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                 initargs=(index, bounds, tolerance)) as pool:
+            counts = [c for shard in pool.map(evaluate_shard, shards) for c in shard]
+    else:
+        init_worker(index, bounds, tolerance)
+        counts = [c for shard in shards for c in evaluate_shard(shard)]
+
+    rows = []
+    for path, ((lines, output, match), boundaries) in zip(paths, counts):
+        team_name, priority = run_name(path)
+        rows.append(summary_row(team_name, priority, dict(zip('SQA', lines)), dict(zip('SQA', output)),
+                                dict(zip('SQA', match)), boundaries))
+    return rows
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""PoliInfo Segmentationタスクの評価データ（run）の組ごとに，マイクロ平均のRecall・Precision・F値の差の
+有意性を検定するスクリプト．
+
+全runのIDごとの正解・解答・一致の行数をrun×ID×…の配列に集め，対応のあるブートストラップ検定と
+近似ランダム化検定（IDごとに2つのrunの解答を入れ替える）のp値を，全てのrunの組について一度に求めます．
+マイクロ平均は行数の合計の比なので，どちらの検定も，試行ごとの行数の合計を「重み行列×行数」の行列積で
+全runについて一度に求めます（ブートストラップの重みは各IDが選ばれた回数，ランダム化の重みは入れ替えるIDの印）．
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+from poliinfo_eval_formal_segmentation import load_gs, run_name
+from segmentation_matrix import gs_arrays, load_rows, id_line_counts
+from typing import List, Tuple
+
+# スコア種別（S: QとAを合わせたもの）
+parts = ['S', 'Q', 'A']
+measures = ['Recall', 'Precision', 'F']
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="""PoliInfo Segmentationタスクの評価データについて，runの組ごとにマイクロ平均の
+        Recall・Precision・F値の差の有意性を検定します．""")
+
+    parser.add_argument('-i', '--input-files',
+                        nargs='+',
+                        required=True,
+                        help='評価対象のJSONファイルを指定します'
+                        )
+
+    parser.add_argument('-g', '--gs-data',
+                        required=True,
+                        help='GSデータを指定します'
+                        )
+
+    parser.add_argument('-o', '--output',
+                        required=True,
+                        help='検定結果の出力先を指定します（拡張子が.npzならNumPyの配列として保存します）'
+                        )
+
+    parser.add_argument('-n', '--samples',
+                        type=int,
+                        default=10000,
+                        help='ブートストラップと近似ランダム化の試行回数を指定します'
+                        )
+
+    parser.add_argument('-s', '--seed',
+                        type=int,
+                        default=0,
+                        help='乱数の種を指定します'
+                        )
+
+    return parser.parse_args()
+
+
+def metric_names() -> List[str]:
+    # 全体結果の列名に合わせる（Recall，Q-Recall，…）
+    return ['{0}{1}'.format('' if p == 'S' else p + '-', m) for p in parts for m in measures]
+
+
+def collect_counts(paths: List[str], gs_path: str) -> Tuple[np.ndarray, List[str]]:
+    """run×ID×(正解, 解答, 一致)×(S, Q, A)の行数と，IDの一覧．IDは全てのrunに含まれるものだけを使う．
+    同じIDの行が複数あれば，評価スクリプトと同じく全ての行の行数を足し合わせる．
+    """
+    gs_map = load_gs(gs_path)
+    index, bounds = gs_arrays(gs_map)
+    runs, ids, spans = load_rows(paths, index)
+    counts, present = id_line_counts(runs, ids, spans, bounds, len(paths))
+    common = present.all(axis=0)
+    for path, p in zip(paths, present):
+        if p.sum() != common.sum():
+            print('{0}: {1} of {2} IDs are not in every run and are left out'.format(
+                path, p.sum() - common.sum(), p.sum()), file=sys.stderr)
+    counts = counts[:, common]
+    return counts, [i for i, c in zip(gs_map, common) if c]
+
+
+def micro_scores(totals: np.ndarray) -> np.ndarray:
+    """…×(正解, 解答, 一致)×(S, Q, A)の行数の合計から，…×(S, Q, A)×(Recall, Precision, F)のマイクロ平均．"""
+    lines, output, match = totals[..., 0, :], totals[..., 1, :], totals[..., 2, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.stack([match / lines, match / output, 2 * match / (lines + output)], axis=-1)
+
+
+def paired_tests(counts: np.ndarray, samples: int, seed: int = 0,
+                 chunk: int = 500) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """run×ID×(正解, 解答, 一致)×(S, Q, A)の行数から，runごとのマイクロ平均と，全てのrunの組(a, b)についての
+    差（a - b），対応のあるブートストラップ検定と近似ランダム化検定の両側p値を返す．
+    スコアの配列の末尾の軸は(S, Q, A)×(Recall, Precision, F)を平らにしたもの．
+    """
+    n_runs, n = counts.shape[:2]
+    flat = counts.reshape(n_runs, n, -1).transpose(1, 0, 2).reshape(n, -1).astype(np.float64)
+    totals = flat.sum(axis=0)
+    shape = counts.shape[2:]
+    rng = np.random.default_rng(seed)
+
+    # 各試行で各IDが選ばれた回数
+    idx = rng.integers(0, n, size=(samples, n))
+    weights = np.bincount((idx + np.arange(samples)[:, np.newaxis] * n).ravel(),
+                          minlength=samples * n).reshape(samples, n).astype(np.float64)
+    # 各試行で2つのrunの解答を入れ替えるID
+    swaps = rng.integers(0, 2, size=(samples, n)).astype(np.float64)
+
+    scores = micro_scores(totals.reshape((n_runs,) + shape)).reshape(n_runs, -1)
+    deltas = scores[:, np.newaxis, :] - scores[np.newaxis, :, :]
+    observed = np.abs(deltas) - 1e-12
+    exceed_boot = np.zeros(deltas.shape, dtype=np.int64)
+    exceed_rand = np.zeros(deltas.shape, dtype=np.int64)
+    for start in range(0, samples, chunk):
+        # 試行×runの行数の合計
+        boot = micro_scores((weights[start:start + chunk] @ flat).reshape((-1, n_runs) + shape))
+        boot = boot.reshape(len(boot), n_runs, -1)
+        # 入れ替えるIDの行数の合計．入れ替え後の合計はa: T_a - S_a + S_b，b: T_b - S_b + S_a
+        swapped = (swaps[start:start + chunk] @ flat).reshape(-1, n_runs, flat.shape[1] // n_runs)
+        kept = totals.reshape(n_runs, -1) - swapped
+        for a in range(n_runs - 1):
+            d = boot[:, a:a + 1] - boot[:, a + 1:]
+            d -= deltas[a, a + 1:]
+            np.abs(d, out=d)
+            exceed_boot[a, a + 1:] += np.count_nonzero(d >= observed[a, a + 1:], axis=0)
+            pairs = swapped[:, a + 1:].shape[:2] + shape
+            perm_a = micro_scores((kept[:, a:a + 1] + swapped[:, a + 1:]).reshape(pairs))
+            perm_b = micro_scores((kept[:, a + 1:] + swapped[:, a:a + 1]).reshape(pairs))
+            d = (perm_a - perm_b).reshape(len(swapped), n_runs - a - 1, -1)
+            np.abs(d, out=d)
+            exceed_rand[a, a + 1:] += np.count_nonzero(d >= observed[a, a + 1:], axis=0)
+    upper = np.triu(np.ones((n_runs, n_runs), dtype=bool), 1)[:, :, np.newaxis]
+    exceed_boot = np.where(upper, exceed_boot, exceed_boot.transpose(1, 0, 2))
+    exceed_rand = np.where(upper, exceed_rand, exceed_rand.transpose(1, 0, 2))
+    p_boot = (1 + exceed_boot) / (samples + 1)
+    p_rand = (1 + exceed_rand) / (samples + 1)
+    # 同じrunどうしは差がない
+    p_boot[np.arange(n_runs), np.arange(n_runs)] = 1
+    p_rand[np.arange(n_runs), np.arange(n_runs)] = 1
+    return scores, deltas, p_boot, p_rand
+
+
+def write_tsv(path: str, runs: List[str], metrics: List[str], scores: np.ndarray, deltas: np.ndarray,
+              p_boot: np.ndarray, p_rand: np.ndarray):
+    with open(path, 'w') as f:
+        print('\t'.join(['スコア種別', 'run A', 'run B', 'A', 'B', '差（A-B）', 'ブートストラップp値', '近似ランダム化p値']),
+              file=f)
+        for m, metric in enumerate(metrics):
+            for a in range(len(runs)):
+                for b in range(a + 1, len(runs)):
+                    print('\t'.join([metric, runs[a], runs[b]] + ['{0}'.format(x) for x in [
+                        scores[a, m], scores[b, m], deltas[a, b, m], p_boot[a, b, m], p_rand[a, b, m]]]), file=f)
+
+
+def main():
+    args = get_args()
+    start = time.perf_counter()
+    runs = ['-'.join(run_name(path)) for path in args.input_files]
+    counts, ids = collect_counts(args.input_files, args.gs_data)
+    scores, deltas, p_boot, p_rand = paired_tests(counts, args.samples, args.seed)
+    metrics = metric_names()
+    if args.output.endswith('.npz'):
+        np.savez(args.output, runs=np.array(runs), ids=np.array(ids), metrics=np.array(metrics), scores=scores,
+                 deltas=deltas, p_bootstrap=p_boot, p_randomization=p_rand)
+    else:
+        write_tsv(args.output, runs, metrics, scores, deltas, p_boot, p_rand)
+    print('{0} runs, {1} IDs, {2} scores: {3:.2f}s'.format(len(runs), len(ids), len(metrics),
+                                                           time.perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""tokenizer.pyの漢数字の読み取り（parse_kanji_numerals）の検査とベンチマーク．
+正規表現で区切っていた従来の実装（legacy_parse_kanji_numerals）と，
+表を引いて1回走査で読む現在の実装とで，結果が一致することを確認し，処理時間を比較します．
+1件でも一致しなければAssertionErrorで止まり，処理時間は計測しません．
+"""
+
+import re
+import math
+import random
+import argparse
+import itertools
+import timeit
+from typing import Optional, TypeVar, List
+from tokenizer import parse_kanji_numerals
+
+T = TypeVar('T')
+
+# 数詞の原形に現れる文字と，それ以外の紛れ込みうる文字
+alphabet = ['〇', '一', '二', '三', '四', '五', '六', '七', '八', '九', '0', '1', '5', '9',
+            '十', '百', '千', '万', '億', '兆', '零', 'ゼロ-zero', 'ゼロ', '数', '幾', '１', 'a']
+
+numeral_notation1_regex = re.compile(r'([^兆億万]+兆)?([^兆億万]+億)?([^兆億万]+万)?([^兆億万]*)')
+numeral_notation2_regex = re.compile(r'([^千百十]*千)?([^千百十]*百)?([^千百十]*十)?([^千百十]*)')
+
+
+def nonEmpty(s: str) -> bool:
+    return s is not None and s != ''
+
+
+def isEmpty(s: str) -> bool:
+    return not nonEmpty(s)
+
+
+def or_else(n: Optional[T], e: T) -> T:
+    return n if n is not None else e
+
+
+def replace_all_kanji_to_arabic(numerals: str) -> str:
+    tmp = numerals.replace("一", "1").replace("二", "2").replace("三", "3").replace("四", "4").replace("五", "5").replace(
+        "六", "6").replace("七", "7").replace("八", "8").replace("九", "9").replace("〇", "0")
+    tmp = re.sub(r'[^0123456789]', '', tmp)
+    tmp = re.sub(r'^0+', '', tmp)
+    return tmp
+
+
+def legacy_parse_kanji_numerals(kanji_numerals: str) -> Optional[int]:
+    """従来の実装（標準エラー出力への表示だけを除いたもの）．"""
+    def p3(numerals: str, has_default: bool) -> Optional[int]:
+        if nonEmpty(numerals):
+            if has_default:
+                return 1
+            else:
+                return None
+        try:
+            return int(replace_all_kanji_to_arabic(numerals))
+        except Exception:
+            return None
+
+    def p4(numerals: str) -> Optional[int]:
+        numeral_array = list(reversed(replace_all_kanji_to_arabic(numerals)))
+        num = 0
+        for i, x in enumerate(numeral_array):
+            try:
+                num += int(int(x) * math.pow(10, i))
+            except:
+                pass
+        return num
+
+    def p2(numerals: str) -> Optional[int]:
+        if isEmpty(numerals):
+            return None
+        mobj = numeral_notation2_regex.match(numerals)
+        if mobj is not None:
+            if nonEmpty(mobj.group(1)) and nonEmpty(mobj.group(2)) and nonEmpty(mobj.group(3)):
+                base2 = 10
+                output2 = or_else(p3(mobj.group(1)[:-1], True), 0) * base2 * base2 * base2 + or_else(
+                    p3(mobj.group(2)[:-1], True), 0) * base2 * base2 + or_else(p3(mobj.group(3)[:-1], True),
+                                                                               0) * base2 + or_else(
+                    p3(mobj.group(4), False), 0)
+                return output2
+            else:
+                return p4(numerals)
+        else:
+            return None
+
+    tmp = kanji_numerals.replace('ゼロ-zero', '〇').replace('零', '〇')
+    matchObj = numeral_notation1_regex.match(tmp)
+    if matchObj is not None:
+        base = 10000
+        default_string = 'a'
+        output = or_else(p2(or_else(matchObj.group(1), default_string)[:-1]), 0) * base * base * base + or_else(
+            p2(or_else(matchObj.group(2), default_string)[:-1]), 0) * base * base + or_else(
+            p2(or_else(matchObj.group(3), default_string)[:-1]), 0) * base + or_else(p2(matchObj.group(4)), 0)
+        return output
+    else:
+        return None
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="""漢数字の読み取りの検査とベンチマークです．
+        従来の実装とparse_kanji_numeralsの結果が一致するかを確認し，処理時間を比較します．""")
+
+    parser.add_argument('-e', '--exhaustive-length',
+                        type=int,
+                        default=3,
+                        help='全通りを検査する文字列の長さの上限を指定します'
+                        )
+
+    parser.add_argument('-n', '--random-cases',
+                        type=int,
+                        default=200000,
+                        help='ランダムに生成して検査する文字列の数を指定します'
+                        )
+
+    parser.add_argument('--max-length',
+                        type=int,
+                        default=24,
+                        help='ランダムに生成する文字列の長さの上限を指定します'
+                        )
+
+    parser.add_argument('-s', '--seed',
+                        type=int,
+                        default=0,
+                        help='乱数の種を指定します'
+                        )
+
+    parser.add_argument('-r', '--repeat',
+                        type=int,
+                        default=5,
+                        help='計測の繰り返し回数を指定します（最速の値を報告します）'
+                        )
+
+    return parser.parse_args()
+
+
+def exhaustive_cases(length: int):
+    for k in range(length + 1):
+        for chars in itertools.product(alphabet, repeat=k):
+            yield ''.join(chars)
+
+
+def random_cases(rng: random.Random, n: int, max_length: int):
+    digits = alphabet[:14]
+    units = ['十', '百', '千', '万', '億', '兆']
+    for _ in range(n):
+        k = rng.randint(1, max_length)
+        r = rng.random()
+        if r < 0.3:
+            # 漢数字と単位からなる，それらしい並び
+            yield ''.join(rng.choice(digits) if rng.random() < 0.6 else rng.choice(units) for _ in range(k))
+        elif r < 0.5:
+            # 16桁以上の数字列（浮動小数点で足し合わせる経路）
+            yield ''.join(rng.choice(digits) for _ in range(k + 15))
+        else:
+            yield ''.join(rng.choice(alphabet) for _ in range(k))
+
+
+def well_formed_cases() -> List[str]:
+    """実データに現れる形の数詞．"""
+    cases = []
+    for n in [0, 1, 5, 10, 11, 20, 100, 101, 110, 111, 999, 1000, 1111, 2345, 10000, 12345, 100000000,
+              123456789, 1000000000000, 3000200010]:
+        cases.append(str(n))
+    kanji = '〇一二三四五六七八九'
+    for s in cases[:]:
+        cases.append(''.join(kanji[int(c)] for c in s))
+    cases += ['十', '百', '千', '万', '二十', '三百', '四千', '五万', '千百十', '二千三百四十五', '一億二千万',
+              '三兆四千億', 'ゼロ-zero', '零', '百万', '数十', '数百万', '十万円']
+    return cases
+
+
+def check(cases, label: str):
+    """全ての文字列で従来の実装と結果が一致することを確かめる（一致しなければAssertionError）．"""
+    count = 0
+    mismatches = []
+    for s in cases:
+        count += 1
+        expected = legacy_parse_kanji_numerals(s)
+        actual = parse_kanji_numerals(s)
+        if expected != actual:
+            mismatches.append('{0!r}: legacy {1}, current {2}'.format(s, expected, actual))
+    print('{0}: {1}件, 不一致 {2}件'.format(label, count, len(mismatches)))
+    if mismatches:
+        raise AssertionError('{0}: {1} of {2} cases differ from the legacy parser:\n  {3}'.format(
+            label, len(mismatches), count, '\n  '.join(mismatches[:10])))
+
+
+def bench(func, cases: List[str], repeat: int) -> float:
+    return min(timeit.repeat(lambda: [func(s) for s in cases], number=1, repeat=repeat))
+
+
+def main():
+    args = get_args()
+    rng = random.Random(args.seed)
+
+    check(well_formed_cases(), '実データ形')
+    check(exhaustive_cases(args.exhaustive_length), '全通り（長さ{0}以下）'.format(args.exhaustive_length))
+    check(random_cases(rng, args.random_cases, args.max_length), 'ランダム')
+
+    # 評価データの数詞は種類が少なく繰り返し現れるので，その分布を真似る
+    vocabulary = well_formed_cases() + list(random_cases(rng, 200, 8))
+    workload = [rng.choice(vocabulary) for _ in range(100000)]
+    legacy = bench(legacy_parse_kanji_numerals, workload, args.repeat)
+    parse_kanji_numerals.cache_clear()
+    uncached = bench(parse_kanji_numerals.__wrapped__, workload, args.repeat)
+    cached = bench(parse_kanji_numerals, workload, args.repeat)
+    print('{0}件の読み取り: 従来 {1:.3f}s, 1回走査 {2:.3f}s ({3:.1f}倍), キャッシュあり {4:.3f}s ({5:.1f}倍)'.format(
+        len(workload), legacy, uncached, legacy / uncached, cached, legacy / cached))
+    print(parse_kanji_numerals.cache_info())
+
+
+if __name__ == '__main__':
+    main()
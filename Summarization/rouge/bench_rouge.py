@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""ROUGE評価の一致確認と処理速度のベンチマーク．
+以下の2種類の評価を，指定したバックエンド（native: rouge.native，perl: ROUGE-1.5.5.pl）で実行します．
+・sample: rouge/ORIGINAL-1.5.5/sample-testのROUGE-test.xmlを，sample-outputにある9通りの設定で評価し，
+  同梱の出力と1行ずつ比較します（ORIGINAL-1.5.5の処理で評価します）．
+・poliinfo: testGSのGSごとに，原文（Source）の先頭を制限字数で切り取った要約を評価データとし，
+  poliinfo_eval_summarization.pyと同じ手順（Pythonrouge）で評価します．
+  正解の出力はないため，個別評価結果のハッシュ値をバックエンド間，および前回の記録と比較します．
+評価は1つずつ新しいPythonプロセスで実行し，処理時間，子プロセスの起動回数，
+1インスタンスあたりの処理時間，最大常駐メモリ（RSS）を計測して，JSONの履歴ファイルに追記します．
+前回の記録より処理時間が閾値を超えて増えた評価や，スコアが変わった評価は警告します．
+"""
+
+import sys
+import os
+import argparse
+import json
+import time
+import hashlib
+import platform
+import resource
+import subprocess
+import tempfile
+import pathlib
+import multiprocessing
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+base_dir = pathlib.Path(__file__).resolve().parent
+original_dir = base_dir / 'rouge' / 'ORIGINAL-1.5.5'
+sample_test_dir = original_dir / 'sample-test'
+sample_output_dir = original_dir / 'sample-output'
+default_gs = [str(base_dir.parent / 'testGS' / '{0}-FormalTestGS-Summarization-FormalRun.json'.format(t))
+              for t in ['Single', 'Multi']]
+default_history = str(base_dir / 'bench_rouge_history.json')
+
+backends = ['native', 'perl']
+
+# sample-outputの各ファイルの設定（ROUGE-1.5.5.plのオプションとNativeRougeの引数）
+sample_common_options = ['-c', '95', '-2', '-1', '-U', '-r', '1000', '-n', '4', '-w', '1.2']
+sample_common_params = dict(n_gram=4, skip_distance=-1, skip_unigram='both', wlcs_weight=1.2, samples=1000, cf=95)
+sample_configs = []
+for _limit, _limit_options, _limit_params in [('', [], {}), ('-l10', ['-l', '10'], dict(length_limit=10)),
+                                              ('-b75', ['-b', '75'], dict(byte_limit=75))]:
+    for _flags, _flag_options, _flag_params in [('', [], {}), ('-m', ['-m'], dict(stemming=True)),
+                                                ('-m-s', ['-m', '-s'], dict(stemming=True, stopwords=True))]:
+        sample_configs.append(('ROUGE-test-c95-2-1-U-r1000-n4-w1.2{0}-a{1}'.format(_limit, _flags),
+                               sample_common_options + _limit_options + ['-a'] + _flag_options,
+                               dict(sample_common_params, **_limit_params, **_flag_params)))
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="""ROUGE評価のベンチマークです．
+        同梱のサンプルデータで出力の一致を確認し，処理時間などを履歴ファイルに記録します．""")
+
+    parser.add_argument('-b', '--backends',
+                        nargs='+',
+                        choices=backends,
+                        default=['native'],
+                        help='ROUGEの計算方法を指定します（複数指定可）')
+
+    parser.add_argument('-g', '--gs-data',
+                        nargs='*',
+                        default=default_gs,
+                        help='poliinfoの評価に用いるGSデータを指定します（既定はtestGSの2ファイル）')
+
+    parser.add_argument('-d', '--unidic-path',
+                        help='MeCabで用いるUnidicのパスを指定します（省略するとpoliinfoの評価を行いません）')
+
+    parser.add_argument('-H', '--history',
+                        default=default_history,
+                        help='計測結果を追記する履歴ファイルを指定します（既定はこのスクリプトと同じディレクトリの'
+                             'bench_rouge_history.jsonで，.gitignoreで除外しています）')
+
+    parser.add_argument('-l', '--label',
+                        default='',
+                        help='履歴に記録する説明を指定します')
+
+    parser.add_argument('-t', '--threshold',
+                        type=float,
+                        default=0.2,
+                        help='前回より処理時間がこの割合を超えて増えたら警告します')
+
+    parser.add_argument('--skip-sample',
+                        action='store_true',
+                        help='sampleの評価を行いません')
+
+    return parser.parse_args()
+
+
+class CountingPopen(subprocess.Popen):
+    """起動した子プロセスを数えるPopen．"""
+    count = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingPopen.count += 1
+        super().__init__(*args, **kwargs)
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    # Linuxのru_maxrssはKB単位
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+
+def latency_ms(times: List[float]) -> Dict[str, float]:
+    times = sorted(t * 1000 for t in times)
+    return {
+        'mean': sum(times) / len(times),
+        'p50': times[len(times) // 2],
+        'p95': times[min(len(times) - 1, int(len(times) * 0.95))],
+        'max': times[-1]
+    }
+
+
+def load_sample_evals() -> Dict[str, List[tuple]]:
+    """ROUGE-test.xmlのEVALを，システムIDごとに(システム要約, [参照要約, ...])の並びにする．"""
+    from rouge.native import read_lines
+    root = ET.parse(str(sample_test_dir / 'ROUGE-test.xml')).getroot()
+    evals = {}  # type: Dict[str, List[tuple]]
+    for ev in root.iter('EVAL'):
+        peer_root = sample_test_dir / ev.find('PEER-ROOT').text.strip()
+        model_root = sample_test_dir / ev.find('MODEL-ROOT').text.strip()
+        input_format = ev.find('INPUT-FORMAT').get('TYPE')
+        models = [read_lines(str(model_root / m.text.strip()), input_format) for m in ev.find('MODELS')]
+        for p in ev.find('PEERS'):
+            evals.setdefault(p.get('ID'), []).append((read_lines(str(peer_root / p.text.strip()), input_format),
+                                                      models))
+    return evals
+
+
+def run_sample(name: str, options: List[str], params: dict, backend: str) -> dict:
+    with open(str(sample_output_dir / (name + '.out'))) as f:
+        expected = f.read().splitlines()
+    result = {}
+    start = time.perf_counter()
+    if backend == 'perl':
+        output = subprocess.check_output(['perl', str(original_dir / 'ROUGE-1.5.5.pl'), '-e', '../data'] + options +
+                                         ['ROUGE-test.xml'], cwd=str(sample_test_dir), stderr=subprocess.PIPE)
+        lines = output.decode('utf-8').splitlines()
+        result['wall'] = time.perf_counter() - start
+        result['instances'] = len(ET.parse(str(sample_test_dir / 'ROUGE-test.xml')).getroot().findall('EVAL/PEERS/P'))
+        result['latency_ms'] = {'mean': result['wall'] * 1000 / result['instances']}
+    else:
+        from rouge.native import NativeRouge
+        rouge = NativeRouge(profile='original', **params)
+        evals = load_sample_evals()
+        lines = []
+        for peer_id in sorted(evals.keys()):
+            lines += rouge.output_lines(rouge.evaluate(evals[peer_id]), peer_id=peer_id)
+        result['wall'] = time.perf_counter() - start
+        times = []
+        for peer_id in sorted(evals.keys()):
+            for peer, models in evals[peer_id]:
+                t = time.perf_counter()
+                rouge.score(peer, models)
+                times.append(time.perf_counter() - t)
+        result['instances'] = len(times)
+        result['latency_ms'] = latency_ms(times)
+    result['mismatches'] = sum(a != b for a, b in zip(lines, expected)) + abs(len(lines) - len(expected))
+    result['digest'] = hashlib.sha1('\n'.join(lines).encode('utf-8')).hexdigest()
+    return result
+
+
+def run_poliinfo(gs_path: str, backend: str, unidic_path: str) -> dict:
+    from rouge.pythonrouge import Pythonrouge
+    from rouge.vocabulary import Vocabulary
+    from poliinfo_eval_summarization import (extract_types, rouge_params, load_gs, new_tokenizer,
+                                             build_reference_indexes, evaluate_file)
+    gs_map = load_gs(gs_path)
+    with open(gs_path) as f:
+        sources = {ins['ID'].split('-')[-1]: ins['Source'] for ins in json.load(f)}
+    # 原文の先頭を制限字数で切り取った要約（Sourceの改行は\nという2文字で書かれている）
+    run = [{'ID': 'Summarization-Lead-{0}'.format(i),
+            'Summary': sources[i].replace('\\n', '')[:max_len]} for i, (max_len, _) in gs_map.items()]
+    run_type = pathlib.Path(gs_path).stem.split('-')[0]
+    eval_args = argparse.Namespace(gs_data=gs_path, unidic_path=unidic_path, output_dir=None, rouge_backend=backend,
+                                   reference_index=None, cache_dir=None, bootstrap_samples=1000, confidence=95,
+                                   rouge_jobs=1, extract_types=extract_types, keep_punctuation=False,
+                                   char_only=False)
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_path = pathlib.Path(tmp_dir) / 'PoliInfo-Summarization-{0}_Lead-1.json'.format(run_type)
+        with run_path.open('w') as f:
+            json.dump(run, f, ensure_ascii=False)
+        eval_args.output_dir = tmp_dir
+
+        start = time.perf_counter()
+        tokenizer = new_tokenizer(eval_args)
+        reference_tokens = dict(zip(gs_map.keys(), tokenizer.tokenize_batch([r for _, r in gs_map.values()])))
+        indexes = build_reference_indexes(eval_args, gs_path, gs_map, reference_tokens)
+        vocabularies = [Vocabulary(index.vocabulary) for index in indexes]
+        row = evaluate_file(str(run_path), eval_args, gs_map, tokenizer, indexes, vocabularies)
+        result['wall'] = time.perf_counter() - start
+        with (pathlib.Path(tmp_dir) / 'Result-{0}.txt'.format(run_path.stem)).open() as f:
+            details = f.read()
+
+    # 1インスタンスずつの評価（語の解析とPythonrougeの呼び出しを含む）
+    times = []
+    for ins in run:
+        i = ins['ID'].split('-')[-1]
+        t = time.perf_counter()
+        tokens = tokenizer.tokenize_batch([ins['Summary']])[0]
+        for j in range(len(extract_types)):
+            Pythonrouge(summary_file_exist=False, summary=[vocabularies[j].intern(tokens[j])],
+                        reference=[indexes[j].models(i)], backend=backend,
+                        **rouge_params).calc_score(per_eval=True)
+        times.append(time.perf_counter() - t)
+    result['instances'] = len(times)
+    result['latency_ms'] = latency_ms(times)
+    result['digest'] = hashlib.sha1((details + row).encode('utf-8')).hexdigest()
+    return result
+
+
+def run_case(case: dict) -> dict:
+    """1つの評価を実行して計測結果を返す（新しいプロセスの中で呼ばれる）．"""
+    sys.path.insert(0, str(base_dir))
+    subprocess.Popen = CountingPopen
+    result = dict(case)
+    try:
+        if case['kind'] == 'sample':
+            config = {name: (options, params) for name, options, params in sample_configs}[case['name']]
+            result.update(run_sample(case['name'], config[0], config[1], case['backend']))
+        else:
+            result.update(run_poliinfo(case['gs'], case['backend'], case['unidic_path']))
+    except subprocess.CalledProcessError as e:
+        # ROUGE-1.5.5.plのエラーは出力の1行目に出る
+        output = (e.stderr or e.output or b'').decode('utf-8', 'replace').strip()
+        result['error'] = output.splitlines()[0] if output else str(e)
+    except Exception as e:
+        result['error'] = '{0}: {1}'.format(type(e).__name__, e)
+    result['spawns'] = CountingPopen.count
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def case_key(case: dict) -> str:
+    return '{0}:{1}:{2}'.format(case['kind'], case['name'], case['backend'])
+
+
+def load_history(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def previous_results(history: List[dict]) -> Dict[str, dict]:
+    """各評価の最新の（エラーでない）記録．"""
+    previous = {}
+    for entry in history:
+        for case in entry['cases']:
+            if 'error' not in case:
+                previous[case_key(case)] = case
+    return previous
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=str(base_dir),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = get_args()
+
+    cases = []
+    if not args.skip_sample:
+        for name, _, _ in sample_configs:
+            for backend in args.backends:
+                cases.append({'kind': 'sample', 'name': name, 'backend': backend})
+    if args.unidic_path:
+        for gs_path in args.gs_data:
+            for backend in args.backends:
+                cases.append({'kind': 'poliinfo', 'name': pathlib.Path(gs_path).stem, 'backend': backend,
+                              'gs': str(pathlib.Path(gs_path).resolve()), 'unidic_path': args.unidic_path})
+
+    # 計測値（特に最大RSS）が他の評価の影響を受けないよう，評価ごとにプロセスを作る
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(run_case, case).result())
+
+    history = load_history(args.history)
+    previous = previous_results(history)
+
+    failed = False
+    print('\t'.join(['評価', 'バックエンド', '不一致', '処理時間[s]', '前回比', '起動回数', 'インスタンス数',
+                     '平均[ms]', '95%点[ms]', '最大RSS[MB]']))
+    for result in results:
+        key = case_key(result)
+        if 'error' in result:
+            failed = True
+            print('\t'.join([result['name'], result['backend'], 'エラー: ' + result['error']]))
+            continue
+        prev = previous.get(key)
+        ratio = result['wall'] / prev['wall'] if prev is not None and prev['wall'] > 0 else None
+        latency = result['latency_ms']
+        print('\t'.join([result['name'], result['backend'], str(result.get('mismatches', '-')),
+                         '{0:.3f}'.format(result['wall']), '{0:.2f}'.format(ratio) if ratio is not None else '-',
+                         str(result['spawns']), str(result['instances']), '{0:.2f}'.format(latency['mean']),
+                         '{0:.2f}'.format(latency['p95']) if 'p95' in latency else '-',
+                         '{0:.1f}'.format(max(result['peak_rss_mb'].values()))]))
+        if result.get('mismatches', 0) > 0:
+            failed = True
+        if ratio is not None and ratio > 1 + args.threshold:
+            print('警告: {0} の処理時間が前回の{1:.2f}倍になりました'.format(key, ratio), file=sys.stderr)
+        if prev is not None and prev.get('digest') != result['digest']:
+            print('警告: {0} の評価結果が前回と異なります'.format(key), file=sys.stderr)
+
+    # poliinfoの評価結果をバックエンド間で比較
+    digests = defaultdict(set)
+    for result in results:
+        if result['kind'] == 'poliinfo' and 'error' not in result:
+            digests[result['name']].add(result['digest'])
+    for name, values in digests.items():
+        if len(values) > 1:
+            failed = True
+            print('不一致: {0} の評価結果がバックエンドによって異なります'.format(name), file=sys.stderr)
+
+    history.append({
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'cases': results
+    })
+    with open(args.history, 'w') as f:
+        json.dump(history, f, ensure_ascii=False, indent=1)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""tokenizer.pyの形態素解析のベンチマーク．
+語のとり方ごとにMeCabで解析し直す従来の方法（legacy_extract_words, extract_all_words）と，
+1回の解析から3種類の語列を作るtokenizeとで，結果が一致することを確認し，処理時間を比較します．
+内容語の取り出しは，tokenizeと同じcontent_words_ofを使う現在のextract_wordsではなく，
+書き換える前の実装をここに残して比べます（漢数字の読み取りもbench_kanji_numerals.pyに残した従来の実装を使います）．
+"""
+
+import sys
+import argparse
+import json
+import time
+import MeCab
+from tokenizer import extract_all_words, tokenize, is_content_word, is_noun, is_numeral, functional_verbs
+from bench_kanji_numerals import legacy_parse_kanji_numerals
+from typing import List
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="""形態素解析のベンチマークです．
+        従来の解析方法とtokenizeの結果が一致するかを確認し，処理時間を比較します．""")
+
+    parser.add_argument('-i', '--input-files',
+                        nargs='+',
+                        required=True,
+                        help='解析対象のテキスト（Summary, Source）を含むJSONファイルを指定します')
+
+    parser.add_argument('-d', '--unidic-path',
+                        required=True,
+                        help='MeCabで用いるUnidicのパスを指定します'
+                        )
+
+    parser.add_argument('-r', '--repeat',
+                        type=int,
+                        default=3,
+                        help='計測の繰り返し回数を指定します（最速の値を報告します）'
+                        )
+
+    return parser.parse_args()
+
+
+def load_texts(paths: List[str]) -> List[str]:
+    texts = []
+    for path in paths:
+        with open(path) as f:
+            for ins in json.load(f):
+                for key in ['Summary', 'Source']:
+                    if ins.get(key):
+                        texts.append(ins[key])
+    return texts
+
+
+def legacy_extract_words(mecab, s: str) -> List[str]:
+    """書き換える前のextract_words（MeCabの出力行を1行ずつ見て内容語を取り出す）．"""
+    parsed = mecab.parse(s)
+    ret = []
+    compound_nouns = []
+    numerals = []
+
+    def append(term):
+        if term not in functional_verbs:
+            ret.append(term)
+
+    def extract_compound_noun():
+        if len(compound_nouns) > 0:
+            append(''.join(compound_nouns))
+            compound_nouns.clear()
+
+    def extractNumeral():
+        if len(numerals) > 0:
+            x = legacy_parse_kanji_numerals(''.join(numerals))
+            if x is not None:
+                compound_nouns.append(str(x))
+            numerals.clear()
+
+    def compound_noun(tokens: List[str]):
+        if len(tokens) < 5:
+            return
+
+        pos = tokens[4]
+
+        def buffer_noun():
+            compound_nouns.append(tokens[3].strip())
+
+        def buffer_numeral():
+            numerals.append(tokens[3].strip())
+
+        def extract_content_word():
+            if is_content_word(pos):
+                append(tokens[3].strip())
+
+        if is_noun(pos, tokens[0]):
+            if is_numeral(pos):
+                buffer_numeral()
+            else:
+                extractNumeral()
+                buffer_noun()
+        else:
+            extractNumeral()
+            extract_compound_noun()
+            extract_content_word()
+
+    for line in filter(lambda x: x != 'EOS', parsed.splitlines()):
+        tmp = line.split('\t')
+        if len(tmp) > 1:
+            compound_noun(tmp)
+        else:
+            append(tmp[0])
+
+    extractNumeral()
+    extract_compound_noun()
+
+    return ret
+
+
+def legacy(mecab, s: str) -> List[List[str]]:
+    return [
+        legacy_extract_words(mecab, s),
+        extract_all_words(mecab, s, False),
+        extract_all_words(mecab, s, True)
+    ]
+
+
+def measure(func, mecab, texts: List[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for s in texts:
+            func(mecab, s)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    args = get_args()
+    mecab = MeCab.Tagger('-d {0}'.format(args.unidic_path))
+    texts = load_texts(args.input_files)
+
+    # 一致確認
+    mismatches = 0
+    for s in texts:
+        if legacy(mecab, s) != tokenize(mecab, s):
+            mismatches += 1
+            print('mismatch: {0}'.format(s[:50]), file=sys.stderr)
+
+    legacy_time = measure(legacy, mecab, texts, args.repeat)
+    single_time = measure(tokenize, mecab, texts, args.repeat)
+
+    print('テキスト数\t{0}'.format(len(texts)))
+    print('文字数\t{0}'.format(sum(len(s) for s in texts)))
+    print('不一致\t{0}'.format(mismatches))
+    print('従来（3回解析）[s]\t{0:.3f}'.format(legacy_time))
+    print('tokenize（1回解析）[s]\t{0:.3f}'.format(single_time))
+    print('速度比\t{0:.2f}'.format(legacy_time / single_time))
+
+    if mismatches > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""NTCIR-14 QA Lab PoliInfo SummarizationタスクのGSについて，抽出型要約で到達できるROUGEスコアの上限（オラクル）を求めるスクリプト．
+IDごとに，原文（Source）の文から制限字数以内で選んだ組み合わせのうち，指定したROUGEスコアが最も高いものを探します．
+文の組み合わせはrouge.oracleの貪欲法・ビームサーチで探し，ROUGE-N・ROUGE-SU4では分枝限定法で最適性を確かめます．
+選んだ要約は評価スクリプトと同じ方法（語列の作り方とROUGEの設定）で採点し直して出力します．
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from rouge.pythonrouge import Pythonrouge
+from rouge.vocabulary import Vocabulary
+from rouge.oracle import make_objective, parse_measure, search
+from tokenizer import extract_types
+from poliinfo_eval_summarization import rouge_types, rouge_params, load_gs, new_tokenizer, build_reference_indexes
+from typing import List
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="""PoliInfo SummarizationタスクのGSについて，原文の文を選んで作る抽出型要約の
+        ROUGEスコアの上限（オラクル）を求めます．""")
+
+    parser.add_argument('-g', '--gs-data',
+                        required=True,
+                        help='GSデータを指定します'
+                        )
+
+    parser.add_argument('-d', '--unidic-path',
+                        help='MeCabで用いるUnidicのパスを指定します（語のとり方が文字のときは不要です）'
+                        )
+
+    parser.add_argument('-e', '--extract-type',
+                        choices=extract_types,
+                        default=extract_types[0],
+                        help='語のとり方を指定します（既定: 内容語）'
+                        )
+
+    parser.add_argument('-m', '--measure',
+                        default='ROUGE-2-R',
+                        help='最大化するROUGEスコアを指定します（例: ROUGE-1-R，ROUGE-2-F，ROUGE-SU4-R，ROUGE-L-F）'
+                        )
+
+    parser.add_argument('-s', '--search',
+                        choices=['greedy', 'beam', 'exact'],
+                        default='exact',
+                        help='探索方法を指定します（greedy: 貪欲法，beam: ビームサーチ，'
+                             'exact: ビームサーチの結果から分枝限定法で最適解を求める（既定．ROUGE-L・Wではbeamと同じ））'
+                        )
+
+    parser.add_argument('-w', '--beam-width',
+                        type=int,
+                        default=8,
+                        help='ビームサーチで残す組み合わせの数を指定します'
+                        )
+
+    parser.add_argument('--max-nodes',
+                        type=int,
+                        default=100000,
+                        help='分枝限定法で調べる組み合わせの数の上限を指定します（超えたIDは最適性を保証しません）'
+                        )
+
+    parser.add_argument('-o', '--output',
+                        help='オラクル要約を評価データと同じ形式のJSONファイルに書き出します'
+                        )
+
+    parser.add_argument('--cache-dir',
+                        help='形態素解析結果のキャッシュを保存するディレクトリを指定します（省略時はキャッシュしません）'
+                        )
+
+    parser.add_argument('--reference-index',
+                        help='GSの要約の語ID列とn-gram表（参照インデックス）を保存するディレクトリを指定します'
+                        )
+
+    parser.add_argument('--keep-punctuation',
+                        action='store_true',
+                        help='文字単位の評価で句読点を取り除かずに残します'
+                        )
+
+    args = parser.parse_args()
+    if args.extract_type != '文字' and args.unidic_path is None:
+        parser.error('--unidic-path is required unless --extract-type is 文字')
+    try:
+        parse_measure(args.measure)
+    except ValueError as err:
+        parser.error(str(err))
+    # 評価スクリプトの関数に渡す設定
+    args.extract_types = [args.extract_type]
+    args.char_only = args.extract_type == '文字'
+    return args
+
+
+def source_sentences(source: str) -> List[str]:
+    # Sourceの改行は\nという2文字で書かれている
+    return [s for s in source.split('\\n') if s != '']
+
+
+def main():
+    args = get_args()
+    start = time.perf_counter()
+
+    gs_map = load_gs(args.gs_data)
+    with open(args.gs_data) as f:
+        instances = json.load(f)
+    tokenizer = new_tokenizer(args)
+    references = tokenizer.tokenize_batch([reference for _, reference in gs_map.values()])
+    index = build_reference_indexes(args, args.gs_data, gs_map, dict(zip(gs_map.keys(), references)))[0]
+    vocabulary = Vocabulary(index.vocabulary)
+    scorer = Pythonrouge(summary_file_exist=False, summary=[], reference=[], **rouge_params).native_scorer()
+
+    # 全IDの原文の文をまとめて解析する
+    sentences = [source_sentences(ins['Source']) for ins in instances]
+    tokens = iter(tokenizer.tokenize_batch([s for ss in sentences for s in ss]))
+    candidates = [[vocabulary.intern(next(tokens)[0]) for _ in ss] for ss in sentences]
+
+    oracle = []
+    rows = []
+    for ins, ss, cs in zip(instances, sentences, candidates):
+        i = ins['ID'].split('-')[-1]
+        max_len, _ = gs_map[i]
+        models = index.models(i)
+        objective = make_objective(scorer, models, cs, args.measure)
+        selection, proven = search(objective, [len(s) for s in ss], max_len, args.search, args.beam_width,
+                                   args.max_nodes)
+        summary = ''.join(ss[k] for k in selection.indices)
+        oracle.append({'ID': ins['ID'], 'Summary': summary})
+        rows.append((ins['ID'], max_len, summary, selection, proven))
+
+    # 選んだ要約を評価スクリプトと同じ方法で採点する
+    extracted = tokenizer.tokenize_batch([summary for _, _, summary, _, _ in rows])
+    tokenizer.close()
+    columns = ['{0}-{1}'.format(rt, st) for st in ['R', 'F'] for rt in rouge_types]
+    print('\t'.join(['ID', '制限字数', '解答字数', '文番号', '最適', '探索値'] +
+                    ['{0}_{1}'.format(c, args.extract_type) for c in columns]))
+    score_rows = []
+    for (ins_id, max_len, summary, selection, proven), tokens in zip(rows, extracted):
+        i = ins_id.split('-')[-1]
+        results = dict(scorer.score_tables(scorer.token_tables(vocabulary.intern(tokens[0])), index.models(i)))
+        scores = [results[rt][0] if st == 'R' else results[rt][2] for st in ['R', 'F'] for rt in rouge_types]
+        score_rows.append(scores)
+        print('\t'.join([ins_id, str(max_len), str(len(summary)), ','.join(str(k + 1) for k in selection.indices),
+                         '1' if proven else '0', '{0:.5f}'.format(selection.value)] +
+                        ['{0}'.format(x) for x in scores]))
+    means = np.mean(np.array(score_rows), axis=0) if score_rows else np.zeros(len(columns))
+    print('\t'.join(['平均', '', '', '', str(sum(1 for r in rows if r[4])), ''] + ['{0}'.format(x) for x in means]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(oracle, f, ensure_ascii=False, indent=2)
+    print('{0} IDs, {1} proven optimal, {2:.2f}s'.format(len(rows), sum(1 for r in rows if r[4]),
+                                                         time.perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,65 +4,46 @@
 """NTCIR-14 QA Lab PoliInfo SummarizationタスクのROUGE自動評価スクリプト．
 動作要件として，以下のモジュールが必要です．
 ・mecab-python3
+・numpy
 
 更新：2018.08.17
 作成者：乙武 北斗
 """
 
 import sys
+import time
 import argparse
 import json
 import pathlib
-import MeCab
 import re
 import math
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
-from rouge.pythonrouge import Pythonrouge
-from typing import Dict, Tuple, Optional, TypeVar, List
+from rouge.pythonrouge import Pythonrouge, calc_scores
+from rouge.index import ReferenceIndex, scorer_config
+from rouge.vocabulary import Vocabulary
+from token_cache import TokenCache, dictionary_id
+from score_store import ScoreStore, config_key
+from profiler import NullProfiler, Profiler, null_profiler
+from tokenizer import (extract_types, morph_extract_types, token_settings, Tokenizer, MecabTokenizer,
+                       CharTokenizer, CachedTokenizer, ViewTokenizer)
+from typing import Dict, Tuple, Optional, List
 from tqdm import tqdm
 
-T = TypeVar('T')
 
-functional_verbs = {"為る", "居る", "成る", "有る"}
-content_words = ["助詞", "助動詞", "感動詞", "空白", "補助記号", "記号-一般"]
-adverbial_nouns = {"所", "為", "くらい"}
-formal_nouns = {"の", "事", "物", "積り", "訳"}
-numeral_notation1_regex = re.compile(r'([^兆億万]+兆)?([^兆億万]+億)?([^兆億万]+万)?([^兆億万]*)')
-numeral_notation2_regex = re.compile(r'([^千百十]*千)?([^千百十]*百)?([^千百十]*十)?([^千百十]*)')
+# ROUGEスコア種別
+rouge_types = ['ROUGE-1', 'ROUGE-2', 'ROUGE-3', 'ROUGE-4', 'ROUGE-L', 'ROUGE-SU4', 'ROUGE-W-1.2']
 
-
-def nonEmpty(s: str) -> bool:
-    return s is not None and s != ''
-
-
-def isEmpty(s: str) -> bool:
-    return not nonEmpty(s)
-
-
-def or_else(n: Optional[T], e: T) -> T:
-    return n if n is not None else e
-
-
-def is_content_word(pos: str) -> bool:
-    for el in content_words:
-        if pos.startswith(el):
-            return False
-    return True
-
-
-def is_noun(pos: str, original: str) -> bool:
-    return (pos.startswith('名詞') or pos == "記号-文字" or pos.startswith(
-        "接尾辞-名詞的") or pos == "接頭辞") and (original not in adverbial_nouns) and (original not in formal_nouns)
-
-
-def is_numeral(pos: str) -> bool:
-    return pos == '名詞-数詞'
+# ROUGEの設定
+rouge_params = dict(n_gram=4, ROUGE_SU4=True, ROUGE_L=True, ROUGE_W=True, resampling=False)
 
 
 def get_args():
     parser = argparse.ArgumentParser(
         description="""NTCIR-14 QA Lab PoliInfo SummarizationタスクのROUGE自動評価スクリプトです．
-        動作要件として，mecab-python3モジュールが必要です．""")
+        動作要件として，mecab-python3，numpyモジュールが必要です．""")
 
     parser.add_argument('-i', '--input-files',
                         nargs='+',
@@ -70,13 +51,14 @@ def get_args():
                         help='評価対象のJSONファイルを指定します')
 
     parser.add_argument('-g', '--gs-data',
+                        nargs='+',
                         required=True,
-                        help='GSデータを指定します'
+                        help='GSデータを指定します．複数指定すると，評価データごとに対応するGSを'
+                             'ファイル名（Single・Multi）またはIDから選び，GSごとに全体結果を出力します'
                         )
 
     parser.add_argument('-d', '--unidic-path',
-                        required=True,
-                        help='MeCabで用いるUnidicのパスを指定します'
+                        help='MeCabで用いるUnidicのパスを指定します（--char-onlyのときは不要です）'
                         )
 
     parser.add_argument('-o', '--output-dir',
@@ -84,272 +66,486 @@ def get_args():
                         help='個別評価結果の出力ディレクトリを指定します'
                         )
 
-    return parser.parse_args()
-
-
-def load_gs(path: str) -> Dict[str, Tuple[int, str]]:
-    pat = re.compile(r'(\d+)字以内')
-    gs = {}
-    with open(path) as f:
-        gs = json.load(f)
-
-    gs_map = {}  # type: Dict[str, Tuple[int, str]]
-    for ins in gs:
-        i = ins['ID'].split('-')[-1]
-        gs_map[i] = (int(pat.match(ins['Length']).group(1)), ins['Summary'])
-    return gs_map
+    parser.add_argument('--rouge-backend',
+                        choices=['native', 'perl'],
+                        default='native',
+                        help='ROUGEの計算方法を指定します（native: Python実装（既定），perl: ROUGE-1.5.5.pl）'
+                        )
 
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=1,
+                        help='評価データを並列に評価するプロセス数を指定します'
+                        )
 
-def word2ids(summary: List[str], reference: List[str]) -> Tuple[List[List[str]], List[List[List[str]]]]:
-    id_dict = defaultdict(lambda: len(id_dict))
-    rsummary = [[' '.join([str(id_dict[w]) for w in summary])]]
-    rreference = [[[' '.join([str(id_dict[w]) for w in reference])]]]
-    # summary = [[' '.join([str(id_dict[w]) for w in sent.split()])
-    #             for sent in doc] for doc in summary]
-    # reference = [[[' '.join([str(id_dict[w]) for w in sent.split()])
-    #                for sent in doc] for doc in refs] for refs in reference]
-    return rsummary, rreference
+    parser.add_argument('--rouge-jobs',
+                        type=int,
+                        default=1,
+                        help='同時に実行するROUGE-1.5.5.plの数を指定します（perlのときのみ）．'
+                             '語のとり方ごとの評価を同時に行い，2より大きければインスタンスも分けて評価します'
+                        )
 
+    parser.add_argument('--cache-dir',
+                        help='形態素解析結果のキャッシュを保存するディレクトリを指定します（省略時はキャッシュしません）'
+                        )
 
-def replace_all_kanji_to_arabic(numerals: str) -> str:
-    tmp = numerals.replace("一", "1").replace("二", "2").replace("三", "3").replace("四", "4").replace("五", "5").replace(
-        "六", "6").replace("七", "7").replace("八", "8").replace("九", "9").replace("〇", "0")
-    tmp = re.sub(r'[^0123456789]', '', tmp)
-    tmp = re.sub(r'^0+', '', tmp)
-    return tmp
+    parser.add_argument('--reference-index',
+                        help='GSの要約の語ID列とn-gram表（参照インデックス）を保存するディレクトリを指定します．'
+                             'GS・Unidic・設定が同じなら次回からはそれを読み込みます'
+                        )
 
+    parser.add_argument('--score-store',
+                        help='インスタンスごとの評価結果を保存するディレクトリを指定します．'
+                             '評価データを出し直したとき，要約が変わっていないIDは保存した結果を使います'
+                        )
 
-def parse_kanji_numerals(kanji_numerals: str) -> Optional[int]:
-    def p3(numerals: str, has_default: bool) -> Optional[int]:
-        if nonEmpty(numerals):
-            if has_default:
-                return 1
-            else:
-                return None
-        try:
-            return int(replace_all_kanji_to_arabic(numerals))
-        except Exception as err:
-            print(err, file=sys.stderr)
-            return None
-
-    def p4(numerals: str) -> Optional[int]:
-        numeral_array = list(reversed(replace_all_kanji_to_arabic(numerals)))
-        num = 0
-        for i, x in enumerate(numeral_array):
-            try:
-                num += int(int(x) * math.pow(10, i))
-            except:
-                pass
-        return num
-
-    def p2(numerals: str) -> Optional[int]:
-        if isEmpty(numerals):
-            return None
-        mobj = numeral_notation2_regex.match(numerals)
-        if mobj is not None:
-            if nonEmpty(mobj.group(1)) and nonEmpty(mobj.group(2)) and nonEmpty(mobj.group(3)):
-                base2 = 10
-                print(numerals, file=sys.stderr)
-                output2 = or_else(p3(mobj.group(1)[:-1], True), 0) * base2 * base2 * base2 + or_else(
-                    p3(mobj.group(2)[:-1], True), 0) * base2 * base2 + or_else(p3(mobj.group(3)[:-1], True),
-                                                                               0) * base2 + or_else(
-                    p3(mobj.group(4), False), 0)
-                return output2
-            else:
-                return p4(numerals)
-        else:
-            return None
-
-    tmp = kanji_numerals.replace('ゼロ-zero', '〇').replace('零', '〇')
-    matchObj = numeral_notation1_regex.match(tmp)
-    if matchObj is not None:
-        base = 10000
-        default_string = 'a'
-        output = or_else(p2(or_else(matchObj.group(1), default_string)[:-1]), 0) * base * base * base + or_else(
-            p2(or_else(matchObj.group(2), default_string)[:-1]), 0) * base * base + or_else(
-            p2(or_else(matchObj.group(3), default_string)[:-1]), 0) * base + or_else(p2(matchObj.group(4)), 0)
-        return output
-    else:
-        return None
+    parser.add_argument('--invalidate-score-store',
+                        action='store_true',
+                        help='評価の前に--score-storeの保存結果をすべて消します'
+                        )
 
+    parser.add_argument('--bootstrap-samples',
+                        type=int,
+                        default=1000,
+                        help='平均スコアの信頼区間を求めるブートストラップの試行回数を指定します（0で信頼区間を出力しません）'
+                        )
 
-def extract_words(mecab, s: str) -> List[str]:
-    parsed = mecab.parse(s)
-    ret = []
-    compound_nouns = []
-    numerals = []
+    parser.add_argument('--confidence',
+                        type=float,
+                        default=95,
+                        help='信頼区間の信頼水準（%%）を指定します'
+                        )
 
-    def append(term):
-        if term not in functional_verbs:
-            ret.append(term)
+    parser.add_argument('--profile',
+                        metavar='TRACE_JSON',
+                        help='段階ごとの処理時間・回数，IDごとの処理時間の分布，ROUGE-1.5.5.plの起動回数などを計測し，'
+                             '指定したJSONファイルに書き出します（要約は標準エラー出力に表示します）'
+                        )
 
-    def extract_compound_noun():
-        if len(compound_nouns) > 0:
-            append(''.join(compound_nouns))
-            compound_nouns.clear()
+    parser.add_argument('--char-only',
+                        action='store_true',
+                        help='文字単位の評価だけを行います（MeCab・Unidicを使わない簡易評価）'
+                        )
 
-    def extractNumeral():
-        if len(numerals) > 0:
-            x = parse_kanji_numerals(''.join(numerals))
-            if x is not None:
-                compound_nouns.append(str(x))
-            numerals.clear()
+    parser.add_argument('--keep-punctuation',
+                        action='store_true',
+                        help='文字単位の評価で句読点を取り除かずに残します'
+                        )
 
-    def compound_noun(tokens: List[str]):
-        if len(tokens) < 5:
-            return
+    args = parser.parse_args()
+    if not args.char_only and args.unidic_path is None:
+        parser.error('--unidic-path is required unless --char-only is given')
+    if args.invalidate_score_store and not args.score_store:
+        parser.error('--invalidate-score-store requires --score-store')
+    # 評価する語のとり方
+    args.extract_types = ['文字'] if args.char_only else extract_types
+    return args
 
-        pos = tokens[4]
 
-        def buffer_noun():
-            compound_nouns.append(tokens[3].strip())
+def load_gs(path: str) -> Dict[str, Tuple[int, str]]:
+    pat = re.compile(r'(\d+)字以内')
+    gs = {}
+    with open(path) as f:
+        gs = json.load(f)
 
-        def buffer_numeral():
-            numerals.append(tokens[3].strip())
+    gs_map = {}  # type: Dict[str, Tuple[int, str]]
+    for ins in gs:
+        i = ins['ID'].split('-')[-1]
+        gs_map[i] = (int(pat.match(ins['Length']).group(1)), ins['Summary'])
+    return gs_map
 
-        def extract_content_word():
-            if is_content_word(pos):
-                append(tokens[3].strip())
 
-        if is_noun(pos, tokens[0]):
-            if is_numeral(pos):
-                buffer_numeral()
+def bootstrap_confidence_intervals(scores: np.ndarray, valid: np.ndarray, samples: int, confidence: float,
+                                   seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """ID×スコア列の行列から，有効回答の平均とトータルの平均の信頼区間を求める．
+    全試行を一度に計算し，(有効回答, トータル)それぞれ[下限, 上限]×スコア列の配列を返す．
+    """
+    n = scores.shape[0]
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, n, size=(samples, n))
+    # 各試行で各IDが選ばれた回数
+    counts = np.bincount((idx + np.arange(samples)[:, np.newaxis] * n).ravel(),
+                         minlength=samples * n).reshape(samples, n).astype(np.float64)
+    valid = valid.astype(np.float64)
+    sums = counts @ (scores * valid[:, np.newaxis])
+    valid_counts = counts @ valid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means_a = sums / valid_counts[:, np.newaxis]
+    means_t = sums / n
+    q = [(100 - confidence) / 2, 100 - (100 - confidence) / 2]
+    if np.isnan(means_a).all():
+        ci_a = np.full((2, scores.shape[1]), np.nan)
+    else:
+        ci_a = np.nanpercentile(means_a, q, axis=0)
+    return ci_a, np.percentile(means_t, q, axis=0)
+
+
+def build_reference_indexes(args, gs_path: str, gs_map: Dict[str, Tuple[int, str]],
+                            reference_tokens: Dict[str, List[List[str]]]) -> List[ReferenceIndex]:
+    """語のとり方ごとに，GSの要約の語ID列とn-gram表（参照インデックス）を作る．
+    --reference-indexが指定されていれば，作ったものを保存し，次回からはそれを読み込む．
+    """
+    scorer = Pythonrouge(summary_file_exist=False, summary=[], reference=[], **rouge_params).native_scorer()
+    with open(gs_path, 'rb') as f:
+        gs_hash = hashlib.sha1(f.read()).hexdigest()
+    indexes = []
+    settings = token_settings(not args.keep_punctuation)
+    for j, et in enumerate(args.extract_types):
+        key = hashlib.sha1(json.dumps({
+            'gs': gs_hash,
+            'extract_type': et,
+            'dictionary': dictionary_id(args.unidic_path) if et in morph_extract_types else None,
+            'settings': settings.get(et)
+        }, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+        path = None
+        if args.reference_index:
+            path = str(pathlib.Path(args.reference_index) / pathlib.Path(gs_path).stem / et)
+        index = ReferenceIndex.load(path) if path else None
+        if index is not None and index.key == key and index.config == scorer_config(scorer):
+            indexes.append(index)
+            continue
+        vocabulary = Vocabulary()
+        references = {i: [vocabulary.intern(reference_tokens[i][j])] for i in gs_map.keys()}
+        index = ReferenceIndex.build(scorer, references, vocabulary.tokens, key)
+        if path:
+            index.save(path)
+        indexes.append(index)
+    return indexes
+
+
+def score_config(args, index: ReferenceIndex) -> str:
+    """インスタンスごとの評価結果を保存するときの評価設定（語のとり方ごと）．"""
+    return config_key({
+        'reference': index.key,
+        'scorer': index.config,
+        'rouge': rouge_params,
+        'backend': args.rouge_backend
+    })
+
+
+def evaluate_file(path: str, args, gs_map: Dict[str, Tuple[int, str]], tokenizer: Tokenizer,
+                  indexes: List[ReferenceIndex], vocabularies: List[Vocabulary],
+                  store: Optional[ScoreStore] = None, profiler: NullProfiler = null_profiler) -> str:
+    """評価データ1つを評価して個別評価結果を書き出し，全体結果の行を返す．
+    storeがあれば，そこに結果のあるインスタンスは解析・評価せずにそれを使い，新たに評価した結果を保存する．
+    profilerには段階ごとの処理時間を記録する（有効なときは，解析などをIDごとに計測する）．
+    """
+    filename_split = pathlib.Path(path).stem.split('_', 1)
+    task = 'Summarization'
+    run_type = filename_split[0].split('-')[-1]
+    tmp = filename_split[1].split('-')
+    team_name = '-'.join(tmp[:-1])
+    priority = tmp[-1]
+
+    # 統計情報
+    nums = 0
+    avails = 0
+    extract_types = args.extract_types
+    score_sums_a = [defaultdict(float) for _ in extract_types]
+    score_sums_t = [defaultdict(float) for _ in extract_types]
+    # 信頼区間用のID×スコア列の行列
+    score_rows = []
+    valid_flags = []
+
+    # IDごとの処理時間の記録に使う評価データの名前
+    run = pathlib.Path(path).stem
+
+    # 個別評価結果出力先
+    output_path = pathlib.Path(args.output_dir) / pathlib.Path('Result-{0}.txt'.format(pathlib.Path(path).stem))
+
+    # JSON読み込み
+    print('open: {0}'.format(path), file=sys.stderr)
+    with open(path) as f, output_path.open(mode='w') as f2:
+        # 個別結果出力ヘッダ
+        print('\t'.join(['ID', '制限字数', '解答字数', '有効解答', '\t'.join(
+            ['{0}-{1}_{2}'.format(rt, st, et) for st in ['R', 'F'] for et in extract_types for rt in
+             rouge_types])]), file=f2)
+        with profiler.stage('load_json'):
+            instances = json.load(f)
+        ids = [ins['ID'].split('-')[-1] for ins in instances]
+        profiler.count('instances', len(instances))
+        # 語のとり方×インスタンスのスコア
+        eval_scores = [[None] * len(instances) for _ in extract_types]  # type: List[List[Optional[Dict[str, float]]]]
+        if store is not None:
+            configs = [score_config(args, index) for index in indexes]
+            with profiler.stage('score_store.get', len(instances)):
+                for n, ins in enumerate(instances):
+                    for j in range(len(extract_types)):
+                        eval_scores[j][n] = store.get(configs[j], ids[n], ins['Summary'])
+        # 保存した結果のないインスタンスだけを解析・評価する
+        pending = [n for n in range(len(instances))
+                   if any(eval_scores[j][n] is None for j in range(len(extract_types)))]
+
+        summaries = [[] for _ in extract_types]
+        references = [[] for _ in extract_types]
+        with profiler.stage('tokenize', len(pending)):
+            if profiler.enabled:
+                extracted = []
+                for n in pending:
+                    start = time.perf_counter()
+                    extracted += tokenizer.tokenize_batch([instances[n]['Summary']])
+                    profiler.add_latency('tokenize', (run, ids[n]), time.perf_counter() - start)
             else:
-                extractNumeral()
-                buffer_noun()
-        else:
-            extractNumeral()
-            extract_compound_noun()
-            extract_content_word()
-
-    for line in filter(lambda x: x != 'EOS', parsed.splitlines()):
-        tmp = line.split('\t')
-        if len(tmp) > 1:
-            compound_noun(tmp)
-        else:
-            append(tmp[0])
-
-    extractNumeral()
-    extract_compound_noun()
-
-    return ret
-
-
-def extract_all_words(mecab, s: str, is_original: bool) -> List[str]:
-    parsed = mecab.parse(s)
-    idx = 0 if is_original else 3
-    ret = []
+                extracted = tokenizer.tokenize_batch([instances[n]['Summary'] for n in pending])
+        with profiler.stage('intern', len(pending)):
+            for n, extracted_summaries in zip(pending, extracted):
+                start = time.perf_counter() if profiler.enabled else 0
+                for j in range(len(extract_types)):
+                    # 語ID列を参照インデックスのn-gram表と突き合わせる
+                    summaries[j].append(vocabularies[j].intern(extracted_summaries[j]))
+                    references[j].append(indexes[j].models(ids[n]))
+                if profiler.enabled:
+                    profiler.add_latency('intern', (run, ids[n]), time.perf_counter() - start)
+
+        # 語のとり方ごとに全インスタンスをまとめて評価
+        # （perlでは--rouge-jobsに応じてインスタンスを分け，同時に実行する）
+        if pending:
+            chunks = instance_chunks(len(pending), args)
+            rouges = []
+            for j in range(len(extract_types)):
+                for start, end in chunks:
+                    rouges.append(Pythonrouge(summary_file_exist=False,
+                                              summary=summaries[j][start:end], reference=references[j][start:end],
+                                              backend=args.rouge_backend, timing=profiler.enabled, **rouge_params))
+            computed = [[] for _ in extract_types]
+            start = time.perf_counter()
+            with profiler.stage('rouge', len(pending) * len(extract_types)):
+                for k, (_, evals) in enumerate(calc_scores(rouges, per_eval=True, concurrency=args.rouge_jobs)):
+                    computed[k // len(chunks)].extend(evals)
+            if profiler.enabled:
+                record_rouge_timings(profiler, rouges, chunks, [(run, ids[n]) for n in pending],
+                                     time.perf_counter() - start)
+            with profiler.stage('score_store.put'):
+                for j in range(len(extract_types)):
+                    for n, scores in zip(pending, computed[j]):
+                        if store is not None and eval_scores[j][n] is None:
+                            store.put(configs[j], ids[n], instances[n]['Summary'], scores)
+                        eval_scores[j][n] = scores
+
+        for n, ins in enumerate(instances):
+            i = ins['ID'].split('-')[-1]
+            summary = ins['Summary']
+            max_len, reference = gs_map[i]
+            scores = [eval_scores[j][n] for j in range(len(extract_types))]
+
+            nums += 1
+            if len(summary) <= max_len:
+                avails += 1
+                for j in range(len(extract_types)):
+                    for k in scores[j].keys():
+                        score_sums_a[j][k] += scores[j][k]
+            for j in range(len(extract_types)):
+                for k in scores[j].keys():
+                    score_sums_t[j][k] += scores[j][k]
+            score_rows.append([scores[j]['{0}-{1}'.format(rt, st)] for st in ['R', 'F'] for j in
+                               range(len(extract_types)) for rt in rouge_types])
+            valid_flags.append(len(summary) <= max_len)
+
+            # 個別結果出力
+            print('\t'.join([ins['ID'], str(max_len), str(len(summary)), '1' if len(summary) <= max_len else '0',
+                             '\t'.join(
+                                 ['{0}'.format(scores[j]['{0}-{1}'.format(rt, st)]) for st in ['R', 'F'] for j in
+                                  range(len(extract_types)) for rt in rouge_types])]), file=f2)
+
+    # 全体結果
+    row = [team_name, priority, str(avails / nums), '\t'.join(
+        ['{0}'.format(score_sums_a[j]['{0}-{1}'.format(rt, st)] / avails) for st in ['R', 'F'] for j in
+         range(len(extract_types)) for rt in
+         rouge_types]), '\t'.join(
+        ['{0}'.format(score_sums_a[j]['{0}-{1}'.format(rt, st)] / nums) for st in ['R', 'F'] for j in
+         range(len(extract_types)) for rt in
+         rouge_types])]
+    if args.bootstrap_samples > 0:
+        with profiler.stage('bootstrap'):
+            cis = bootstrap_confidence_intervals(np.array(score_rows), np.array(valid_flags),
+                                                 args.bootstrap_samples, args.confidence)
+        row += ['\t'.join(['{0}'.format(x) for x in ci.T.ravel()]) for ci in cis]
+    return '\t'.join(row)
+
+
+def record_rouge_timings(profiler: Profiler, rouges: List[Pythonrouge], chunks: List[Tuple[int, int]],
+                         keys: List[Tuple[str, str]], wall_seconds: float):
+    """ROUGEの計算（rougesは語のとり方×インスタンスの範囲の順）の内訳とIDごとの処理時間を記録する．
+    perlではrougesが同時に動くので，内訳はプロセス時間の累計として記録し，
+    IDごとの処理時間は，経過時間wall_secondsを各IDのプロセス時間の割合で分けたものにする．
+    """
+    total = sum(sum(rouge.eval_seconds) for rouge in rouges)
+    scale = wall_seconds / total if total > 0 else 0
+    for k, rouge in enumerate(rouges):
+        for step, seconds in rouge.timings.items():
+            profiler.add_process_time('rouge.' + step, seconds)
+        profiler.count('perl processes', rouge.processes)
+        start, _ = chunks[k % len(chunks)]
+        for key, seconds in zip(keys[start:], rouge.eval_seconds):
+            profiler.add_latency('rouge', key, seconds * scale)
+
+
+def instance_chunks(n: int, args) -> List[Tuple[int, int]]:
+    """1回のROUGE計算にまとめるインスタンスの範囲．"""
+    if args.rouge_backend != 'perl' or args.rouge_jobs <= len(args.extract_types) or n == 0:
+        return [(0, n)]
+    parts = min(math.ceil(args.rouge_jobs / len(args.extract_types)), n)
+    return [(n * k // parts, n * (k + 1) // parts) for k in range(parts)]
+
+
+def new_tokenizer(args) -> Tokenizer:
+    """args.extract_typesの語列を作るトークナイザ．
+    形態素解析の語列は--cache-dirがあればキャッシュする（文字単位の評価だけならMeCabは使わない）．
+    """
+    tokenizers = [CharTokenizer(not args.keep_punctuation)]  # type: List[Tokenizer]
+    if any(et in morph_extract_types for et in args.extract_types):
+        mecab = MecabTokenizer(args.unidic_path)  # type: Tokenizer
+        if args.cache_dir:
+            mecab = CachedTokenizer(mecab, TokenCache(args.cache_dir, args.unidic_path, token_settings()))
+        tokenizers.append(mecab)
+    return ViewTokenizer(tokenizers, args.extract_types)
+
+
+# 並列評価時の各プロセスの状態（MeCab.Taggerはpickleできないため，プロセスごとに作る）
+worker = {}
+
+
+def init_worker(args, gs_maps: Dict[str, Dict[str, Tuple[int, str]]], indexes: Dict[str, List[ReferenceIndex]],
+                tokenizer: Optional[Tokenizer] = None):
+    """gs_maps・indexesはGSデータごと．tokenizerがなければ作る（1プロセスで評価するときは共有する）．"""
+    worker['args'] = args
+    worker['gs_maps'] = gs_maps
+    worker['tokenizer'] = tokenizer if tokenizer is not None else new_tokenizer(args)
+    worker['store'] = ScoreStore(args.score_store) if args.score_store else None
+    worker['indexes'] = indexes
+    worker['vocabularies'] = {gs: [Vocabulary(index.vocabulary) for index in gs_indexes]
+                              for gs, gs_indexes in indexes.items()}
+    worker['profiler'] = Profiler() if args.profile else null_profiler
+
+
+def store_stats(store: Optional[ScoreStore]) -> Tuple[int, int]:
+    return (store.hits, store.misses) if store is not None else (0, 0)
+
+
+def evaluate_file_in_worker(path: str, gs: str) -> Tuple[str, List[int], Optional[Dict[str, object]]]:
+    """評価データ1つをGSデータgsで評価し，全体結果の行と，語列キャッシュ・評価結果の保存先のヒット数・ミス数，
+    --profileのときはその評価データの計測結果を返す．
+    """
+    tokenizer = worker['tokenizer']
+    store = worker['store']
+    profiler = worker['profiler']
+    before = tokenizer.cache_stats() + store_stats(store)
+    with profiler.stage('evaluate_file'):
+        row = evaluate_file(path, worker['args'], worker['gs_maps'][gs], tokenizer, worker['indexes'][gs],
+                            worker['vocabularies'][gs], store, profiler)
+    after = tokenizer.cache_stats() + store_stats(store)
+    return row, [a - b for a, b in zip(after, before)], profiler.drain() if profiler.enabled else None
+
+
+def route_gs(path: str, gs_maps: Dict[str, Dict[str, Tuple[int, str]]]) -> str:
+    """評価データに対応するGSデータを選ぶ．
+    ファイル名の評価種別（PoliInfo-Summarization-Single_…ならSingle）がGSデータのファイル名の先頭と一致するものを選び，
+    決まらなければ，評価データの全てのIDを含むGSデータを選ぶ．
+    """
+    if len(gs_maps) == 1:
+        return next(iter(gs_maps))
+    run_type = pathlib.Path(path).stem.split('_', 1)[0].split('-')[-1]
+    named = [gs for gs in gs_maps if pathlib.Path(gs).stem.split('-')[0] == run_type]
+    if len(named) == 1:
+        return named[0]
+    with open(path) as f:
+        ids = {ins['ID'].split('-')[-1] for ins in json.load(f)}
+    covering = [gs for gs, gs_map in gs_maps.items() if ids <= gs_map.keys()]
+    if len(covering) == 1:
+        return covering[0]
+    raise ValueError('{0}: cannot tell which GS data to use ({1} match)'.format(path, len(covering)))
 
-    def append(term):
-        ret.append(term)
 
-    for line in filter(lambda x: x != 'EOS', parsed.splitlines()):
-        tmp = line.split('\t')
-        if len(tmp) > 2:
-            append(tmp[idx])
-        else:
-            append(tmp[0])
-    return ret
+def close_worker():
+    worker['tokenizer'].close()
+    if worker['store'] is not None:
+        worker['store'].close()
 
 
 def main():
     args = get_args()
-    mecab = MeCab.Tagger('-d {0}'.format(args.unidic_path))
-
-    # 語のとり方
-    extract_types = ['内容語', '短単位（原形）', '短単位（表層形）']
-
-    # ROUGEスコア種別
-    rouge_types = ['ROUGE-1', 'ROUGE-2', 'ROUGE-3', 'ROUGE-4', 'ROUGE-L', 'ROUGE-SU4', 'ROUGE-W-1.2']
+    started = time.perf_counter()
+    profiler = Profiler() if args.profile else null_profiler
 
     # GS読み込み
-    gs_map = load_gs(args.gs_data)
+    with profiler.stage('load_gs'):
+        gs_maps = {gs: load_gs(gs) for gs in args.gs_data}
+    try:
+        routes = [route_gs(path, gs_maps) for path in args.input_files]
+    except ValueError as err:
+        sys.exit(str(err))
+    # 全GSの要約の解析はまとめて1回だけ行い，全ての評価データで共有する
+    tokenizer = new_tokenizer(args)
+    references = [(gs, i, reference) for gs, gs_map in gs_maps.items() for i, (_, reference) in gs_map.items()]
+    with profiler.stage('tokenize_gs', len(references)):
+        reference_tokens = tokenizer.tokenize_batch([reference for _, _, reference in references])
+    gs_tokens = defaultdict(dict)  # type: Dict[str, Dict[str, List[List[str]]]]
+    for (gs, i, _), tokens in zip(references, reference_tokens):
+        gs_tokens[gs][i] = tokens
+    stats = list(tokenizer.cache_stats()) + [0, 0]
+    with profiler.stage('reference_index', len(args.extract_types) * len(gs_maps)):
+        indexes = {gs: build_reference_indexes(args, gs, gs_map, gs_tokens[gs]) for gs, gs_map in gs_maps.items()}
+    if args.invalidate_score_store:
+        removed = ScoreStore(args.score_store).clear()
+        print('score store: removed {0} files'.format(removed), file=sys.stderr)
+
     # print('Group ID\tPriority\t有効回答率\t平均ROUGEスコア（有効回答）\t平均ROUGEスコア（トータル）')
-    print('\t'.join(['Group ID', 'Priority', '有効回答率', '\t'.join(
-        ['平均{0}-{1}_{2}（有効回答）'.format(rt, st, et) for st in ['R', 'F'] for et in extract_types for rt in
+    header = ['Group ID', 'Priority', '有効回答率', '\t'.join(
+        ['平均{0}-{1}_{2}（有効回答）'.format(rt, st, et) for st in ['R', 'F'] for et in args.extract_types for rt in
          rouge_types]), '\t'.join(
-        ['平均{0}-{1}_{2}（トータル）'.format(rt, st, et) for st in ['R', 'F'] for et in extract_types for rt in
-         rouge_types])]))
-
-    # 評価データ各々に対して
-    for path in tqdm(args.input_files):
-        filename_split = pathlib.Path(path).stem.split('_', 1)
-        task = 'Summarization'
-        run_type = filename_split[0].split('-')[-1]
-        tmp = filename_split[1].split('-')
-        team_name = '-'.join(tmp[:-1])
-        priority = tmp[-1]
-
-        # 統計情報
-        nums = 0
-        avails = 0
-        score_sums_a = [
-            defaultdict(float), defaultdict(float), defaultdict(float)
-        ]
-        score_sums_t = [
-            defaultdict(float), defaultdict(float), defaultdict(float)
-        ]
-
-        # 個別評価結果出力先
-        output_path = pathlib.Path(args.output_dir) / pathlib.Path('Result-{0}.txt'.format(pathlib.Path(path).stem))
-
-        # JSON読み込み
-        print('open: {0}'.format(path), file=sys.stderr)
-        with open(path) as f, output_path.open(mode='w') as f2:
-            # 個別結果出力ヘッダ
-            print('\t'.join(['ID', '制限字数', '解答字数', '有効解答', '\t'.join(
-                ['{0}-{1}_{2}'.format(rt, st, et) for st in ['R', 'F'] for et in extract_types for rt in
-                 rouge_types])]), file=f2)
-            for ins in json.load(f):
-                i = ins['ID'].split('-')[-1]
-                summary = ins['Summary']
-                max_len, reference = gs_map[i]
-                extracted_summaries = [
-                    extract_words(mecab, summary),
-                    extract_all_words(mecab, summary, False),
-                    extract_all_words(mecab, summary, True)
-                ]
-                extracted_references = [
-                    extract_words(mecab, reference),
-                    extract_all_words(mecab, reference, False),
-                    extract_all_words(mecab, reference, True)
-                ]
-                w2is = [
-                    word2ids(extracted_summaries[0], extracted_references[0]),
-                    word2ids(extracted_summaries[1], extracted_references[1]),
-                    word2ids(extracted_summaries[2], extracted_references[2])
-                ]
-                rouges = []
-                for j in range(len(w2is)):
-                    rouges.append(Pythonrouge(summary_file_exist=False,
-                                              summary=w2is[j][0], reference=w2is[j][1],
-                                              n_gram=4, ROUGE_SU4=True, ROUGE_L=True, ROUGE_W=True))
-                scores = [rouge.calc_score() for rouge in rouges]
-
-                nums += 1
-                if len(summary) <= max_len:
-                    avails += 1
-                    for j in range(len(w2is)):
-                        for k in scores[j].keys():
-                            score_sums_a[j][k] += scores[j][k]
-                for j in range(len(w2is)):
-                    for k in scores[j].keys():
-                        score_sums_t[j][k] += scores[j][k]
-
-                # 個別結果出力
-                print('\t'.join([ins['ID'], str(max_len), str(len(summary)), '1' if len(summary) <= max_len else '0',
-                                 '\t'.join(
-                                     ['{0}'.format(scores[j]['{0}-{1}'.format(rt, st)]) for st in ['R', 'F'] for j in
-                                      range(len(w2is)) for rt in rouge_types])]), file=f2)
-
-        # 全体結果
-        print('\t'.join([team_name, priority, str(avails / nums), '\t'.join(
-            ['{0}'.format(score_sums_a[j]['{0}-{1}'.format(rt, st)] / avails) for st in ['R', 'F'] for j in
-             range(len(extract_types)) for rt in
-             rouge_types]), '\t'.join(
-            ['{0}'.format(score_sums_a[j]['{0}-{1}'.format(rt, st)] / nums) for st in ['R', 'F'] for j in
-             range(len(extract_types)) for rt in
-             rouge_types])]))
+        ['平均{0}-{1}_{2}（トータル）'.format(rt, st, et) for st in ['R', 'F'] for et in args.extract_types for rt in
+         rouge_types])]
+    if args.bootstrap_samples > 0:
+        header += ['\t'.join(
+            ['平均{0}-{1}_{2}（{3}）{4:g}%信頼区間{5}'.format(rt, st, et, at, args.confidence, b) for st in ['R', 'F']
+             for et in args.extract_types for rt in rouge_types for b in ['下限', '上限']]) for at in ['有効回答', 'トータル']]
+
+    # 評価データ各々に対して（GSデータごとに入力順で全体結果の行を集める）
+    rows = defaultdict(list)  # type: Dict[str, List[str]]
+    initargs = (args, gs_maps, indexes)
+    if args.jobs > 1:
+        # 評価データをプロセスに割り振る
+        tokenizer.close()
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker, initargs=initargs) as pool:
+            for gs, (row, s, p) in zip(routes, tqdm(pool.map(evaluate_file_in_worker, args.input_files, routes),
+                                                    total=len(args.input_files))):
+                rows[gs].append(row)
+                stats = [a + b for a, b in zip(stats, s)]
+                if p is not None:
+                    profiler.merge(p)
+    else:
+        # GSの解析に使ったトークナイザ（MeCab.Taggerと語列キャッシュ）をそのまま使う
+        init_worker(*initargs, tokenizer)
+        for path, gs in zip(tqdm(args.input_files), routes):
+            row, s, p = evaluate_file_in_worker(path, gs)
+            rows[gs].append(row)
+            stats = [a + b for a, b in zip(stats, s)]
+            if p is not None:
+                profiler.merge(p)
+        close_worker()
+
+    # GSデータごとの全体結果（GSが複数なら，GSデータ名の行に続けて出力し，出力ディレクトリにも書き出す）
+    for k, gs in enumerate(args.gs_data):
+        table = '\n'.join(['\t'.join(header)] + rows[gs])
+        if len(args.gs_data) > 1:
+            if k > 0:
+                print()
+            print('# {0}'.format(gs))
+            summary_path = pathlib.Path(args.output_dir) / 'Summary-{0}.txt'.format(pathlib.Path(gs).stem)
+            with summary_path.open('w') as f:
+                print(table, file=f)
+        print(table)
+
+    if args.cache_dir and not args.char_only:
+        print('token cache: {0} hits, {1} misses'.format(stats[0], stats[1]), file=sys.stderr)
+    if args.score_store:
+        print('score store: {0} hits, {1} misses'.format(stats[2], stats[3]), file=sys.stderr)
+    if profiler.enabled:
+        wall = time.perf_counter() - started
+        instances = profiler.counters['instances']
+        profiler.write(args.profile, wall, instances)
+        for line in profiler.summary_lines(wall, instances):
+            print(line, file=sys.stderr)
 
 
 if __name__ == '__main__':
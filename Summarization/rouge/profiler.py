@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""評価の処理時間の計測（--profile）．
+段階（JSON読み込み，形態素解析，語IDへの変換，ROUGEの計算など）ごとの処理時間・回数・件数と，
+カウンタ（ROUGE-1.5.5.plの起動回数など），IDごとの処理時間の分布を集計し，
+JSONのトレースファイルと標準エラー出力への要約にします．
+
+段階の処理時間は経過時間（壁時計）です．同時に動くROUGE-1.5.5.plのプロセスの時間のように，
+足し合わせると経過時間を超えるものは，プロセス時間の累計として別に集計し，経過時間の順位には入れません．
+
+計測しないときはNullProfilerを使います．どのメソッドも何もしないので，計測のための処理はほぼかかりません．
+IDごとの計測のように呼び出し側で手間のかかるものは，enabledを見て省きます．
+"""
+
+import json
+import math
+import time
+import contextlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# 処理時間の分布の区切り（ミリ秒）
+histogram_bounds = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# トレースファイルに書く，各項目の時間の意味
+clocks = {
+    'stages': 'wall-clock seconds of each stage, summed over worker processes when --jobs > 1; '
+              'nested stages are also counted in their parent',
+    'process_stages': 'cumulative process seconds, summed over ROUGE jobs that run concurrently '
+                      '(--rouge-jobs); not wall-clock time and may exceed wall_seconds',
+    'id_latency_ms': 'wall-clock milliseconds per (run, ID); the rouge stage time of a batch is split '
+                     'among its IDs in proportion to their process time'
+}
+
+
+class NullProfiler:
+    """計測しないときの何もしないプロファイラ．"""
+    enabled = False
+    _null_stage = contextlib.nullcontext()
+
+    def stage(self, name: str, items: int = 0):
+        return self._null_stage
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def add_latency(self, name: str, key: Tuple[str, str], seconds: float):
+        pass
+
+
+null_profiler = NullProfiler()
+
+
+class Profiler(NullProfiler):
+    """段階ごとの処理時間・回数・件数，カウンタ，IDごとの処理時間を集計する．
+    並列評価では各プロセスのdrain()の結果をmerge()で合わせます．
+    """
+    enabled = True
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stages = defaultdict(lambda: [0.0, 0, 0])  # type: Dict[str, List[float]]
+        # 同時に動くものを足し合わせたプロセス時間の累計
+        self.process_stages = defaultdict(lambda: [0.0, 0, 0])  # type: Dict[str, List[float]]
+        self.counters = defaultdict(int)  # type: Dict[str, int]
+        # 段階ごとの(評価データ, ID)別の処理時間
+        self.latencies = defaultdict(lambda: defaultdict(float))  # type: Dict[str, Dict[Tuple[str, str], float]]
+
+    @contextlib.contextmanager
+    def stage(self, name: str, items: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start, 1, items)
+
+    def add_stage(self, name: str, seconds: float, calls: int = 1, items: int = 0):
+        s = self.stages[name]
+        s[0] += seconds
+        s[1] += calls
+        s[2] += items
+
+    def add_process_time(self, name: str, seconds: float, calls: int = 1, items: int = 0):
+        s = self.process_stages[name]
+        s[0] += seconds
+        s[1] += calls
+        s[2] += items
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def add_latency(self, name: str, key: Tuple[str, str], seconds: float):
+        self.latencies[name][key] += seconds
+
+    def drain(self) -> Dict[str, object]:
+        """集計した値を（pickleできる形で）取り出し，集計をやり直す．"""
+        data = {
+            'stages': dict(self.stages),
+            'process_stages': dict(self.process_stages),
+            'counters': dict(self.counters),
+            'latencies': {name: dict(v) for name, v in self.latencies.items()}
+        }
+        self.reset()
+        return data
+
+    def merge(self, data: Dict[str, object]):
+        for name, (seconds, calls, items) in data['stages'].items():
+            self.add_stage(name, seconds, calls, items)
+        for name, (seconds, calls, items) in data['process_stages'].items():
+            self.add_process_time(name, seconds, calls, items)
+        for name, n in data['counters'].items():
+            self.counters[name] += n
+        for name, values in data['latencies'].items():
+            for key, seconds in values.items():
+                self.latencies[name][key] += seconds
+
+    def id_latencies(self) -> Dict[str, List[float]]:
+        """段階ごとと全段階の合計（'total'）の，IDごとの処理時間の一覧．"""
+        total = defaultdict(float)
+        for values in self.latencies.values():
+            for key, seconds in values.items():
+                total[key] += seconds
+        result = {name: list(values.values()) for name, values in self.latencies.items()}
+        result['total'] = list(total.values())
+        return result
+
+    def report(self, wall_seconds: float, instances: int) -> Dict[str, object]:
+        """トレースファイルに書き出す内容．"""
+        return {
+            'wall_seconds': wall_seconds,
+            'instances': instances,
+            'instances_per_second': instances / wall_seconds if wall_seconds > 0 else None,
+            'clocks': clocks,
+            'stages': stage_table(self.stages),
+            'process_stages': stage_table(self.process_stages),
+            'counters': dict(sorted(self.counters.items())),
+            'id_latency_ms': {name: latency_summary(values) for name, values in self.id_latencies().items()}
+        }
+
+    def write(self, path: str, wall_seconds: float, instances: int):
+        with open(path, 'w') as f:
+            json.dump(self.report(wall_seconds, instances), f, ensure_ascii=False, indent=2)
+
+    def summary_lines(self, wall_seconds: float, instances: int, top: int = 8) -> List[str]:
+        """標準エラー出力に出す短い要約．"""
+        report = self.report(wall_seconds, instances)
+        lines = ['profile: {0} instances in {1:.2f}s ({2:.1f} instances/s)'.format(
+            instances, wall_seconds, report['instances_per_second'] or 0)]
+        for name, s in list(report['stages'].items())[:top]:
+            lines.append('  {0:<24}{1:9.3f}s {2:7d} calls {3:8d} items'.format(name, s['seconds'], s['calls'],
+                                                                                  s['items']))
+        if report['process_stages']:
+            lines.append('  cumulative process time (concurrent jobs summed, not wall time):')
+            for name, s in report['process_stages'].items():
+                lines.append('    {0:<22}{1:9.3f}s {2:7d} calls'.format(name, s['seconds'], s['calls']))
+        if report['counters']:
+            lines.append('  ' + ', '.join('{0}: {1}'.format(k, v) for k, v in report['counters'].items()))
+        total = report['id_latency_ms']['total']
+        if total['count']:
+            lines.append('  per ID: p50 {0:.2f}ms, p90 {1:.2f}ms, p99 {2:.2f}ms, max {3:.2f}ms'.format(
+                total['p50'], total['p90'], total['p99'], total['max']))
+        return lines
+
+
+def stage_table(stages: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    # 時間の長い順
+    return {name: {'seconds': s[0], 'calls': s[1], 'items': s[2]}
+            for name, s in sorted(stages.items(), key=lambda x: -x[1][0])}
+
+
+def percentile(values: List[float], q: float) -> float:
+    # 最近傍順位法（valuesは昇順）
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, object]:
+    """処理時間（秒）の一覧から，ミリ秒単位の統計量と分布を求める．"""
+    values = sorted(s * 1000 for s in seconds)
+    counts = [0] * (len(histogram_bounds) + 1)
+    k = 0
+    for v in values:
+        while k < len(histogram_bounds) and v > histogram_bounds[k]:
+            k += 1
+        counts[k] += 1
+    summary = {'count': len(values)}  # type: Dict[str, object]
+    if values:
+        summary.update({
+            'mean': sum(values) / len(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'max': values[-1]
+        })
+    summary['histogram'] = [{'le': b, 'count': c} for b, c in zip(histogram_bounds + [None], counts)]
+    return summary
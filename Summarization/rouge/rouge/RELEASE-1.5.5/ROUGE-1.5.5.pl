@@ -177,6 +177,7 @@ use XML::DOM;
 use DB_File;
 use Getopt::Std;
 use Encode;
+use MIME::Base64;
 #-------------------------------------------------------------------------------------
 use vars qw($opt_a $opt_b $opt_c $opt_d $opt_e $opt_f $opt_h $opt_H $opt_m $opt_n $opt_p $opt_s $opt_t $opt_l $opt_v $opt_w $opt_2 $opt_u $opt_x $opt_U $opt_3 $opt_M $opt_z);
 my $usageFull="$0\n         [-a (evaluate all systems)] 
@@ -205,6 +206,8 @@ my $usageFull="$0\n         [-a (evaluate all systems)]
 ".
   "ROUGE-eval-config-file: Specify the evaluation setup. Three files come with the ROUGE evaluation package, i.e.\n".
   "          ROUGE-test.xml, verify.xml, and verify-spl.xml are good examples.\n".
+  "          Use '-' to read it from the standard input. Its DOC elements (PATH attribute and\n".
+  "          base64 encoded content) give summaries that are then not read from files.\n".
   "systemID: Specify which system in the ROUGE-eval-config-file to perform the evaluation.\n".
   "          If '-a' option is used, then all systems are evaluated and users do not need to\n".
   "          provide this argument.\n".
@@ -498,8 +501,16 @@ else {
 # Read and parse the document
 my $parser = new XML::DOM::Parser;
 my $doc;
+%inlineDocs=(); # summaries given as DOC elements, by path
 unless(defined($opt_z)) {
-  $doc=$parser->parsefile($ARGV[0]);
+  if($ARGV[0] eq "-") {
+    # read the evaluation description from the standard input
+    local $/;
+    $doc=$parser->parse(<STDIN>);
+  }
+  else {
+    $doc=$parser->parsefile($ARGV[0]);
+  }
 }
 else {
   open($doc,$ARGV[0])||die "Cannot open $ARGV[0]\n";
@@ -1044,7 +1055,7 @@ sub computeROUGEX {
       # includes the full path to the model.
       $modelPath="$ROUGEEval->{\"Ms\"}{$modelID}"; # get full model path
     }
-    if(-e "$modelPath") {
+    if(-e "$modelPath"||exists($inlineDocs{$modelPath})) {
       #		    print "*$modelPath\n";
     }
     else {
@@ -1781,7 +1792,7 @@ sub readTextOld {
   $bsize=0;
   $wsize=0;
   $done=0;
-  open(TEXT,$inPath)||die "Cannot open $inPath\n";
+  &openText($inPath);
   if($type=~/^SEE$/oi) {
     while(defined($line=<TEXT>)) { # SEE abstract format
       if($line=~/^<a (size=\"[0-9]+\" )?name=\"[0-9]+\">\[([0-9]+)\]<\/a>\s+<a href=\"\#[0-9]+\" id=[0-9]+>([^<]+)/o) {
@@ -1833,6 +1844,16 @@ sub readTextOld {
 # enforce length cutoff at the file level
 # convert different input format into SPL format then put them into
 # tokenizedText
+sub openText {
+  my $inPath=shift;
+  if(exists($inlineDocs{$inPath})) {
+    open(TEXT,"<",\$inlineDocs{$inPath})||die "Cannot open $inPath\n";
+  }
+  else {
+    open(TEXT,$inPath)||die "Cannot open $inPath\n";
+  }
+}
+
 sub readText {
   my $inPath=shift;
   my $tokenizedText=shift;
@@ -1845,7 +1866,7 @@ sub readText {
   $wsize=0;
   $done=0;
   @sntList=();
-  open(TEXT,$inPath)||die "Cannot open $inPath\n";
+  &openText($inPath);
   if($type=~/^SEE$/oi) {
     while(defined($line=<TEXT>)) { # SEE abstract format
       if($line=~/^<a size=\"[0-9]+\" name=\"[0-9]+\">\[([0-9]+)\]<\/a>\s+<a href=\"\#[0-9]+\" id=[0-9]+>([^<]+)/o||
@@ -1963,7 +1984,7 @@ sub readBE {
   my $type=shift;
   my ($line);
   
-  open(TEXT,$inPath)||die "Cannot open $inPath\n";
+  &openText($inPath);
   if(defined($opt_v)) {
     print STDERR "$inPath\n";
   }
@@ -2053,7 +2074,7 @@ sub readText_LCS {
   $wsize=0;
   $done=0;
   @sntList=();
-  open(TEXT,$inPath)||die "Cannot open $inPath\n";
+  &openText($inPath);
   if($type=~/^SEE$/oi) {
     while(defined($line=<TEXT>)) { # SEE abstract format
       if($line=~/^<a size=\"[0-9]+\" name=\"[0-9]+\">\[([0-9]+)\]<\/a>\s+<a href=\"\#[0-9]+\" id=[0-9]+>([^<]+)/o||
@@ -2153,7 +2174,7 @@ sub readText_LCS_old {
   $bsize=0;
   $wsize=0;
   $done=0;
-  open(TEXT,$inPath)||die "Cannot open $inPath\n";
+  &openText($inPath);
   if($type=~/^SEE$/oi) {
     while(defined($line=<TEXT>)) { # SEE abstract format
       if($line=~/^<a (size=\"[0-9]+\" )?name=\"[0-9]+\">\[([0-9]+)\]<\/a>\s+<a href=\"\#[0-9]+\" id=[0-9]+>([^<]+)/o) {
@@ -3085,6 +3106,18 @@ sub readEvals {
 	  &readEvals($ROUGEEvals,$ROUGEEvalIDs,$ROUGEPeerIDTable,$child,$evalID);
 	}
       }
+      elsif($nodeName=~/^DOC$/oi) {
+	# summary content (UTF-8, base64 encoded) for the given path
+	my ($docPath,$data);
+	$docPath=$node->getAttributeNode("PATH")->getValue;
+	$data="";
+	foreach my $child ($node->getChildNodes()) {
+	  if($child->getNodeType==TEXT_NODE) {
+	    $data.=$child->getData;
+	  }
+	}
+	$inlineDocs{$docPath}=decode_base64($data);
+      }
       elsif($nodeName=~/^INPUT-FORMAT$/oi) {
 	$inputFormat=$node->getAttributeNode("TYPE")->getValue;
 	if($inputFormat=~/^(SEE|ISI|SPL|SIMPLE)$/oi) { # SPL: one sentence per line
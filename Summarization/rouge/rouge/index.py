@@ -0,0 +1,185 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Precomputed reference side of ROUGE for token ID sequences.
+
+A ReferenceIndex holds, for every evaluation ID, the interned token IDs of
+its reference summaries and the n-gram and skip-bigram count tables that
+NativeRouge would build from them.  The tables depend on the scorer's
+n_gram, skip-bigram and length limit settings, which are stored with the
+index and checked before it is used.
+
+An index is saved as a directory of .npy files plus meta.json and can be
+loaded with memory mapping; the count tables of an ID are only turned
+into TokenTables when that ID is scored.
+"""
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+from .native import TokenTables
+
+FORMAT_VERSION = 1
+
+# second column of the unigram entries of a skip-bigram table
+_no_token = np.iinfo(np.uint32).max
+
+
+def scorer_config(scorer):
+    """The NativeRouge settings the count tables depend on."""
+    return {
+        'n_gram': scorer.n_gram,
+        'skip_distance': scorer.skip_distance,
+        'skip_unigram': scorer.skip_unigram,
+        'lcs': bool(scorer.lcs or scorer.wlcs_weight is not None),
+        'length_limit': scorer.length_limit,
+    }
+
+
+def _gram_rows(grams, n):
+    keys = np.array([g if n > 1 else (g,) for g in grams.keys()], dtype=np.uint32).reshape(-1, n)
+    counts = np.array(list(grams.values()), dtype=np.uint32)
+    return keys, counts
+
+
+def _skip_rows(grams):
+    keys = np.array([g if isinstance(g, tuple) else (g, _no_token) for g in grams.keys()],
+                    dtype=np.uint32).reshape(-1, 2)
+    counts = np.array(list(grams.values()), dtype=np.uint32)
+    return keys, counts
+
+
+class _Column:
+    """Rows of one table for all models, concatenated, with offsets."""
+
+    def __init__(self):
+        self.parts = []
+        self.counts = []
+        self.offsets = [0]
+
+    def add(self, rows, counts=None):
+        self.parts.append(rows)
+        if counts is not None:
+            self.counts.append(counts)
+        self.offsets.append(self.offsets[-1] + len(rows))
+
+
+class ReferenceIndex:
+    """Reference count tables per evaluation ID for one scorer setting.
+
+    ids: evaluation IDs in index order.
+    vocabulary: token strings, the position being the token ID.
+    arrays: the saved arrays (see build).
+    key: opaque string identifying what the index was built from.
+    """
+
+    def __init__(self, config, ids, vocabulary, arrays, key=None):
+        self.config = config
+        self.ids = ids
+        self.positions = {i: k for k, i in enumerate(ids)}
+        self.vocabulary = vocabulary
+        self.arrays = arrays
+        self.key = key
+        self._tables = {}
+
+    @classmethod
+    def build(cls, scorer, references, vocabulary, key=None):
+        """Build from {ID: [model token ID sequence, ...]} (dict order is kept)."""
+        config = scorer_config(scorer)
+        ids = list(references.keys())
+        models = _Column()
+        tokens = _Column()
+        grams = [_Column() for _ in range(scorer.n_gram)]
+        skips = {flag: _Column() for flag in (False, True)}
+        for i in ids:
+            models.add(references[i])
+            for doc in references[i]:
+                tables = scorer.token_tables(doc)
+                tokens.add(np.array(tables.tokens, dtype=np.uint32))
+                for n in range(1, scorer.n_gram + 1):
+                    grams[n - 1].add(*_gram_rows(tables.grams[n - 1][0], n))
+                for flag, column in skips.items():
+                    if flag in tables.skip:
+                        column.add(*_skip_rows(tables.skip[flag][0]))
+        arrays = {
+            'model_offsets': np.array(models.offsets, dtype=np.int64),
+            'tokens': np.concatenate(tokens.parts) if tokens.parts else np.zeros(0, dtype=np.uint32),
+            'token_offsets': np.array(tokens.offsets, dtype=np.int64),
+        }
+        for n, column in enumerate(grams, 1):
+            arrays['gram{}_keys'.format(n)] = np.concatenate(column.parts).reshape(-1, n) \
+                if column.parts else np.zeros((0, n), dtype=np.uint32)
+            arrays['gram{}_counts'.format(n)] = np.concatenate(column.counts) \
+                if column.counts else np.zeros(0, dtype=np.uint32)
+            arrays['gram{}_offsets'.format(n)] = np.array(column.offsets, dtype=np.int64)
+        for flag, column in skips.items():
+            if len(column.offsets) > 1:
+                name = 'skip_unigram' if flag else 'skip'
+                arrays[name + '_keys'] = np.concatenate(column.parts).reshape(-1, 2)
+                arrays[name + '_counts'] = np.concatenate(column.counts)
+                arrays[name + '_offsets'] = np.array(column.offsets, dtype=np.int64)
+        return cls(config, ids, list(vocabulary), arrays, key)
+
+    def check(self, scorer):
+        if scorer_config(scorer) != self.config:
+            raise ValueError('The reference index was built for different ROUGE settings: {} != {}'.format(
+                self.config, scorer_config(scorer)))
+
+    def __contains__(self, i):
+        return i in self.positions
+
+    def models(self, i):
+        """TokenTables of the reference summaries of ID i."""
+        if i not in self._tables:
+            a = self.arrays
+            k = self.positions[i]
+            self._tables[i] = [self._model_tables(m) for m in range(a['model_offsets'][k], a['model_offsets'][k + 1])]
+        return self._tables[i]
+
+    def _model_tables(self, m):
+        a = self.arrays
+        tokens = a['tokens'][a['token_offsets'][m]:a['token_offsets'][m + 1]].tolist()
+        unigrams = Counter(tokens)
+        grams = []
+        for n in range(1, self.config['n_gram'] + 1):
+            if n == 1:
+                grams.append((unigrams, len(tokens)))
+                continue
+            start, end = a['gram{}_offsets'.format(n)][m:m + 2]
+            keys = a['gram{}_keys'.format(n)][start:end].tolist()
+            counts = a['gram{}_counts'.format(n)][start:end].tolist()
+            grams.append((Counter(dict(zip(map(tuple, keys), counts))), max(len(tokens) - n + 1, 0)))
+        skip = {}
+        for flag, name in ((False, 'skip'), (True, 'skip_unigram')):
+            if name + '_keys' in a:
+                start, end = a[name + '_offsets'][m:m + 2]
+                keys = a[name + '_keys'][start:end].tolist()
+                counts = a[name + '_counts'][start:end].tolist()
+                table = Counter(dict(zip([k[0] if k[1] == _no_token else tuple(k) for k in keys], counts)))
+                skip[flag] = (table, sum(counts))
+        lcs_units = [tokens] if self.config['lcs'] else None
+        return TokenTables(tokens, unigrams, grams, skip, lcs_units)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'format': FORMAT_VERSION, 'config': self.config, 'ids': self.ids,
+                       'vocabulary': self.vocabulary, 'arrays': sorted(self.arrays.keys()),
+                       'key': self.key}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved index, or return None if there is none (or of an old format)."""
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('format') != FORMAT_VERSION:
+            return None
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+                  for name in meta['arrays']}
+        return cls(meta['config'], meta['ids'], meta['vocabulary'], arrays, meta.get('key'))
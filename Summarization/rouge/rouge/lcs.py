@@ -0,0 +1,178 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""LCS kernels of ROUGE-L and ROUGE-W.
+
+ROUGE-1.5.5.pl does not score the LCS length directly: lcs_inner and
+wlcs_inner fill a DP table, markLCS traces it back from the bottom right
+corner (diagonal on a match, up when c[i-1][j] >= c[i][j-1], left
+otherwise) and the marked model positions are then clipped against the
+unigram counts.  Which of several equally long subsequences gets marked
+therefore matters, and the kernels below reproduce that exact traceback.
+
+ROUGE-L uses the bit-parallel LCS of Allison and Dix in the form given by
+Hyyrö: one big integer per peer position holds a whole DP column, and
+c[i][j] is the number of zero bits among the lowest i bits of column j.
+ROUGE-W keeps the DP but builds each row with itertools.accumulate over
+the runs of non-matching cells, so only the match cells are computed in
+Python.
+
+The model side (the match masks of ROUGE-L and the token positions) is
+prepared once in a Reference and reused for every candidate it is scored
+against; lcs_lengths and mark_hits are the batched entry points.
+"""
+from itertools import accumulate
+
+
+class Reference:
+    """A model sentence prepared for scoring many peers against it."""
+    __slots__ = ('tokens', 'masks', 'full', '_power')
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        masks = {}
+        for i, t in enumerate(tokens):
+            masks[t] = masks.get(t, 0) | 1 << i
+        self.masks = masks
+        self.full = (1 << len(tokens)) - 1
+        self._power = {}
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def columns(self, peer):
+        """The bit-parallel DP columns for peer[:0] .. peer[:n]."""
+        masks = self.masks
+        full = self.full
+        v = full
+        columns = [v]
+        append = columns.append
+        for t in peer:
+            u = v & masks.get(t, 0)
+            if u:
+                v = ((v + u) | (v - u)) & full
+            append(v)
+        return columns
+
+    def lcs_length(self, peer):
+        masks = self.masks
+        full = self.full
+        v = full
+        for t in peer:
+            u = v & masks.get(t, 0)
+            if u:
+                v = ((v + u) | (v - u)) & full
+        return len(self.tokens) - bin(v).count('1')
+
+    def lcs_mark(self, peer, hit_mask):
+        """lcs_inner + markLCS: mark the model positions of one LCS."""
+        model = self.tokens
+        i = len(model)
+        j = len(peer)
+        if i == 0 or j == 0:
+            return
+        columns = self.columns(peer)
+        # c[i][j] == i - popcount(columns[j] & (1 << i) - 1)
+        while i != 0 and j != 0:
+            if model[i - 1] == peer[j - 1]:
+                i -= 1
+                j -= 1
+                hit_mask[i] = 1
+                continue
+            low = (1 << (i - 1)) - 1
+            up = i - 1 - bin(columns[j] & low).count('1')
+            left = i - bin(columns[j - 1] & (low << 1 | 1)).count('1')
+            if up >= left:
+                i -= 1
+            else:
+                j -= 1
+
+    def power(self, weight, n):
+        table = self._power.get(weight)
+        if table is None or len(table) < n + 2:
+            table = self._power[weight] = [k ** weight for k in range(max(len(self.tokens), n) + 2)]
+        return table
+
+    def wlcs_mark(self, peer, hit_mask, weight):
+        """wlcs_inner + markLCS for the weighted LCS."""
+        model = self.tokens
+        m = len(model)
+        n = len(peer)
+        if m == 0 or n == 0:
+            return
+        power = self.power(weight, n)
+        positions = {}
+        for j, t in enumerate(peer, 1):
+            positions.setdefault(t, []).append(j)
+        prev = [0] * (n + 1)
+        prev_l = {}
+        rows = [prev]
+        for w in model:
+            matches = positions.get(w)
+            if matches is None:
+                # no match in this row: a running maximum of the row above
+                cur = list(accumulate(prev, max))
+                prev_l = {}
+            else:
+                cur = [0]
+                cur_l = {}
+                start = 1
+                for j in matches:
+                    if j > start:
+                        run = accumulate(prev[start:j], max, initial=cur[-1])
+                        next(run)
+                        cur.extend(run)
+                    k = prev_l.get(j - 1, 0)
+                    cur.append(prev[j - 1] + power[k + 1] - power[k])
+                    cur_l[j] = k + 1
+                    start = j + 1
+                if start <= n:
+                    run = accumulate(prev[start:], max, initial=cur[-1])
+                    next(run)
+                    cur.extend(run)
+                prev_l = cur_l
+            rows.append(cur)
+            prev = cur
+        i = m
+        j = n
+        while i != 0 and j != 0:
+            if model[i - 1] == peer[j - 1]:
+                i -= 1
+                j -= 1
+                hit_mask[i] = 1
+            elif rows[i - 1][j] >= rows[i][j - 1]:
+                i -= 1
+            else:
+                j -= 1
+
+
+def reference(model):
+    return model if isinstance(model, Reference) else Reference(model)
+
+
+def lcs_mark(model, peer, hit_mask):
+    reference(model).lcs_mark(peer, hit_mask)
+
+
+def wlcs_mark(model, peer, hit_mask, weight):
+    reference(model).wlcs_mark(peer, hit_mask, weight)
+
+
+def lcs_lengths(model, peers):
+    """LCS lengths of one model sentence against each of peers."""
+    model = reference(model)
+    return [model.lcs_length(peer) for peer in peers]
+
+
+def mark_hits(model, peers, weight=None):
+    """Hit masks of one model sentence against each of peers (ROUGE-L, or
+    ROUGE-W with the given weight)."""
+    model = reference(model)
+    masks = []
+    for peer in peers:
+        hit_mask = bytearray(len(model))
+        if weight is None:
+            model.lcs_mark(peer, hit_mask)
+        else:
+            model.wlcs_mark(peer, hit_mask, weight)
+        masks.append(hit_mask)
+    return masks
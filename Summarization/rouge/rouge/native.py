@@ -0,0 +1,712 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""In-process re-implementation of the bundled ROUGE-1.5.5.pl.
+
+The scorer follows RELEASE-1.5.5/ROUGE-1.5.5.pl (the PoliInfo variant that
+keeps non-ASCII tokens, does not lowercase and only strips '-') statement by
+statement, including its rounding of every intermediate score to five digits,
+the unigram clipping of ROUGE-L/W, the skip-bigram counting and the seeded
+bootstrap that produces the reported "Average" values.  The text processing
+of the unmodified ORIGINAL-1.5.5 script is available as profile='original';
+its stemmer reads the WordNet exception lists from the shipped .exc files.
+
+All strings are handled as UTF-8 byte strings (decoded as latin-1) so that
+length limits, the stemmer and whitespace splitting see exactly what Perl
+sees.
+"""
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from .lcs import Reference
+
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'RELEASE-1.5.5', 'data')
+original_data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'ORIGINAL-1.5.5', 'data')
+
+# Perl's \s on byte strings
+_ws = re.compile(r'[ \t\n\r\f\x0b]+')
+_ws_leading = re.compile(r'^[ \t\n\r\f\x0b]+')
+_ws_trailing = re.compile(r'[ \t\n\r\f\x0b]+$')
+_non_alnum = re.compile(r'[^A-Za-z0-9\-]')
+_original_token = re.compile(r'^[a-z0-9$]')
+_lower = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                       'abcdefghijklmnopqrstuvwxyz')
+
+_see_line1 = re.compile(r'^<a size="[0-9]+" name="[0-9]+">\[([0-9]+)\]</a>[ \t\n\r\f\x0b]+'
+                        r'<a href="#[0-9]+" id=[0-9]+>([^<]+)')
+_see_line2 = re.compile(r'^<a name="[0-9]+">\[([0-9]+)\]</a>[ \t\n\r\f\x0b]+'
+                        r'<a href="#[0-9]+" id=[0-9]+>([^<]+)')
+_isi_line = re.compile(r'^<S SNTNO="[0-9a-z,]+">([^<]+)</S>')
+
+
+def to_perl(s):
+    """Convert a unicode string to the byte string ROUGE-1.5.5.pl works on."""
+    return s.encode('utf-8').decode('latin-1')
+
+
+def perl_split(s):
+    """split(/\\s+/, $s): keeps a leading empty field, drops trailing ones."""
+    if not s:
+        return []
+    fields = _ws.split(s)
+    while fields and fields[-1] == '':
+        fields.pop()
+    return fields
+
+
+def perl_format(x):
+    """sprintf("%7.5f", x) read back as a number."""
+    return float('%7.5f' % x)
+
+
+def load_stopwords(path=None):
+    if path is None:
+        path = os.path.join(data_path, 'smart_common_words.txt')
+    with open(path, encoding='latin-1') as f:
+        return set(line.rstrip('\n') for line in f)
+
+
+def read_lines(path, input_format='SPL'):
+    """Read a summary file the way readText does and return its units."""
+    with open(path, encoding='latin-1', newline='\n') as f:
+        lines = f.read().split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    return parse_lines(lines, input_format)
+
+
+def parse_lines(lines, input_format='SPL'):
+    units = []
+    input_format = input_format.upper()
+    if input_format == 'SEE':
+        for line in lines:
+            m = _see_line1.match(line) or _see_line2.match(line)
+            if m:
+                units.append(m.group(2))
+    elif input_format == 'ISI':
+        for line in lines:
+            m = _isi_line.match(line)
+            if m:
+                units.append(m.group(1))
+    elif input_format == 'SPL':
+        units = [line for line in lines if len(line) > 0]
+    else:
+        raise ValueError('Unknown input format: {}'.format(input_format))
+    return units
+
+
+def sentences_to_units(doc):
+    """Units of a document given as a list of sentences (one file per doc,
+    one sentence per line, as written by Pythonrouge.make_xml)."""
+    lines = ''.join('{}\n'.format(to_perl(sent)) for sent in doc).split('\n')
+    lines.pop()
+    return [line for line in lines if len(line) > 0]
+
+
+# ---------------------------------------------------------------------------
+# Porter stemmer (port of the stem() routine at the end of ROUGE-1.5.5.pl)
+_c = '[^aeiou]'
+_v = '[aeiouy]'
+_C = _c + '[^aeiouy]*'
+_V = _v + '[aeiou]*'
+_mgr0 = re.compile('^(' + _C + ')?' + _V + _C)
+_meq1 = re.compile('^(' + _C + ')?' + _V + _C + '(' + _V + ')?$')
+_mgr1 = re.compile('^(' + _C + ')?' + _V + _C + _V + _C)
+_has_v = re.compile('^(' + _C + ')?' + _v)
+_cvc = re.compile('^' + _C + _v + '[^aeiouwxy]$')
+_step2list = {
+    'ational': 'ate', 'tional': 'tion', 'enci': 'ence', 'anci': 'ance', 'izer': 'ize', 'bli': 'ble',
+    'alli': 'al', 'entli': 'ent', 'eli': 'e', 'ousli': 'ous', 'ization': 'ize', 'ation': 'ate',
+    'ator': 'ate', 'alism': 'al', 'iveness': 'ive', 'fulness': 'ful', 'ousness': 'ous', 'aliti': 'al',
+    'iviti': 'ive', 'biliti': 'ble', 'logi': 'log'}
+_step3list = {
+    'icate': 'ic', 'ative': '', 'alize': 'al', 'iciti': 'ic', 'ical': 'ic', 'ful': '', 'ness': ''}
+_step1a = re.compile('(ss|i)es$')
+_step1a2 = re.compile('([^s])s$')
+_step1b = re.compile('(ed|ing)$')
+_step1b2 = re.compile('([^aeiouylsz])\\1$')
+_step2 = re.compile('(ational|tional|enci|anci|izer|bli|alli|entli|eli|ousli|ization|ation|ator|'
+                    'alism|iveness|fulness|ousness|aliti|iviti|biliti|logi)$')
+_step3 = re.compile('(icate|ative|alize|iciti|ical|ful|ness)$')
+_step4 = re.compile('(al|ance|ence|er|ic|able|ible|ant|ement|ou|ism|ate|iti|ous|ive|ize)$')
+_step4ion = re.compile('(s|t)(ion)$')
+
+
+def stem(w):
+    if len(w) < 3:
+        return w
+    firstch = w[0]
+    if firstch == 'y':
+        w = 'Y' + w[1:]
+    # Step 1a
+    m = _step1a.search(w)
+    if m:
+        w = w[:m.start()] + m.group(1)
+    else:
+        m = _step1a2.search(w)
+        if m:
+            w = w[:m.start()] + m.group(1)
+    # Step 1b
+    if w.endswith('eed'):
+        if _mgr0.search(w[:-3]):
+            w = w[:-1]
+    else:
+        m = _step1b.search(w)
+        if m:
+            s = w[:m.start()]
+            if _has_v.search(s):
+                w = s
+                if re.search('(at|bl|iz)$', w):
+                    w += 'e'
+                elif _step1b2.search(w):
+                    w = w[:-1]
+                elif _cvc.search(w):
+                    w += 'e'
+    # Step 1c
+    if w.endswith('y'):
+        s = w[:-1]
+        if _has_v.search(s):
+            w = s + 'i'
+    # Step 2
+    m = _step2.search(w)
+    if m:
+        s = w[:m.start()]
+        if _mgr0.search(s):
+            w = s + _step2list[m.group(1)]
+    # Step 3
+    m = _step3.search(w)
+    if m:
+        s = w[:m.start()]
+        if _mgr0.search(s):
+            w = s + _step3list[m.group(1)]
+    # Step 4
+    m = _step4.search(w)
+    if m:
+        s = w[:m.start()]
+        if _mgr1.search(s):
+            w = s
+    if w.endswith('ment'):
+        s = w[:-4]
+        if _mgr1.search(s):
+            w = s
+    if w.endswith('ent'):
+        s = w[:-3]
+        if _mgr1.search(s):
+            w = s
+    else:
+        m = _step4ion.search(w)
+        if m:
+            s = w[:m.start()] + m.group(1)
+            if _mgr1.search(s):
+                w = s
+    # Step 5
+    if w.endswith('e'):
+        s = w[:-1]
+        if _mgr1.search(s) or (_meq1.search(s) and not _cvc.search(s)):
+            w = s
+    if w.endswith('ll') and _mgr1.search(w):
+        w = w[:-1]
+    if firstch == 'y':
+        w = 'y' + w[1:]
+    return w
+
+
+def load_exceptions(path=None):
+    """WordNet exception list (what buildExeptionDB.pl stores in the .db)."""
+    if path is None:
+        path = os.path.join(original_data_path, 'WordNet-2.0-Exceptions')
+    exceptions = {}
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.exc'):
+            with open(os.path.join(path, name), encoding='latin-1') as f:
+                for line in f:
+                    fields = perl_split(line.rstrip('\n'))
+                    exceptions[fields[0]] = fields[1] if len(fields) > 1 else None
+    return exceptions
+
+
+def morph_stem(token, exceptions=None):
+    if not token:
+        return None
+    token = token.translate(_lower)
+    if exceptions and token in exceptions:
+        return exceptions[token]
+    return stem(token)
+
+
+# ---------------------------------------------------------------------------
+# Perl drand48 and the bootstrap of computeAverages
+_drand48_a = np.uint64(0x5DEECE66D)
+_drand48_c = np.uint64(0xB)
+_drand48_mask = np.uint64((1 << 48) - 1)
+_resample_cache = {}
+
+
+def resample_indices(n, samples):
+    """Indices drawn by bootstrapResampling: row i is srand(i) followed by
+    n calls of int(rand(n))."""
+    key = (n, samples)
+    if key not in _resample_cache:
+        state = (np.arange(samples, dtype=np.uint64) << np.uint64(16)) + np.uint64(0x330E)
+        idx = np.empty((samples, n), dtype=np.int64)
+        for k in range(n):
+            state = (state * _drand48_a + _drand48_c) & _drand48_mask
+            idx[:, k] = (np.ldexp(state.astype(np.float64), -48) * n).astype(np.int64)
+        if len(_resample_cache) > 16:
+            _resample_cache.clear()
+        _resample_cache[key] = idx
+    return _resample_cache[key]
+
+
+def compute_averages(scores, samples=1000, cf=95):
+    """computeAverages for per instance (R, P, F) rows, already ordered like
+    Perl's sort(keys %ROUGEScores).
+
+    Returns {'R': (avg, ci_lower, ci_upper), 'P': ..., 'F': ...}.
+    samples=0 skips the bootstrap: the average is the plain mean (Perl's
+    avgAvgROUGE) and the interval collapses onto it.
+    """
+    n = len(scores)
+    result = {}
+    if n == 0:
+        return {k: (0.0, 0.0, 0.0) for k in 'RPF'}
+    values = np.asarray(scores, dtype=np.float64).reshape(n, 3)
+    if n == 1:
+        return {k: (values[0, i], values[0, i], values[0, i]) for i, k in enumerate('RPF')}
+    if samples == 0:
+        for i, k in enumerate('RPF'):
+            avg = perl_format(np.cumsum(values[:, i])[-1] / n)
+            result[k] = (avg, avg, avg)
+        return result
+    idx = resample_indices(n, samples)
+    delta = samples * ((100 - cf) / 2.0) / 100.0
+    ci_ua = int(samples - delta - 1)
+    ci_ub = ci_ua + 1
+    ci_la = int(delta)
+    ci_lb = ci_la + 1
+    ci_r = samples - delta - 1 - ci_ua
+    for i, k in enumerate('RPF'):
+        # sequential sums, in the order the Perl loop accumulates them
+        sample = np.cumsum(values[idx, i], axis=1)[:, -1] / n
+        ranked = np.sort(sample)
+        avg = perl_format(np.cumsum(ranked)[-1] / samples)
+        ranked = list(ranked) + [ranked[-1]]
+        lower = perl_format(ranked[ci_la] + (ranked[ci_lb] - ranked[ci_la]) * ci_r)
+        upper = perl_format(ranked[ci_ua] + (ranked[ci_ub] - ranked[ci_ua]) * ci_r)
+        result[k] = (avg, lower, upper)
+    return result
+
+
+# ---------------------------------------------------------------------------
+class TokenTables:
+    """The counts ROUGE-1.5.5.pl derives from one peer or model document.
+
+    tokens: the tokens after truncation and filtering.
+    unigrams: Counter of tokens (used for the LCS unigram clipping).
+    grams: (Counter, count) of n-grams for n = 1 .. n_gram.
+    skip: {unigram flag: (Counter, count)} of skip bigrams.
+    lcs_units: token lists of the LCS units (None without ROUGE-L/W).
+    """
+    __slots__ = ('tokens', 'unigrams', 'grams', 'skip', 'lcs_units', '_lcs_references')
+
+    def __init__(self, tokens, unigrams, grams, skip, lcs_units):
+        self.tokens = tokens
+        self.unigrams = unigrams
+        self.grams = grams
+        self.skip = skip
+        self.lcs_units = lcs_units
+        self._lcs_references = None
+
+    def lcs_references(self):
+        """lcs_units prepared as model sentences (kept for later peers)."""
+        if self._lcs_references is None:
+            self._lcs_references = [Reference(unit) for unit in self.lcs_units]
+        return self._lcs_references
+
+
+class NativeRouge:
+    """ROUGE-1.5.5.pl scoring parameters and per evaluation scoring.
+
+    n_gram: maximum n of ROUGE-N (0 to skip).
+    skip_distance: -2 option (None to skip ROUGE-S).
+    skip_unigram: True for -u, 'both' for -U.
+    lcs: compute ROUGE-L (i.e. -x is not given).
+    wlcs_weight: -w option (None to skip ROUGE-W).
+    length_limit / byte_limit: -l / -b options (0 for no limit).
+    stemming: -m option.  stopwords: -s option.
+    scoring_formula: 'A' (model average) or 'B' (best model).
+    alpha: -p option.  samples: -r option (0 for no resampling).  cf: -c option.
+    profile: 'release' (PoliInfo variant) or 'original'.
+    """
+
+    def __init__(self, n_gram=4, skip_distance=None, skip_unigram=False,
+                 lcs=True, wlcs_weight=None, length_limit=0, byte_limit=0,
+                 stemming=False, stopwords=False, scoring_formula='A',
+                 alpha=0.5, samples=1000, cf=95, profile='release',
+                 stopwords_path=None):
+        if length_limit and byte_limit:
+            raise ValueError('Please specify length limit in words or bytes but not both.')
+        if profile not in ('release', 'original'):
+            raise ValueError('Unknown profile: {}'.format(profile))
+        self.n_gram = n_gram
+        self.skip_distance = skip_distance
+        self.skip_unigram = skip_unigram
+        self.lcs = lcs
+        self.wlcs_weight = wlcs_weight
+        self.length_limit = length_limit
+        self.byte_limit = byte_limit
+        self.stemming = stemming
+        self.stopwords = load_stopwords(stopwords_path) if stopwords else set()
+        self.scoring_formula = scoring_formula
+        self.alpha = alpha
+        self.samples = samples
+        self.cf = cf
+        self.original = profile == 'original'
+        # the PoliInfo variant does not open the WordNet exception database
+        self.exceptions = load_exceptions() if self.original and stemming else None
+
+    # -- text handling ------------------------------------------------------
+    def read_text(self, units):
+        """readText: one whitespace normalized string (None if empty)."""
+        if self.original:
+            units = [u.translate(_lower) for u in units]
+        text = None
+        if self.length_limit == 0 and self.byte_limit == 0:
+            text = ' '.join(units)
+        elif self.length_limit != 0:
+            tmp = ''
+            tmp_len = 0
+            for s in units:
+                tokens = perl_split(s)
+                if tmp_len + len(tokens) < self.length_limit:
+                    tmp += ' ' + s if tmp_len != 0 else s
+                    tmp_len += len(tokens)
+                else:
+                    if tmp_len > 0:
+                        tmp += ' '
+                    tmp += ' '.join(tokens[:self.length_limit - tmp_len])
+                    break
+            if len(tmp) > 0:
+                text = tmp
+        else:
+            tmp = ''
+            tmp_len = 0
+            for s in units:
+                if tmp_len + len(s) < self.byte_limit:
+                    tmp += ' ' + s if tmp_len != 0 else s
+                    tmp_len += len(s)
+                else:
+                    if tmp_len > 0:
+                        tmp += ' '
+                    tmp += s[:self.byte_limit - tmp_len]
+                    break
+            if len(tmp) > 0:
+                text = tmp
+        if text is not None:
+            text = self._clean(text, '-')
+        return text
+
+    def read_text_lcs(self, units):
+        """readText_LCS: the units kept under the length limit."""
+        if self.original:
+            units = [u.translate(_lower) for u in units]
+        if self.length_limit == 0 and self.byte_limit == 0:
+            kept = list(units)
+        elif self.length_limit != 0:
+            kept = []
+            tmp_len = 0
+            for s in units:
+                tokens = perl_split(s)
+                if tmp_len + len(tokens) < self.length_limit:
+                    tmp_len += len(tokens)
+                    kept.append(s)
+                else:
+                    kept.append(' '.join(tokens[:self.length_limit - tmp_len]))
+                    break
+        else:
+            kept = []
+            for s in units:
+                # readText_LCS never advances its byte counter
+                if len(s) < self.byte_limit:
+                    kept.append(s)
+                else:
+                    kept.append(s[:self.byte_limit])
+                    break
+        return [self._clean(s, None) for s in kept]
+
+    def _clean(self, text, release_strip):
+        if self.original:
+            text = _non_alnum.sub(' ', text.replace('-', ' - '))
+        elif release_strip:
+            text = text.replace(release_strip, '')
+        text = _ws_leading.sub('', text)
+        text = _ws_trailing.sub('', text)
+        return _ws.sub(' ', text)
+
+    def tokenize(self, text):
+        """Token filtering shared by createNGram/createSkipBigram/tokenizeText_LCS."""
+        if text is None:
+            return []
+        tokens = perl_split(text)
+        if not (self.stopwords or self.original or self.stemming):
+            return tokens
+        ret = []
+        for t in tokens:
+            if t in self.stopwords:
+                continue
+            if self.original and not _original_token.match(t):
+                continue
+            if self.stemming and len(t) > 3:
+                t = morph_stem(t, self.exceptions)
+            ret.append(t)
+        return ret
+
+    # -- counting -------------------------------------------------------------
+    @staticmethod
+    def ngrams(tokens, n):
+        if n == 1:
+            return Counter(tokens), len(tokens)
+        grams = Counter(zip(*[tokens[k:] for k in range(n)]))
+        return grams, max(len(tokens) - n + 1, 0)
+
+    def skip_bigrams(self, tokens, unigram):
+        grams = Counter()
+        count = 0
+        last = len(tokens) - 1
+        sd = self.skip_distance
+        for i in range(last):
+            if unigram:
+                grams[tokens[i]] += 1
+                count += 1
+            end = last if sd < 0 else min(last, i + sd + 1)
+            for j in range(i + 1, end + 1):
+                grams[(tokens[i], tokens[j])] += 1
+                count += 1
+        return grams, count
+
+    @staticmethod
+    def hits(model_grams, peer_grams):
+        return sum(min(c, peer_grams[g]) for g, c in model_grams.items() if g in peer_grams)
+
+    def _finish(self, total_hit, total_count, total_count_p, inverse=None):
+        if total_count != 0:
+            r = total_hit / total_count
+            r = perl_format(r if inverse is None else r ** (1 / inverse))
+        else:
+            r = perl_format(0)
+        if total_count_p != 0:
+            p = total_hit / total_count_p
+            p = perl_format(p if inverse is None else p ** (1 / inverse))
+        else:
+            p = perl_format(0)
+        a = self.alpha
+        if (1 - a) * p + a * r > 0:
+            f = perl_format((p * r) / ((1 - a) * p + a * r))
+        else:
+            f = perl_format(0)
+        return r, p, f
+
+    def _accumulate(self, per_model):
+        """Combine (hit, count, count_p, score) of each model (-f A/B)."""
+        if self.scoring_formula == 'B':
+            best = -1
+            total = (0, 0, 0)
+            for hit, count, count_p, score in per_model:
+                if score > best:
+                    best = score
+                    total = (hit, count, count_p)
+            return total
+        return (sum(x[0] for x in per_model), sum(x[1] for x in per_model),
+                sum(x[2] for x in per_model))
+
+    # -- metrics --------------------------------------------------------------
+    def tables(self, units):
+        """Count tables of one document given as units (perl strings, see
+        to_perl), processed like readText and readText_LCS."""
+        tokens = self.tokenize(self.read_text(units))
+        lcs_units = None
+        if self.lcs or self.wlcs_weight is not None:
+            lcs_units = [self.tokenize(u) for u in self.read_text_lcs(units)]
+        return self._tables(tokens, lcs_units)
+
+    def token_tables(self, tokens):
+        """Count tables of one single sentence document given as a token
+        sequence (e.g. interned integer IDs in a list, array or ndarray).
+
+        The tokens are compared as they are: only the -l word limit is
+        applied, there is no stemming or stopword removal.
+        """
+        if self.byte_limit:
+            raise ValueError('A byte limit cannot be applied to token sequences.')
+        tokens = tokens.tolist() if hasattr(tokens, 'tolist') else list(tokens)
+        if self.length_limit:
+            tokens = tokens[:self.length_limit]
+        return self._tables(tokens, [tokens] if self.lcs or self.wlcs_weight is not None else None)
+
+    def document_tables(self, doc):
+        """Tables of a document given as units, token sequence or TokenTables."""
+        if isinstance(doc, TokenTables):
+            return doc
+        if isinstance(doc, (list, tuple)) and all(isinstance(u, str) for u in doc):
+            return self.tables(doc)
+        return self.token_tables(doc)
+
+    def _tables(self, tokens, lcs_units):
+        unigrams = Counter(tokens)
+        grams = [(unigrams, len(tokens))] if self.n_gram > 0 else []
+        for n in range(2, self.n_gram + 1):
+            grams.append(self.ngrams(tokens, n))
+        skip = {}
+        if self.skip_distance is not None:
+            if self.skip_unigram is not True:
+                skip[False] = self.skip_bigrams(tokens, False)
+            if self.skip_unigram:
+                skip[True] = self.skip_bigrams(tokens, True)
+        return TokenTables(tokens, unigrams, grams, skip, lcs_units)
+
+    def score(self, peer_units, models_units):
+        """Score one evaluation.  Units are perl strings (see to_perl).
+
+        Returns an ordered list of (method tag, (R, P, F)) following the order
+        ROUGE-1.5.5.pl prints them in.
+        """
+        return self.score_tables(self.tables(peer_units), [self.tables(m) for m in models_units])
+
+    def score_tables(self, peer, models):
+        """score() for documents already turned into TokenTables."""
+        results = []
+        for n in range(1, self.n_gram + 1):
+            results.append(('ROUGE-{}'.format(n), self.score_ngram(peer, models, n)))
+        if self.lcs:
+            results.append(('ROUGE-L', self.score_lcs(peer, models)))
+        if self.wlcs_weight is not None:
+            results.append(('ROUGE-W-{}'.format(self.wlcs_weight),
+                            self.score_lcs(peer, models, self.wlcs_weight)))
+        if self.skip_distance is not None:
+            distance = self.skip_distance if self.skip_distance >= 0 else '*'
+            if self.skip_unigram is not True:
+                # plain skip bigram (no -u, or -U)
+                results.append(('ROUGE-S{}'.format(distance),
+                                self.score_skip_bigram(peer, models, False)))
+            if self.skip_unigram:
+                results.append(('ROUGE-SU{}'.format(distance),
+                                self.score_skip_bigram(peer, models, True)))
+        return results
+
+    def method_tags(self):
+        tags = ['ROUGE-{}'.format(n) for n in range(1, self.n_gram + 1)]
+        if self.lcs:
+            tags.append('ROUGE-L')
+        if self.wlcs_weight is not None:
+            tags.append('ROUGE-W-{}'.format(self.wlcs_weight))
+        if self.skip_distance is not None:
+            distance = self.skip_distance if self.skip_distance >= 0 else '*'
+            if self.skip_unigram is not True:
+                tags.append('ROUGE-S{}'.format(distance))
+            if self.skip_unigram:
+                tags.append('ROUGE-SU{}'.format(distance))
+        return tags
+
+    def score_ngram(self, peer, models, n):
+        peer_grams, peer_count = peer.grams[n - 1]
+        per_model = []
+        for model in models:
+            grams, count = model.grams[n - 1]
+            hit = self.hits(grams, peer_grams)
+            score = perl_format(hit / count) if count != 0 else 0
+            per_model.append((hit, count, peer_count, score))
+        return self._finish(*self._accumulate(per_model))
+
+    def score_skip_bigram(self, peer, models, unigram):
+        peer_grams, peer_count = peer.skip[unigram]
+        per_model = []
+        for model in models:
+            grams, count = model.skip[unigram]
+            hit = self.hits(grams, peer_grams)
+            score = perl_format(hit / count) if count != 0 else 0
+            per_model.append((hit, count, peer_count, score))
+        return self._finish(*self._accumulate(per_model))
+
+    def score_lcs(self, peer, models, weight=None):
+        peer_lcs = peer.lcs_units
+        peer_count = len(peer.tokens)
+        per_model = []
+        score = 0
+        for model in models:
+            model_1grams = Counter(model.unigrams)
+            tmp_peer_1grams = Counter(peer.unigrams)
+            hit = 0
+            base = 0
+            references = model.lcs_references()
+            if weight is None and len(references) == 1 and len(peer_lcs) == 1 and \
+                    references[0].tokens == model.tokens and peer_lcs[0] == peer.tokens:
+                # one LCS against one unit of the same tokens the unigrams were
+                # counted from: the unigram clipping cannot remove any hit
+                hit = references[0].lcs_length(peer_lcs[0])
+                base = len(references[0])
+                references = ()
+            for ref in references:
+                sent = ref.tokens
+                hit_mask = bytearray(len(sent))
+                if weight is None:
+                    base += len(sent)
+                    for p in peer_lcs:
+                        ref.lcs_mark(p, hit_mask)
+                else:
+                    base += len(sent) ** weight
+                    for p in peer_lcs:
+                        ref.wlcs_mark(p, hit_mask, weight)
+                hit_len = 0
+                for j, w in enumerate(sent):
+                    if hit_mask[j] and model_1grams[w] > 0 and tmp_peer_1grams[w] > 0:
+                        if weight is None:
+                            hit += 1
+                        else:
+                            hit_len += 1
+                            if j + 1 == len(sent) or not hit_mask[j + 1]:
+                                hit += hit_len ** weight
+                                hit_len = 0
+                        model_1grams[w] -= 1
+                        tmp_peer_1grams[w] -= 1
+            if weight is None:
+                score = hit / base if base > 0 else 0
+                per_model.append((hit, base, peer_count, score))
+            else:
+                # wlcs leaves the previous model's score in place when base is 0
+                if base != 0:
+                    score = (hit / base) ** (1 / weight)
+                per_model.append((hit, base ** weight, peer_count ** weight, score))
+        return self._finish(*self._accumulate(per_model), inverse=weight)
+
+    # -- reporting ------------------------------------------------------------
+    def evaluate(self, evals):
+        """Score a list of (peer, [model, ...]) evaluations.  Documents are
+        units, token sequences or TokenTables (see document_tables).
+
+        Returns (per method tag: [(R, P, F) per evaluation]) in print order.
+        """
+        methods = [(tag, []) for tag in self.method_tags()]
+        for peer, models in evals:
+            peer = self.document_tables(peer)
+            models = [self.document_tables(m) for m in models]
+            for k, (tag, scores) in enumerate(self.score_tables(peer, models)):
+                methods[k][1].append(scores)
+        return methods
+
+    def output_lines(self, methods, peer_id='A'):
+        """The result lines ROUGE-1.5.5.pl prints for one peer."""
+        lines = []
+        for tag, scores in methods:
+            # instances are averaged in the order of sort(keys %ROUGEScores)
+            order = sorted(range(len(scores)), key=lambda i: '{}.{}'.format(i + 1, peer_id))
+            averages = compute_averages([scores[i] for i in order], self.samples, self.cf)
+            lines.append('---------------------------------------------')
+            for k in 'RPF':
+                avg, lower, upper = averages[k]
+                lines.append('{} {} Average_{}: {:7.5f} ({}%-conf.int. {:7.5f} - {:7.5f})'.format(
+                    peer_id, tag, k, avg, self.cf, lower, upper))
+        return lines
@@ -0,0 +1,263 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Extractive oracle: the subset of candidate sentences that maximizes a
+ROUGE score against the reference summaries within a length budget.
+
+Candidates are token sequences (e.g. interned IDs of the sentences of a
+source document) with a length in the unit of the budget (characters for
+PoliInfo).  A selection is scored as the concatenation of its sentences in
+candidate order.
+
+For ROUGE-N and ROUGE-S/SU the search uses an incremental objective: the
+n-grams of every candidate are counted once, restricted to the grams of
+the references, and adding a sentence only updates the clipped hit count
+and the peer count.  The n-grams crossing a sentence boundary are not
+counted, so the value can differ slightly from the score of the
+concatenated text; score the result with NativeRouge for the exact value.
+Clipped hits are submodular, which gives the upper bounds used by the
+branch and bound.  ROUGE-L and ROUGE-W are scored exactly on the
+concatenated tokens and only searched greedily or with a beam.
+"""
+import heapq
+from collections import Counter
+
+
+def parse_measure(measure):
+    """'ROUGE-2-R' -> ('ROUGE-2', 'R')."""
+    tag, _, stat = measure.rpartition('-')
+    if stat not in ('R', 'P', 'F') or not tag.startswith('ROUGE-'):
+        raise ValueError('Unknown ROUGE measure: {}'.format(measure))
+    return tag, stat
+
+
+class Selection:
+    """Sentences chosen so far with their length and objective state."""
+    __slots__ = ('indices', 'length', 'state', 'value')
+
+    def __init__(self, indices, length, state, value):
+        self.indices = indices
+        self.length = length
+        self.state = state
+        self.value = value
+
+
+class NgramObjective:
+    """Incremental ROUGE-N or ROUGE-S/SU objective (scoring formula A)."""
+    additive = True
+
+    def __init__(self, scorer, models, candidates, tag, stat):
+        self.scorer = scorer
+        self.stat = stat
+        if tag.startswith('ROUGE-S'):
+            unigram = tag.startswith('ROUGE-SU')
+            self.models = [m.skip[unigram][0] for m in models]
+            count = sum(m.skip[unigram][1] for m in models)
+            grams = [scorer.skip_bigrams(list(c), unigram) if len(c) else (Counter(), 0) for c in candidates]
+        else:
+            n = int(tag[len('ROUGE-'):])
+            self.models = [m.grams[n - 1][0] for m in models]
+            count = sum(m.grams[n - 1][1] for m in models)
+            grams = [scorer.ngrams(list(c), n) for c in candidates]
+        self.model_count = count
+        # per candidate: peer count and, per model, the (gram, count) pairs the model has
+        self.peer_counts = [c for _, c in grams]
+        self.matches = [[[(g, k) for g, k in table.items() if g in model] for model in self.models]
+                        for table, _ in grams]
+
+    def empty(self):
+        return 0, 0, tuple(Counter() for _ in self.models)
+
+    def gain(self, state, k):
+        """Hits added by candidate k (an upper bound of any later gain of k)."""
+        _, _, used = state
+        hit = 0
+        for model, u, pairs in zip(self.models, used, self.matches[k]):
+            for g, c in pairs:
+                left = model[g] - u[g]
+                if left > 0:
+                    hit += c if c < left else left
+        return hit
+
+    def add(self, state, k):
+        hit, peer_count, used = state
+        new_used = []
+        for model, u, pairs in zip(self.models, used, self.matches[k]):
+            u = Counter(u)
+            for g, c in pairs:
+                left = model[g] - u[g]
+                if left > 0:
+                    hit += c if c < left else left
+                u[g] += c
+            new_used.append(u)
+        return hit, peer_count + self.peer_counts[k], tuple(new_used)
+
+    def score(self, hit, peer_count):
+        r = hit / self.model_count if self.model_count else 0
+        p = hit / peer_count if peer_count else 0
+        if self.stat == 'R':
+            return r
+        if self.stat == 'P':
+            return p
+        a = self.scorer.alpha
+        return p * r / ((1 - a) * p + a * r) if (1 - a) * p + a * r > 0 else 0
+
+    def value(self, state):
+        return self.score(state[0], state[1])
+
+    def bound(self, selection, remaining, lengths, budget):
+        """Upper bound of the value of any selection extending selection with
+        sentences from remaining."""
+        hit, peer_count, _ = selection.state
+        gains = [(self.gain(selection.state, k), k) for k in remaining]
+        gains = [(g, k) for g, k in gains if g > 0 and lengths[k] <= budget - selection.length]
+        if self.stat == 'P':
+            # a mediant never exceeds its largest ratio
+            best = self.score(hit, peer_count)
+            for g, k in gains:
+                best = max(best, g / self.peer_counts[k])
+            return best
+        # fractional knapsack of the gains over the remaining budget
+        gains.sort(key=lambda x: x[0] / max(lengths[x[1]], 1), reverse=True)
+        room = budget - selection.length
+        extra = 0
+        for g, k in gains:
+            if lengths[k] <= room:
+                extra += g
+                room -= lengths[k]
+            else:
+                extra += g * room / lengths[k]
+                break
+        # F only grows with the hits and shrinks with the peer count
+        return self.score(hit + extra, peer_count)
+
+
+class SequenceObjective:
+    """ROUGE-L or ROUGE-W scored exactly on the concatenated candidates."""
+    additive = False
+
+    def __init__(self, scorer, models, candidates, tag, stat):
+        self.scorer = scorer
+        self.models = models
+        self.candidates = [list(c) for c in candidates]
+        self.weight = None if tag == 'ROUGE-L' else float(tag[len('ROUGE-W-'):])
+        self.column = 'RPF'.index(stat)
+
+    def empty(self):
+        return ()
+
+    def add(self, state, k):
+        return tuple(sorted(state + (k,)))
+
+    def value(self, state):
+        tokens = [t for k in state for t in self.candidates[k]]
+        if not tokens:
+            return 0
+        peer = self.scorer.token_tables(tokens)
+        return self.scorer.score_lcs(peer, self.models, self.weight)[self.column]
+
+
+def make_objective(scorer, models, candidates, measure):
+    """The search objective of measure (e.g. 'ROUGE-2-R') for the given
+    reference TokenTables and candidate token sequences."""
+    tag, stat = parse_measure(measure)
+    if tag == 'ROUGE-L' or tag.startswith('ROUGE-W-'):
+        return SequenceObjective(scorer, models, candidates, tag, stat)
+    return NgramObjective(scorer, models, candidates, tag, stat)
+
+
+def _extend(objective, selection, k, lengths):
+    state = objective.add(selection.state, k)
+    indices = tuple(sorted(selection.indices + (k,)))
+    return Selection(indices, selection.length + lengths[k], state, objective.value(state))
+
+
+def _root(objective):
+    state = objective.empty()
+    return Selection((), 0, state, objective.value(state))
+
+
+def greedy(objective, lengths, budget):
+    """Add the candidate that improves the value most until none does."""
+    current = _root(objective)
+    while True:
+        best = None
+        for k in range(len(lengths)):
+            if k in current.indices or current.length + lengths[k] > budget:
+                continue
+            s = _extend(objective, current, k, lengths)
+            if s.value > current.value and (best is None or s.value > best.value):
+                best = s
+        if best is None:
+            return current
+        current = best
+
+
+def beam_search(objective, lengths, budget, width=8):
+    """Keep the width best selections of each size; return the best seen."""
+    best = _root(objective)
+    beam = [best]
+    seen = set()
+    while beam:
+        expanded = []
+        for selection in beam:
+            for k in range(len(lengths)):
+                if k in selection.indices or selection.length + lengths[k] > budget:
+                    continue
+                indices = tuple(sorted(selection.indices + (k,)))
+                if indices in seen:
+                    continue
+                seen.add(indices)
+                expanded.append(_extend(objective, selection, k, lengths))
+        beam = heapq.nlargest(width, expanded, key=lambda s: s.value)
+        for s in beam:
+            if s.value > best.value:
+                best = s
+    return best
+
+
+def branch_and_bound(objective, lengths, budget, incumbent=None, max_nodes=100000):
+    """Exact search for an additive objective.
+
+    Returns (best selection, whether it was proven optimal within max_nodes).
+    """
+    best = incumbent if incumbent is not None else _root(objective)
+    root = _root(objective)
+    # most promising candidates first, so that good incumbents come early
+    order = sorted((k for k in range(len(lengths)) if lengths[k] <= budget and objective.gain(root.state, k) > 0),
+                   key=lambda k: objective.gain(root.state, k), reverse=True)
+    nodes = 0
+    stack = [(root, 0)]
+    while stack:
+        selection, start = stack.pop()
+        nodes += 1
+        if nodes > max_nodes:
+            return best, False
+        if selection.value > best.value:
+            best = selection
+        remaining = order[start:]
+        if not remaining or objective.bound(selection, remaining, lengths, budget) <= best.value:
+            continue
+        # exclude order[start] (pushed first, explored last), then include it
+        stack.append((selection, start + 1))
+        k = order[start]
+        if selection.length + lengths[k] <= budget:
+            stack.append((_extend(objective, selection, k, lengths), start + 1))
+    return best, True
+
+
+def search(objective, lengths, budget, method='exact', width=8, max_nodes=100000):
+    """Oracle selection with method 'greedy', 'beam' or 'exact' (beam search
+    refined by branch and bound; beam only for ROUGE-L/W).
+
+    Returns (selection, proven) where proven tells whether the value is the
+    optimum of the objective.
+    """
+    if method == 'greedy':
+        return greedy(objective, lengths, budget), False
+    best = beam_search(objective, lengths, budget, width)
+    g = greedy(objective, lengths, budget)
+    if g.value > best.value:
+        best = g
+    if method == 'beam' or not objective.additive:
+        return best, False
+    return branch_and_bound(objective, lengths, budget, best, max_nodes)
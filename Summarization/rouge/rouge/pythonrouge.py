@@ -5,14 +5,31 @@ from os.path import basename
 from re import findall
 from glob import glob
 from tempfile import mkdtemp
+from base64 import b64encode
+from xml.sax.saxutils import quoteattr
+import time
+import asyncio
 import subprocess
-import shutil
+from .native import NativeRouge, TokenTables, read_lines, sentences_to_units
 ROUGE_path = os.path.join("/".join(os.path.abspath(__file__).split("/")[:-1]) +
                           "/RELEASE-1.5.5/ROUGE-1.5.5.pl")
 data_path = os.path.join("/".join(os.path.abspath(__file__).split("/")[:-1]) +
                          "/RELEASE-1.5.5/data")
 
 
+def is_sentences(doc):
+    return isinstance(doc, (list, tuple)) and all(isinstance(sent, str) for sent in doc)
+
+
+def doc_sentences(doc):
+    # token sequences are written as one sentence of space separated tokens
+    if is_sentences(doc):
+        return doc
+    if isinstance(doc, TokenTables):
+        doc = doc.tokens
+    return [' '.join(str(t) for t in doc)]
+
+
 class Pythonrouge:
     def __init__(self, summary_file_exist=True, summary=None, reference=None,
                  delete_xml=True, xml_dir='/tmp/',
@@ -22,7 +39,8 @@ class Pythonrouge:
                  ROUGE_W_Weight=1.2, stemming=True, stopwords=False,
                  word_level=True, length_limit=True, length=100, use_cf=False,
                  cf=95, scoring_formula="average", resampling=True,
-                 samples=1000, favor=True, p=0.5):
+                 samples=1000, favor=True, p=0.5, backend='native',
+                 timing=False):
         """
         n_gram: Compute ROUGE-N up to max-ngram length will be computed.
         ROUGE_SU4: Compute ROUGE-SU4 measures unigram and skip-bigram
@@ -41,12 +59,26 @@ class Pythonrouge:
         cf: Confidence interval (default is 95%).
         scoring_formula: 'average' is calculated by model average. 'best' is
                          calculated by best model.
-        resampling: Use bootstrap resampling.
+        resampling: Use bootstrap resampling. With backend='native',
+                    False skips it and the averages are plain means;
+                    ROUGE-1.5.5.pl always resamples (1000 times unless
+                    samples is given).
         samples: pecify the number of sampling point in bootstrap resampling
                  (default is 1000).
         favor: If True, set relative importance of ROUGE scores as blow.
         p: Relative importance of recall and precision ROUGE scores.
            Alpha -> 1 favors precision, Alpha -> 0 favors recall.
+        backend: 'native' scores in-process with rouge.native, which
+                 reproduces RELEASE-1.5.5/ROUGE-1.5.5.pl to the printed
+                 digits. 'perl' runs ROUGE-1.5.5.pl and passes it the
+                 setting (and the summaries given as lists) on stdin.
+        timing: If True, calc_score records where its time goes in
+                self.timings (seconds per step: 'native', 'perl_spawn',
+                'perl_run', 'parse_output'), the number of ROUGE-1.5.5.pl
+                processes in self.processes and the time of each
+                evaluation in self.eval_seconds.  The perl backend scores
+                all evaluations in one process, so each gets an equal
+                share of its time.
         ### Summary Files ###
         peer_path & model_path: If summary_file_exist=True,
                                 choose each directory path.
@@ -66,9 +98,14 @@ class Pythonrouge:
 
         In first N strings, reference summaries should have same file name
         as the system output file.
-        delete: If True, the rouge setting file(setting.xml) is deleted.
-                If False, rouge setting file is saved in current directory.
+        delete_xml: If True, the perl backend writes nothing to disk.
+                    If False, the summaries and setting.xml are saved in
+                    a temporary directory under xml_dir.
         If summary_file_exist=False, your input format should be as below.
+        A document may also be a single token sequence (e.g. interned token
+        IDs in an array) or rouge.native.TokenTables, such as the tables of
+        a rouge.index.ReferenceIndex.  The native backend compares these
+        tokens as they are; the perl backend writes them space separated.
         # summary: double list
         summary = [[summaryA_sent1, summaryA_sent2],
                    [summaryB_sent1, summaryB_sent2]]
@@ -112,6 +149,11 @@ class Pythonrouge:
         # evaluation outputs
         self.recall_only = recall_only
         self.f_measure_only = f_measure_only
+        self.backend = backend
+        self.timing = timing
+        self.timings = {}
+        self.processes = 0
+        self.eval_seconds = []
         # check size of system/reference summary length
         if not summary_file_exist and len(self.summary) != len(self.reference):
             assert('size of summary and refernece is different.')
@@ -129,6 +171,10 @@ class Pythonrouge:
         if self.length_limit and self.length == 0:
             assert 'Length limit should not be less than 1.'
 
+        # check backend
+        if self.backend not in ('native', 'perl'):
+            raise ValueError('Choose backend "native" or "perl"')
+
         # check scoreing formula: best/average
         if self.scoring_formula != 'best' or self.scoring_formula == 'average':
             assert 'Choose scoreing formula "average" or "best"'
@@ -146,21 +192,9 @@ class Pythonrouge:
             os.mkdir(self.peer_path)
             os.mkdir(self.model_path)
 
-            # save system summaries in tmp_dir
-            for i, doc in enumerate(self.summary):
-                path = os.path.join(self.peer_path, '{}.txt'.format(i))
-                with open(path, 'w') as f:
-                    for sent in doc:
-                        f.write('{}\n'.format(sent))
-
-            # save reference summaries in tmp_dir
-            for j, ref in enumerate(self.reference):
-                for k, doc in enumerate(ref):
-                    path = os.path.join(self.model_path,
-                                        '{}.{}.txt'.format(j, k))
-                    with open(path, 'w') as f:
-                        for sent in doc:
-                            f.write("{}\n".format(sent))
+            for path, text in self.summary_docs(self.peer_path, self.model_path).items():
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(text)
 
         # set xml setting file path
         xml_path = os.path.join(tmp_dir, 'setting.xml')
@@ -168,31 +202,72 @@ class Pythonrouge:
             print('setting file is saved at {}'.format(xml_path))
 
         # write system/summary path to xml
-        xml = open('{}'.format(xml_path), 'w')
-        xml.write('<ROUGE-EVAL version="1.0">\n')
-        for n, peer in enumerate(glob("{}/*".format(self.peer_path))):
-            file_name = os.path.splitext(os.path.basename(peer))[0]
-            xml.write('<EVAL ID="{}">\n'.format(n + 1))
-            xml.write('<MODEL-ROOT>{}</MODEL-ROOT>\n'.format(self.model_path))
-            xml.write('<PEER-ROOT>{}</PEER-ROOT>\n'.format(self.peer_path))
-            xml.write('<INPUT-FORMAT TYPE="SPL">\n"</INPUT-FORMAT>\n')
-            xml.write('<PEERS>\n')
-            xml.write('<P ID="{}">{}</P>\n'.format('A', basename(peer)))
-            xml.write('</PEERS>\n')
-            xml.write('<MODELS>\n')
-            model_paths = glob('{}/{}.*'.format(self.model_path, file_name))
-            for path, ids in zip(model_paths,
-                                 [i for i in range(len(model_paths))]):
-                xml.write('<M ID="{}">{}</M>\n'.format(ids, basename(path)))
-            xml.write('</MODELS>\n')
-            xml.write('</EVAL>\n')
-        xml.write('</ROUGE-EVAL>\n')
-        xml.close()
+        with open(xml_path, 'w', encoding='utf-8') as xml:
+            xml.write(self.setting_xml(self.peer_path, self.model_path))
         self.tmp_dir = tmp_dir
         self.setting_file = xml_path
 
-    def set_command(self):
+    def setting_xml(self, peer_root, model_root, docs=None):
+        """
+        The setting.xml text. docs ({path: text}) are embedded as DOC
+        elements, which ROUGE-1.5.5.pl reads instead of the files.
+        """
+        xml = ['<ROUGE-EVAL version="1.0">\n']
+        for path, text in (docs or {}).items():
+            xml.append('<DOC PATH={}>{}</DOC>\n'.format(
+                quoteattr(path), b64encode(text.encode('utf-8')).decode('ascii')))
+        for n, (peer, models) in enumerate(self.eval_files()):
+            xml.append('<EVAL ID="{}">\n'.format(n + 1))
+            xml.append('<MODEL-ROOT>{}</MODEL-ROOT>\n'.format(model_root))
+            xml.append('<PEER-ROOT>{}</PEER-ROOT>\n'.format(peer_root))
+            xml.append('<INPUT-FORMAT TYPE="SPL">\n"</INPUT-FORMAT>\n')
+            xml.append('<PEERS>\n')
+            xml.append('<P ID="{}">{}</P>\n'.format('A', peer))
+            xml.append('</PEERS>\n')
+            xml.append('<MODELS>\n')
+            for ids, model in enumerate(models):
+                xml.append('<M ID="{}">{}</M>\n'.format(ids, model))
+            xml.append('</MODELS>\n')
+            xml.append('</EVAL>\n')
+        xml.append('</ROUGE-EVAL>\n')
+        return ''.join(xml)
+
+    def eval_files(self):
+        # (peer file name, [model file names]) of EVAL ID n + 1
+        if not self.summary_file_exist:
+            return [('{}.txt'.format(j), ['{}.{}.txt'.format(j, k) for k in range(len(ref))])
+                    for j, ref in enumerate(self.reference)]
+        evals = []
+        for peer in self.peer_files():
+            file_name = os.path.splitext(os.path.basename(peer))[0]
+            model_paths = glob('{}/{}.*'.format(self.model_path, file_name))
+            evals.append((basename(peer), [basename(path) for path in model_paths]))
+        return evals
+
+    def summary_docs(self, peer_root, model_root):
+        # the files make_xml writes for summaries given as lists
+        docs = {}
+        for i, doc in enumerate(self.summary):
+            docs['{}/{}.txt'.format(peer_root, i)] = ''.join(
+                '{}\n'.format(sent) for sent in doc_sentences(doc))
+        for j, ref in enumerate(self.reference):
+            for k, doc in enumerate(ref):
+                docs['{}/{}.{}.txt'.format(model_root, j, k)] = ''.join(
+                    '{}\n'.format(sent) for sent in doc_sentences(doc))
+        return docs
+
+    def peer_files(self):
+        # EVAL ID n + 1 is the n-th system summary of the input lists
+        if not self.summary_file_exist:
+            return [os.path.join(self.peer_path, '{}.txt'.format(i))
+                    for i in range(len(self.summary))]
+        return glob("{}/*".format(self.peer_path))
+
+    def set_command(self, per_eval=False):
         self.make_xml()
+        return self.command_options(per_eval) + [self.setting_file]
+
+    def command_options(self, per_eval=False):
         rouge_cmd = ['perl', self.ROUGE_path, "-e", self.data_path, "-a"]
         rouge_cmd += '-n {}'.format(self.n_gram).split()
         # ROUGE-SU4
@@ -246,7 +321,10 @@ class Pythonrouge:
         if self.favor:
             rouge_cmd += '-p {}'.format(self.p).split()
 
-        rouge_cmd.append(self.setting_file)
+        # per evaluation scores
+        if per_eval:
+            rouge_cmd.append('-d')
+
         return rouge_cmd
 
     def parse_output(self, lines):
@@ -375,12 +453,171 @@ class Pythonrouge:
 
         return result
 
-    def calc_score(self):
-        rouge_cmd = self.set_command()
-        output = subprocess.check_output(rouge_cmd, stderr=subprocess.STDOUT)
-        output = output.decode('utf-8')
+    def native_scorer(self):
+        # same parameters as set_command passes to ROUGE-1.5.5.pl
+        return NativeRouge(
+            n_gram=self.n_gram,
+            skip_distance=4 if self.ROUGE_SU4 else None,
+            skip_unigram=self.ROUGE_SU4,
+            lcs=self.ROUGE_L,
+            wlcs_weight=self.W_Weight if self.ROUGE_W else None,
+            length_limit=self.length if self.length_limit and self.word_level else 0,
+            byte_limit=self.length if self.length_limit and not self.word_level else 0,
+            stemming=self.stemming,
+            stopwords=self.stopwords,
+            scoring_formula='A' if self.scoring_formula == 'average' else 'B',
+            alpha=self.p if self.favor else 0.5,
+            samples=self.samples if self.resampling else 0,
+            cf=self.cf if self.use_cf else 95)
+
+    def native_evals(self):
+        # pair system and reference summaries the same way as make_xml
+        if not self.summary_file_exist:
+            return [(self.native_doc(doc), [self.native_doc(ref) for ref in refs])
+                    for doc, refs in zip(self.summary, self.reference)]
+        evals = []
+        for peer in self.peer_files():
+            file_name = os.path.splitext(os.path.basename(peer))[0]
+            model_paths = glob('{}/{}.*'.format(self.model_path, file_name))
+            evals.append((read_lines(peer), [read_lines(path) for path in model_paths]))
+        return evals
+
+    @staticmethod
+    def native_doc(doc):
+        return sentences_to_units(doc) if is_sentences(doc) else doc
+
+    def parse_eval_output(self, lines):
+        # '-d' prints "A ROUGE-1 Eval 1.A R:0.50000 P:0.25000 F:0.33333"
+        evals = dict()
+        for l in lines:
+            match = findall(r'^A (\S+) Eval ([0-9]+)\.A R:([0-9.]+) P:([0-9.]+) F:([0-9.]+)', l)
+            if match:
+                tag, eval_id, r, p, f = match[0]
+                evals.setdefault(int(eval_id), []).append((tag, (r, p, f)))
+        return [self.parse_eval_scores(evals.get(n + 1, []))
+                for n in range(len(self.peer_files()))]
+
+    def parse_eval_scores(self, scores):
+        # scores of one evaluation, parsed like the average of a single one
+        lines = []
+        for tag, values in scores:
+            for k, value in zip('RPF', values):
+                lines.append('A {} Average_{}: {} ({}%-conf.int. {} - {})'.format(
+                    tag, k, value, self.cf, value, value))
+        return self.parse_output(lines)
+
+    def calc_score(self, per_eval=False):
+        """
+        Return the ROUGE scores of the whole input.
+        If per_eval=True, return a tuple of those and a list of the scores
+        of each evaluation, in the order of the system summaries.
+        """
+        if self.backend == 'perl':
+            return self.calc_score_perl(per_eval)
+        rouge = self.native_scorer()
+        evals = self.native_evals()
+        if self.timing:
+            methods = self.timed_evaluate(rouge, evals)
+        else:
+            methods = rouge.evaluate(evals)
+        start = time.perf_counter()
+        result = self.parse_output(rouge.output_lines(methods))
+        if per_eval:
+            result = (result, [self.parse_eval_scores([(tag, ['{:7.5f}'.format(x) for x in scores[n]])
+                                                       for tag, scores in methods])
+                               for n in range(len(methods[0][1]) if methods else 0)])
+        self.add_timing('parse_output', start)
+        return result
+
+    def timed_evaluate(self, rouge, evals):
+        # NativeRouge.evaluate one evaluation at a time
+        methods = [(tag, []) for tag in rouge.method_tags()]
+        self.eval_seconds = []
+        for e in evals:
+            start = time.perf_counter()
+            for k, (_, scores) in enumerate(rouge.evaluate([e])):
+                methods[k][1].extend(scores)
+            self.eval_seconds.append(time.perf_counter() - start)
+        self.timings['native'] = self.timings.get('native', 0) + sum(self.eval_seconds)
+        return methods
+
+    def add_timing(self, step, start):
+        if self.timing:
+            self.timings[step] = self.timings.get(step, 0) + time.perf_counter() - start
+
+    def share_perl_time(self, seconds):
+        self.processes += 1
+        if self.timing:
+            n = len(self.peer_files()) if self.summary_file_exist else len(self.summary)
+            self.eval_seconds = [seconds / n] * n if n else []
+
+    async def calc_score_async(self, per_eval=False):
+        """
+        calc_score as a coroutine. The perl backend awaits ROUGE-1.5.5.pl
+        without blocking the event loop, so several instances can run at
+        once (see gather_scores); the native backend scores in place.
+        """
+        if self.backend != 'perl':
+            return self.calc_score(per_eval)
+        rouge_cmd, setting = self.perl_invocation(per_eval)
+        start = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            *rouge_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.add_timing('perl_spawn', start)
+        run = time.perf_counter()
+        stdout, stderr = await proc.communicate(setting.encode('utf-8'))
+        self.add_timing('perl_run', run)
+        self.share_perl_time(time.perf_counter() - start)
+        return self.perl_result(rouge_cmd, proc.returncode, stdout, stderr, per_eval)
+
+    def calc_score_perl(self, per_eval=False):
+        rouge_cmd, setting = self.perl_invocation(per_eval)
+        # stderr is kept apart: its progress lines would break up result lines
+        start = time.perf_counter()
+        proc = subprocess.run(rouge_cmd, input=setting.encode('utf-8'),
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.add_timing('perl_run', start)
+        self.share_perl_time(time.perf_counter() - start)
+        return self.perl_result(rouge_cmd, proc.returncode, proc.stdout, proc.stderr, per_eval)
+
+    def perl_invocation(self, per_eval=False):
+        # (command, text for its stdin)
+        if self.delete_xml:
+            # setting and summaries go through stdin, nothing is written
+            if self.summary_file_exist:
+                setting = self.setting_xml(self.peer_path, self.model_path)
+            else:
+                setting = self.setting_xml('system', 'reference', self.summary_docs('system', 'reference'))
+            return self.command_options(per_eval) + ['-'], setting
+        return self.set_command(per_eval), ''
+
+    def perl_result(self, rouge_cmd, returncode, stdout, stderr, per_eval=False):
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, rouge_cmd, stdout, stderr)
+        start = time.perf_counter()
+        output = stdout.decode('utf-8')
         output = output.strip().split('\n')
         result = self.parse_output(output)
-        if self.delete_xml:
-            shutil.rmtree(self.tmp_dir)
-        return result
\ No newline at end of file
+        if per_eval:
+            result = (result, self.parse_eval_output(output))
+        self.add_timing('parse_output', start)
+        return result
+
+
+async def gather_scores(rouges, per_eval=False, concurrency=4):
+    """
+    Await calc_score_async of each Pythonrouge, running at most concurrency
+    of them at a time. The results are in the order of rouges.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def calc(rouge):
+        async with semaphore:
+            return await rouge.calc_score_async(per_eval)
+
+    return await asyncio.gather(*[calc(rouge) for rouge in rouges])
+
+
+def calc_scores(rouges, per_eval=False, concurrency=4):
+    """gather_scores for synchronous callers."""
+    return asyncio.run(gather_scores(rouges, per_eval, concurrency))
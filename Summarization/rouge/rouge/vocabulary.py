@@ -0,0 +1,38 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Token interning for the token ID sequences NativeRouge can score."""
+from array import array
+
+
+class Vocabulary:
+    """Maps tokens to stable integer IDs.
+
+    IDs are given in order of first appearance and never change, so ID
+    sequences stay valid while the vocabulary grows (e.g. over many run
+    files scored against the same references).
+    """
+
+    def __init__(self, tokens=()):
+        self.tokens = []
+        self.ids = {}
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.ids
+
+    def add(self, token):
+        """ID of token, adding it if it is new."""
+        i = self.ids.get(token)
+        if i is None:
+            i = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return i
+
+    def intern(self, tokens):
+        """array('I') of the IDs of tokens."""
+        ids = self.ids
+        return array('I', [ids[t] if t in ids else self.add(t) for t in tokens])
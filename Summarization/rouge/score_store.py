@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""インスタンスごとの評価結果（ROUGEスコア）の保存先．
+評価データが出し直されても，要約の変わっていないIDは保存した結果を使い，解析と評価を省きます．
+
+結果は(評価設定, ID, 要約のハッシュ値)をキーとして保存します．
+評価設定は語のとり方ごとに，参照インデックスのキー（GSのハッシュ値，語のとり方，Unidic，語の選別設定）と
+ROUGEの設定・計算方法から作るもので，評価設定ごとに1つのパックファイルへ追記します．
+パックファイルの形式はtoken_cache.TokenPackと同じで，スコアをJSONにした文字列1つを語列として書き込みます．
+"""
+
+import os
+import json
+import glob
+import hashlib
+from token_cache import TokenPack
+from typing import Dict, Optional
+
+# 形式やキーの作り方を変えたときに上げる
+FORMAT_VERSION = 1
+
+
+def config_key(config: Dict[str, object]) -> str:
+    return hashlib.sha1(json.dumps({
+        'format': FORMAT_VERSION,
+        'config': config
+    }, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def instance_key(i: str, summary: str) -> bytes:
+    return hashlib.sha1('{0}\0{1}'.format(i, summary).encode('utf-8')).digest()
+
+
+class ScoreStore:
+    """評価設定ごとのインスタンス別スコアの保存先．
+    評価設定はconfig_keyで求めた文字列で指定します．
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.packs = {}  # type: Dict[str, TokenPack]
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(store_dir, exist_ok=True)
+
+    def pack(self, config: str) -> TokenPack:
+        if config not in self.packs:
+            self.packs[config] = TokenPack(os.path.join(self.store_dir, '{0}.pack'.format(config)))
+        return self.packs[config]
+
+    def get(self, config: str, i: str, summary: str) -> Optional[Dict[str, float]]:
+        record = self.pack(config).get(instance_key(i, summary))
+        if record is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(record[0])
+
+    def put(self, config: str, i: str, summary: str, scores: Dict[str, float]):
+        self.pack(config).put(instance_key(i, summary), [json.dumps(scores)])
+
+    def clear(self) -> int:
+        """保存した結果をすべて消し，消したパックファイルの数を返す．"""
+        self.close()
+        self.packs = {}
+        paths = glob.glob(os.path.join(self.store_dir, '*.pack'))
+        for path in paths:
+            os.remove(path)
+        return len(paths)
+
+    def close(self):
+        for pack in self.packs.values():
+            pack.close()
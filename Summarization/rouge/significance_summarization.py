@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""poliinfo_eval_summarization.pyの個別評価結果（Result-*.txt）から，評価データ（run）の組ごとに
+平均スコアの差の有意性を検定するスクリプト．
+
+全runのIDごとのスコアをrun×ID×スコア種別×語のとり方の配列に読み込み，
+対応のあるブートストラップ検定と近似ランダム化検定（IDごとに2つのrunの解答を入れ替える）のp値を，
+全てのrunの組について一度に求めます．
+検定する平均は全体結果と同じもので，トータル（既定）では制限字数を超えた解答（有効解答が0）を0点として
+全IDで平均し，有効回答では有効な解答だけで平均します．
+どちらも「有効な解答のスコアの合計 / 数」の形なので，リサンプリングした分子と分母を
+「重み行列×値」の行列積で全runについて一度に求めます．
+"""
+
+import sys
+import time
+import pathlib
+import argparse
+import numpy as np
+from typing import List, Tuple
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="""PoliInfo Summarizationタスクの個別評価結果から，runの組ごとに平均スコアの差の有意性を検定します．""")
+
+    parser.add_argument('-i', '--input-files',
+                        nargs='+',
+                        required=True,
+                        help='poliinfo_eval_summarization.pyが出力した個別評価結果（Result-*.txt）を指定します'
+                        )
+
+    parser.add_argument('-o', '--output',
+                        required=True,
+                        help='検定結果の出力先を指定します（拡張子が.npzならNumPyの配列として保存します）'
+                        )
+
+    parser.add_argument('-a', '--average',
+                        choices=['total', 'valid'],
+                        default='total',
+                        help='検定する平均を指定します（total: トータル．無効な解答を0点として全IDで平均（既定），'
+                             'valid: 有効回答．有効な解答だけで平均）'
+                        )
+
+    parser.add_argument('-n', '--samples',
+                        type=int,
+                        default=10000,
+                        help='ブートストラップと近似ランダム化の試行回数を指定します'
+                        )
+
+    parser.add_argument('-s', '--seed',
+                        type=int,
+                        default=0,
+                        help='乱数の種を指定します'
+                        )
+
+    return parser.parse_args()
+
+
+# 平均の種類と，全体結果での呼び方
+average_names = {'total': 'トータル', 'valid': '有効回答'}
+
+
+def run_name(path: str) -> str:
+    # Result-PoliInfo-Summarization-Single_TeamA-1.txt -> TeamA-1
+    return pathlib.Path(path).stem.split('_', 1)[-1]
+
+
+def load_results(paths: List[str]) -> Tuple[np.ndarray, np.ndarray, List[str], List[str], List[str]]:
+    """個別評価結果を読み込み，run×ID×スコア種別×語のとり方のスコアの配列，run×IDの有効解答の配列と，
+    ID・スコア種別・語のとり方の名前を返す．IDは全てのrunに共通するものだけを，最初のrunの順に使う．
+    """
+    tables = []
+    for path in paths:
+        with open(path) as f:
+            header = f.readline().rstrip('\n').split('\t')
+            rows = {}
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                rows[fields[0]] = (fields[3] == '1', [float(x) for x in fields[4:]])
+        tables.append((header[4:], rows))
+
+    # 列名は「スコア種別_語のとり方」
+    columns = tables[0][0]
+    metrics = []
+    extract_types = []
+    for c in columns:
+        metric, et = c.rsplit('_', 1)
+        if metric not in metrics:
+            metrics.append(metric)
+        if et not in extract_types:
+            extract_types.append(et)
+    for path, (cols, _) in zip(paths, tables):
+        if cols != columns:
+            raise ValueError('{0}: the score columns differ from {1}'.format(path, paths[0]))
+    positions = [(metrics.index(m), extract_types.index(et)) for m, et in (c.rsplit('_', 1) for c in columns)]
+
+    ids = [i for i in tables[0][1].keys() if all(i in rows for _, rows in tables)]
+    for path, (_, rows) in zip(paths, tables):
+        if len(rows) != len(ids):
+            print('{0}: {1} of {2} IDs are not in every run and are left out'.format(
+                path, len(rows) - len(ids), len(rows)), file=sys.stderr)
+
+    scores = np.zeros((len(paths), len(ids), len(metrics), len(extract_types)))
+    valid = np.zeros((len(paths), len(ids)), dtype=bool)
+    for r, (_, rows) in enumerate(tables):
+        valid[r] = [rows[i][0] for i in ids]
+        values = np.array([rows[i][1] for i in ids]).reshape(len(ids), len(columns))
+        for k, (m, e) in enumerate(positions):
+            scores[r, :, m, e] = values[:, k]
+    return scores, valid, ids, metrics, extract_types
+
+
+def paired_tests(scores: np.ndarray, valid: np.ndarray, samples: int, average: str = 'total', seed: int = 0,
+                 chunk: int = 500) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """run×ID×…のスコアとrun×IDの有効解答から，runごとの平均と，全てのrunの組(a, b)についての平均の差（a - b），
+    対応のあるブートストラップ検定と近似ランダム化検定の両側p値を，run×…，run×run×…の配列で返す．
+
+    平均は「有効な解答のスコアの合計 / 数」で，数はaverageが'total'なら全ID数，'valid'なら有効な解答の数．
+    ブートストラップでは各IDが選ばれた回数を試行×IDの重み行列とし，全runの分子と分母を1回の行列積で求める．
+    近似ランダム化では入れ替えるIDの印を重み行列とし，入れ替えるIDの合計S = 印×値から，
+    入れ替えた後の合計をa: T_a - S_a + S_b，b: T_b - S_b + S_aとして全ての組について求める．
+    """
+    n_runs, n = scores.shape[:2]
+    numerators = scores * valid.reshape(valid.shape + (1,) * (scores.ndim - 2))
+    flat = numerators.reshape(n_runs, n, -1).transpose(1, 0, 2).reshape(n, -1)
+    k = flat.shape[1] // n_runs
+    denominators = (valid if average == 'valid' else np.ones_like(valid)).T.astype(np.float64)
+    totals = flat.sum(axis=0).reshape(n_runs, k)
+    total_counts = denominators.sum(axis=0)[:, np.newaxis]
+    rng = np.random.default_rng(seed)
+
+    # 各試行で各IDが選ばれた回数
+    idx = rng.integers(0, n, size=(samples, n))
+    counts = np.bincount((idx + np.arange(samples)[:, np.newaxis] * n).ravel(),
+                         minlength=samples * n).reshape(samples, n).astype(np.float64)
+    # 各試行で2つのrunの解答を入れ替えるID
+    swaps = rng.integers(0, 2, size=(samples, n)).astype(np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = totals / total_counts
+    deltas = means[:, np.newaxis, :] - means[np.newaxis, :, :]
+    observed = np.abs(deltas) - 1e-12
+    # 観測値以上に差が開いた試行の数（上三角だけを数える）
+    exceed_boot = np.zeros(deltas.shape, dtype=np.int64)
+    exceed_rand = np.zeros(deltas.shape, dtype=np.int64)
+    # 試行を分けて計算し，一時配列を小さく保つ（有効な解答が選ばれない試行の平均はnanで，数えない）
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start in range(0, samples, chunk):
+            # 試行×run×スコア
+            w = counts[start:start + chunk]
+            boot = (w @ flat).reshape(-1, n_runs, k) / (w @ denominators)[:, :, np.newaxis]
+            w = swaps[start:start + chunk]
+            swapped = (w @ flat).reshape(-1, n_runs, k)
+            swapped_counts = (w @ denominators)[:, :, np.newaxis]
+            kept = totals - swapped
+            kept_counts = total_counts - swapped_counts
+            if average == 'total':
+                # 分母が一定なら，入れ替えた差は(T_a - 2 S_a) / n - (T_b - 2 S_b) / nになる
+                perm = (kept - swapped) / n
+            for a in range(n_runs - 1):
+                # 帰無仮説の下の分布に合わせて，ブートストラップの差は観測値を引いて中心化する
+                d = boot[:, a:a + 1] - boot[:, a + 1:]
+                d -= deltas[a, a + 1:]
+                np.abs(d, out=d)
+                exceed_boot[a, a + 1:] += np.count_nonzero(d >= observed[a, a + 1:], axis=0)
+                if average == 'total':
+                    d = perm[:, a:a + 1] - perm[:, a + 1:]
+                else:
+                    d = (kept[:, a:a + 1] + swapped[:, a + 1:]) / (kept_counts[:, a:a + 1] + swapped_counts[:, a + 1:])
+                    d -= (kept[:, a + 1:] + swapped[:, a:a + 1]) / (kept_counts[:, a + 1:] + swapped_counts[:, a:a + 1])
+                np.abs(d, out=d)
+                exceed_rand[a, a + 1:] += np.count_nonzero(d >= observed[a, a + 1:], axis=0)
+    upper = np.triu(np.ones((n_runs, n_runs), dtype=bool), 1)[:, :, np.newaxis]
+    exceed_boot = np.where(upper, exceed_boot, exceed_boot.transpose(1, 0, 2))
+    exceed_rand = np.where(upper, exceed_rand, exceed_rand.transpose(1, 0, 2))
+    p_boot = (1 + exceed_boot) / (samples + 1)
+    p_rand = (1 + exceed_rand) / (samples + 1)
+    # 同じrunどうしは差がない
+    p_boot[np.arange(n_runs), np.arange(n_runs)] = 1
+    p_rand[np.arange(n_runs), np.arange(n_runs)] = 1
+    shape = (n_runs, n_runs) + scores.shape[2:]
+    return (means.reshape((n_runs,) + scores.shape[2:]), deltas.reshape(shape), p_boot.reshape(shape),
+            p_rand.reshape(shape))
+
+
+def write_tsv(path: str, runs: List[str], metrics: List[str], extract_types: List[str], average: str,
+              means: np.ndarray, deltas: np.ndarray, p_boot: np.ndarray, p_rand: np.ndarray):
+    name = average_names[average]
+    with open(path, 'w') as f:
+        print('\t'.join(['語のとり方', 'スコア種別', 'run A', 'run B', '平均A（{0}）'.format(name),
+                         '平均B（{0}）'.format(name), '差（A-B）', 'ブートストラップp値', '近似ランダム化p値']), file=f)
+        for e, et in enumerate(extract_types):
+            for m, metric in enumerate(metrics):
+                for a in range(len(runs)):
+                    for b in range(a + 1, len(runs)):
+                        print('\t'.join([et, metric, runs[a], runs[b]] + ['{0}'.format(x) for x in [
+                            means[a, m, e], means[b, m, e], deltas[a, b, m, e], p_boot[a, b, m, e],
+                            p_rand[a, b, m, e]]]), file=f)
+
+
+def main():
+    args = get_args()
+    start = time.perf_counter()
+    runs = [run_name(path) for path in args.input_files]
+    scores, valid, ids, metrics, extract_types = load_results(args.input_files)
+    means, deltas, p_boot, p_rand = paired_tests(scores, valid, args.samples, args.average, args.seed)
+    if args.output.endswith('.npz'):
+        np.savez(args.output, average=np.array(average_names[args.average]), runs=np.array(runs), ids=np.array(ids),
+                 metrics=np.array(metrics), extract_types=np.array(extract_types), means=means, deltas=deltas,
+                 p_bootstrap=p_boot, p_randomization=p_rand)
+    else:
+        write_tsv(args.output, runs, metrics, extract_types, args.average, means, deltas, p_boot, p_rand)
+    print('{0} runs, {1} IDs, {2} scores: {3:.2f}s'.format(len(runs), len(ids), len(metrics) * len(extract_types),
+                                                           time.perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
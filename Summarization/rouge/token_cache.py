@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""形態素解析結果（語列）のディスクキャッシュ．
+テキストのハッシュ値をキーとして，語のとり方ごとに1つのパックファイルへ追記します．
+パックファイル名は語のとり方，Unidicの場所と版，語の選別設定から求めたハッシュ値なので，
+設定が変われば別のファイルが使われます．
+
+パックファイルは以下のレコードの並びです（数値はリトルエンディアン）．
+  テキストのSHA-1（20バイト） 本体のバイト数（uint32） 語数（uint32） 語をNULで区切ったUTF-8文字列
+ファイルは最初の参照時にmmapで開き，レコードの見出しだけを読んで索引を作ります．
+語列は参照されたときに初めて復元します．
+複数のプロセスから同時に追記できるよう，1レコードを1回のwriteでO_APPENDのファイルに書き込みます．
+"""
+
+import os
+import mmap
+import json
+import struct
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+# 形式や語の取り出し方を変えたときに上げる
+FORMAT_VERSION = 1
+
+_header = struct.Struct('<20sII')
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+def dictionary_id(unidic_path: str) -> Dict[str, object]:
+    """Unidicを識別する情報（場所，versionファイルの内容，sys.dicの大きさと更新時刻）．"""
+    path = os.path.realpath(unidic_path)
+    info = {'path': path}  # type: Dict[str, object]
+    version_path = os.path.join(path, 'version')
+    if os.path.exists(version_path):
+        with open(version_path, encoding='utf-8', errors='replace') as f:
+            info['version'] = f.read().strip()
+    sys_dic = os.path.join(path, 'sys.dic')
+    if os.path.exists(sys_dic):
+        st = os.stat(sys_dic)
+        info['sys.dic'] = [st.st_size, st.st_mtime_ns]
+    return info
+
+
+class TokenPack:
+    """1つのパックファイル．索引は最初の参照時に作ります．"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = None  # type: Optional[Dict[bytes, Tuple[int, int]]]
+        self.map = None  # type: Optional[mmap.mmap]
+        self.scanned = 0
+
+    def _refresh(self):
+        # 他のプロセスが追記した分も含めて索引を更新する
+        if self.index is None:
+            self.index = {}
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size <= self.scanned:
+            return
+        if self.map is not None:
+            self.map.close()
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self.map)
+        offset = self.scanned
+        while offset + _header.size <= size:
+            key, length, _ = _header.unpack_from(self.map, offset)
+            end = offset + _header.size + length
+            if end > size:
+                # 書き込み途中のレコード
+                break
+            self.index[key] = (offset + _header.size, length)
+            offset = end
+        self.scanned = offset
+
+    def get(self, key: bytes) -> Optional[List[str]]:
+        if self.index is None or key not in self.index:
+            self._refresh()
+        if key not in self.index:
+            return None
+        offset, length = self.index[key]
+        count = _header.unpack_from(self.map, offset - _header.size)[2]
+        if count == 0:
+            return []
+        return self.map[offset:offset + length].decode('utf-8').split('\0')
+
+    def put(self, key: bytes, tokens: List[str]):
+        body = '\0'.join(tokens).encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, _header.pack(key, len(body), len(tokens)) + body)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class TokenCache:
+    """語のとり方ごとの語列キャッシュ．
+    settingsには語列を左右する設定（機能動詞や内容語の品詞など）を，
+    語のとり方の名前をキーとして渡します．
+    """
+
+    def __init__(self, cache_dir: str, unidic_path: str, settings: Dict[str, object]):
+        self.cache_dir = cache_dir
+        self.dictionary = dictionary_id(unidic_path)
+        self.settings = settings
+        self.packs = {}  # type: Dict[str, TokenPack]
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def pack(self, extract_type: str) -> TokenPack:
+        if extract_type not in self.packs:
+            config = json.dumps({
+                'format': FORMAT_VERSION,
+                'extract_type': extract_type,
+                'dictionary': self.dictionary,
+                'settings': self.settings.get(extract_type)
+            }, ensure_ascii=False, sort_keys=True)
+            name = hashlib.sha1(config.encode('utf-8')).hexdigest()
+            self.packs[extract_type] = TokenPack(os.path.join(self.cache_dir, '{0}.pack'.format(name)))
+        return self.packs[extract_type]
+
+    def get(self, text: str, extract_type: str) -> Optional[List[str]]:
+        tokens = self.pack(extract_type).get(text_key(text))
+        if tokens is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return tokens
+
+    def put(self, text: str, extract_type: str, tokens: List[str]):
+        self.pack(extract_type).put(text_key(text), tokens)
+
+    def close(self):
+        for pack in self.packs.values():
+            pack.close()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""評価に用いる語列の作り方（語のとり方）と，語列を作るトークナイザ．
+
+トークナイザはTokenizerの形（extract_typesとtokenize_batch）を持ち，
+テキストのリストを受け取って，テキストごとに語のとり方の順の語列を返します．
+  MecabTokenizer  MeCab・Unidicによる内容語・短単位（原形）・短単位（表層形）
+  CharTokenizer   NFKCで正規化した文字（MeCabを使わない）
+  CachedTokenizer 別のトークナイザの結果をTokenCacheに保存して再利用する
+  ViewTokenizer   語のとり方ごとに担当のトークナイザへ振り分ける
+MeCabは最初に解析するときに読み込むので，解析しない場合（--helpや文字単位だけの評価）には不要です．
+"""
+
+import math
+import unicodedata
+from functools import lru_cache
+from token_cache import TokenCache
+from typing import Dict, Tuple, Optional, List
+
+functional_verbs = {"為る", "居る", "成る", "有る"}
+content_words = ["助詞", "助動詞", "感動詞", "空白", "補助記号", "記号-一般"]
+adverbial_nouns = {"所", "為", "くらい"}
+formal_nouns = {"の", "事", "物", "積り", "訳"}
+# 語のとり方
+extract_types = ['内容語', '短単位（原形）', '短単位（表層形）', '文字']
+# 形態素解析から得る語のとり方（文字はMeCabを使わない）
+morph_extract_types = extract_types[:3]
+
+
+def is_content_word(pos: str) -> bool:
+    for el in content_words:
+        if pos.startswith(el):
+            return False
+    return True
+
+
+def is_noun(pos: str, original: str) -> bool:
+    return (pos.startswith('名詞') or pos == "記号-文字" or pos.startswith(
+        "接尾辞-名詞的") or pos == "接頭辞") and (original not in adverbial_nouns) and (original not in formal_nouns)
+
+
+def is_numeral(pos: str) -> bool:
+    return pos == '名詞-数詞'
+
+
+# 漢数字の読み取り表
+kanji_digits = {c: i for i, c in enumerate('〇一二三四五六七八九')}
+kanji_digits.update({c: i for i, c in enumerate('0123456789')})
+large_units = (('兆', 10 ** 12), ('億', 10 ** 8), ('万', 10 ** 4))
+small_units = (('千', 1000), ('百', 100), ('十', 10))
+large_unit_chars = frozenset(u for u, _ in large_units)
+small_unit_chars = frozenset(u for u, _ in small_units)
+
+
+def positional_value(digits: List[int]) -> int:
+    """桁の列（先頭の0を除いたもの）を位取り記数法で読む．
+    16桁以上は従来どおり桁ごとにmath.powの浮動小数点で足し合わせる．
+    """
+    if len(digits) <= 15:
+        num = 0
+        for d in digits:
+            num = num * 10 + d
+        return num
+    num = 0
+    for i, d in enumerate(reversed(digits)):
+        num += int(d * math.pow(10, i))
+    return num
+
+
+def section_value(s: str, start: int, end: int) -> int:
+    """万・億・兆で区切られた1区間s[start:end]の値．
+    千・百・十がこの順にすべて現れるときは，各単位の前に何か書かれていれば1とみなす（従来の読み方）．
+    そうでなければ，漢数字・算用数字だけを拾って位取り記数法で読む．
+    """
+    pos = start
+    value = 0
+    for unit, base in small_units:
+        i = pos
+        while i < end and s[i] not in small_unit_chars:
+            i += 1
+        if i == end or s[i] != unit:
+            break
+        if i > pos:
+            value += base
+        pos = i + 1
+    else:
+        return value
+    digits = []
+    for i in range(start, end):
+        d = kanji_digits.get(s[i])
+        if d is not None and (d or digits):
+            digits.append(d)
+    return positional_value(digits)
+
+
+@lru_cache(maxsize=4096)
+def parse_kanji_numerals(kanji_numerals: str) -> int:
+    """連続する数詞の原形をつなげた文字列を整数にする．
+    兆・億・万で区切られた区間を先頭から1回走査で読み，区間ごとの値をsection_valueで求める．
+    同じ数詞は繰り返し現れるので，結果をLRUキャッシュに保持する．
+    """
+    s = kanji_numerals.replace('ゼロ-zero', '〇').replace('零', '〇')
+    n = len(s)
+    pos = 0
+    output = 0
+    for unit, base in large_units:
+        i = pos
+        while i < n and s[i] not in large_unit_chars:
+            i += 1
+        if i > pos and i < n and s[i] == unit:
+            output += section_value(s, pos, i) * base
+            pos = i + 1
+    i = pos
+    while i < n and s[i] not in large_unit_chars:
+        i += 1
+    return output + section_value(s, pos, i)
+
+
+def parse_morphs(mecab, s: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """MeCabの出力行を(表層形, 原形, 品詞)に分解する．
+    原形・品詞を持たない行は(表層形, None, None)，5列未満の行は読み飛ばす．
+    """
+    ret = []
+    for line in filter(lambda x: x != 'EOS', mecab.parse(s).splitlines()):
+        tmp = line.split('\t')
+        if len(tmp) >= 5:
+            ret.append((tmp[0], tmp[3], tmp[4]))
+        elif len(tmp) == 1:
+            ret.append((tmp[0], None, None))
+    return ret
+
+
+def parse_morph_nodes(mecab, s: str) -> List[Tuple[str, str, str]]:
+    """MeCabのノードAPIで1回だけ解析し，(表層形, 原形, 品詞)の列を返す．
+    Unidicのdicrcの出力形式（原形: %f[7]，品詞: %F-[0,1,2,3]，未知語の原形: %m）と同じ値を作る．
+    """
+    import MeCab
+    ret = []
+    nor_node = MeCab.MECAB_NOR_NODE
+    unk_node = MeCab.MECAB_UNK_NODE
+    node = mecab.parseToNode(s)
+    while node:
+        stat = node.stat
+        if stat == nor_node or stat == unk_node:
+            surface = node.surface
+            features = node.feature.split(',', 8)
+            pos = '-'.join([f for f in features[:4] if f != '*'])
+            if stat == unk_node or len(features) < 8:
+                ret.append((surface, surface, pos))
+            else:
+                ret.append((surface, features[7], pos))
+        node = node.next
+    return ret
+
+
+def content_words_of(morphs: List[Tuple[str, Optional[str], Optional[str]]]) -> List[str]:
+    """内容語を取り出す．連続する名詞は複合名詞に，漢数字は算用数字にまとめる．"""
+    ret = []
+    compound_nouns = []
+    numerals = []
+
+    def append(term):
+        if term not in functional_verbs:
+            ret.append(term)
+
+    def extract_compound_noun():
+        if len(compound_nouns) > 0:
+            append(''.join(compound_nouns))
+            compound_nouns.clear()
+
+    def extractNumeral():
+        if len(numerals) > 0:
+            compound_nouns.append(str(parse_kanji_numerals(''.join(numerals))))
+            numerals.clear()
+
+    for surface, original, pos in morphs:
+        if pos is None:
+            append(surface)
+        elif is_noun(pos, surface):
+            if is_numeral(pos):
+                numerals.append(original.strip())
+            else:
+                extractNumeral()
+                compound_nouns.append(original.strip())
+        else:
+            extractNumeral()
+            extract_compound_noun()
+            if is_content_word(pos):
+                append(original.strip())
+
+    extractNumeral()
+    extract_compound_noun()
+
+    return ret
+
+
+def extract_words(mecab, s: str) -> List[str]:
+    return content_words_of(parse_morphs(mecab, s))
+
+
+def extract_all_words(mecab, s: str, is_original: bool) -> List[str]:
+    parsed = mecab.parse(s)
+    idx = 0 if is_original else 3
+    ret = []
+
+    def append(term):
+        ret.append(term)
+
+    for line in filter(lambda x: x != 'EOS', parsed.splitlines()):
+        tmp = line.split('\t')
+        if len(tmp) > 2:
+            append(tmp[idx])
+        else:
+            append(tmp[0])
+    return ret
+
+
+def tokenize(mecab, s: str) -> List[List[str]]:
+    """1回の形態素解析から，extract_typesの順に内容語・短単位（原形）・短単位（表層形）の語列を返す．
+    extract_words, extract_all_words(False), extract_all_words(True)と同じ結果になる．
+    """
+    morphs = parse_morph_nodes(mecab, s)
+    return [
+        content_words_of(morphs),
+        [original for _, original, _ in morphs],
+        [surface for surface, _, _ in morphs]
+    ]
+
+
+def char_tokens(s: str, strip_punctuation: bool = True) -> List[str]:
+    """NFKCで正規化した文字の列を返す．空白・制御文字は除き，strip_punctuationなら句読点（Unicodeの区切り文字）も除く．"""
+    ret = []
+    for c in unicodedata.normalize('NFKC', s):
+        category = unicodedata.category(c)
+        if category[0] in 'ZC' or (strip_punctuation and category[0] == 'P'):
+            continue
+        ret.append(c)
+    return ret
+
+
+def token_settings(strip_punctuation: bool = True) -> Dict[str, object]:
+    # 語のとり方ごとに，語列を左右する設定
+    return {
+        '内容語': {
+            'functional_verbs': sorted(functional_verbs),
+            'content_words': content_words,
+            'adverbial_nouns': sorted(adverbial_nouns),
+            'formal_nouns': sorted(formal_nouns)
+        },
+        '文字': {
+            'normalization': 'NFKC',
+            'strip_punctuation': strip_punctuation
+        }
+    }
+
+
+class Tokenizer:
+    """トークナイザの共通の形．extract_typesは作れる語のとり方です．"""
+    extract_types = []  # type: List[str]
+
+    def tokenize_batch(self, texts: List[str]) -> List[List[List[str]]]:
+        """texts各々について，extract_typesの順に語列を返す．"""
+        raise NotImplementedError
+
+    def cache_stats(self) -> Tuple[int, int]:
+        """キャッシュのヒット数とミス数．"""
+        return 0, 0
+
+    def close(self):
+        pass
+
+
+class MecabTokenizer(Tokenizer):
+    """MeCab・Unidicの1回の解析から内容語・短単位（原形）・短単位（表層形）を作る．
+    MeCab.Taggerはpickleできないので，最初の解析で作る（作る前ならプロセスへ渡せる）．
+    """
+    extract_types = morph_extract_types
+
+    def __init__(self, unidic_path: str):
+        self.unidic_path = unidic_path
+        self.mecab = None
+
+    def tokenize_batch(self, texts: List[str]) -> List[List[List[str]]]:
+        if self.mecab is None:
+            import MeCab
+            self.mecab = MeCab.Tagger('-d {0}'.format(self.unidic_path))
+        return [tokenize(self.mecab, s) for s in texts]
+
+    def __getstate__(self):
+        return {'unidic_path': self.unidic_path, 'mecab': None}
+
+
+class CharTokenizer(Tokenizer):
+    extract_types = ['文字']
+
+    def __init__(self, strip_punctuation: bool = True):
+        self.strip_punctuation = strip_punctuation
+
+    def tokenize_batch(self, texts: List[str]) -> List[List[List[str]]]:
+        return [[char_tokens(s, self.strip_punctuation)] for s in texts]
+
+
+class CachedTokenizer(Tokenizer):
+    """baseの語列をTokenCacheに保存して再利用する．キャッシュにないテキストだけをまとめてbaseに渡す．"""
+
+    def __init__(self, base: Tokenizer, cache: TokenCache):
+        self.base = base
+        self.cache = cache
+        self.extract_types = base.extract_types
+
+    def tokenize_batch(self, texts: List[str]) -> List[List[List[str]]]:
+        cached = [[self.cache.get(s, et) for et in self.extract_types] for s in texts]
+        misses = [n for n, tokens in enumerate(cached) if any(t is None for t in tokens)]
+        if misses:
+            extracted = self.base.tokenize_batch([texts[n] for n in misses])
+            for n, tokens in zip(misses, extracted):
+                for et, t, c in zip(self.extract_types, tokens, cached[n]):
+                    if c is None:
+                        self.cache.put(texts[n], et, t)
+                cached[n] = tokens
+        return cached
+
+    def cache_stats(self) -> Tuple[int, int]:
+        return self.cache.hits, self.cache.misses
+
+    def close(self):
+        self.cache.close()
+        self.base.close()
+
+
+class ViewTokenizer(Tokenizer):
+    """extract_typesの語のとり方ごとに，それを作れるトークナイザ（tokenizersの先のもの）へ振り分ける．
+    どの語のとり方も担当しないトークナイザは使わない．
+    """
+
+    def __init__(self, tokenizers: List[Tokenizer], extract_types: List[str]):
+        self.extract_types = extract_types
+        self.tokenizers = []  # type: List[Tokenizer]
+        # 語のとり方ごとの(self.tokenizersの位置, そのトークナイザでの語のとり方の位置)
+        self.columns = []  # type: List[Tuple[int, int]]
+        for et in extract_types:
+            tokenizer = next((t for t in tokenizers if et in t.extract_types), None)
+            if tokenizer is None:
+                raise ValueError('no tokenizer for {0}'.format(et))
+            if tokenizer not in self.tokenizers:
+                self.tokenizers.append(tokenizer)
+            self.columns.append((self.tokenizers.index(tokenizer), tokenizer.extract_types.index(et)))
+
+    def tokenize_batch(self, texts: List[str]) -> List[List[List[str]]]:
+        results = [tokenizer.tokenize_batch(texts) for tokenizer in self.tokenizers]
+        return [[results[k][n][c] for k, c in self.columns] for n in range(len(texts))]
+
+    def cache_stats(self) -> Tuple[int, int]:
+        stats = [tokenizer.cache_stats() for tokenizer in self.tokenizers]
+        return sum(h for h, _ in stats), sum(m for _, m in stats)
+
+    def close(self):
+        for tokenizer in self.tokenizers:
+            tokenizer.close()